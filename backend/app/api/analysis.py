@@ -2,12 +2,18 @@
 Analysis and analytics API endpoints
 """
 from fastapi import APIRouter, HTTPException
-from typing import Optional
+from typing import Optional, Callable, Awaitable, Any
+import asyncio
 import uuid
-from app.models.transaction import get_user_transactions
-from app.models.user import get_user_by_id
+from app.models.transaction import aget_user_transactions
+from app.models.user import aget_user_by_id, aget_data_version
+from app.models.rollup import aget_spending_rollups
+from app.config.settings import settings
 from app.services.stats import StatsService
+from app.services.features import TransactionFeatures
 from app.services.insights import InsightsService
+from app.services.ai_insights import insights_scope, aget_ai_insights_version
+from app.services.response_cache import get_analysis_cache
 from app.models.schemas import AnalysisResponse
 
 router = APIRouter()
@@ -24,6 +30,83 @@ def validate_uuid(user_id: str) -> None:
             detail=f"Invalid user ID format. Expected UUID, got: {user_id}. Please log in again to get a valid user ID."
         )
 
+async def cached(
+    user_id: str,
+    endpoint: str,
+    params: tuple,
+    compute: Callable[[], Awaitable[Any]],
+    insights_version: Optional[Callable[[], Awaitable[Any]]] = None
+) -> Any:
+    """
+    Serve a response from the analysis cache
+    
+    Keys include the user's data version, so an upload makes every cached
+    response for that user a miss. Responses that embed stored AI insights
+    also pass insights_version, so newly generated insights are a miss too.
+    """
+    if not settings.ANALYSIS_CACHE_ENABLED:
+        return await compute()
+    if insights_version is None:
+        key = (user_id, endpoint, params, await aget_data_version(user_id))
+    else:
+        data_version, ai_version = await asyncio.gather(aget_data_version(user_id), insights_version())
+        key = (user_id, endpoint, params, data_version, ai_version)
+    return await get_analysis_cache().aget_or_compute(key, compute)
+
+async def compute_analysis(user_id: str, days: Optional[int]) -> AnalysisResponse:
+    """Build the full analysis response"""
+    # Get transactions
+    transactions = await aget_user_transactions(user_id, days=days)
+    
+    # If no transactions, return empty analysis instead of error
+    if not transactions:
+        from app.models.schemas import SpendingSummary, CategorySummary
+        empty_summary = SpendingSummary(
+            total_spent=0.0,
+            total_income=0.0,
+            net_balance=0.0,
+            transaction_count=0,
+            categories=[],
+            top_merchants=[],
+            date_range={"start": "", "end": ""}
+        )
+        return AnalysisResponse(
+            summary=empty_summary,
+            insights=[],
+            trends={"period": "monthly", "data": []}
+        )
+    
+    # One pass over the transactions, shared by stats and insights. Insights need the
+    # raw rows anyway, so reading rollups here would only add queries.
+    features = TransactionFeatures.from_transactions(transactions)
+    
+    # Get summary and trends
+    summary = stats_service.get_summary(transactions, days=days, features=features)
+    trends = stats_service.get_trends(transactions, period="monthly", features=features)
+    
+    # Get insights
+    insights = await insights_service.agenerate_insights(transactions, user_id, features=features, days=days)
+    
+    return AnalysisResponse(
+        summary=summary,
+        insights=insights,
+        trends=trends
+    )
+
+async def compute_trends(user_id: str, period: str, days: Optional[int]) -> Any:
+    """Build the trends response"""
+    rollups = await aget_spending_rollups(user_id, days=days) if settings.ROLLUPS_ENABLED else None
+    if rollups is not None:
+        return stats_service.get_rollup_trends(rollups, period=period)
+    
+    transactions = await aget_user_transactions(user_id, days=days)
+    return stats_service.get_trends(transactions, period=period)
+
+async def compute_category_breakdown(user_id: str, days: Optional[int]) -> Any:
+    """Build the category breakdown response"""
+    transactions = await aget_user_transactions(user_id, days=days)
+    return stats_service.get_category_breakdown(transactions)
+
 @router.get("/summary/{user_id}", response_model=AnalysisResponse)
 async def get_analysis(
     user_id: str,
@@ -35,44 +118,13 @@ async def get_analysis(
         validate_uuid(user_id)
         
         # Verify user exists
-        user = get_user_by_id(user_id)
+        user = await aget_user_by_id(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Get transactions
-        transactions = get_user_transactions(user_id, days=days)
-        
-        # If no transactions, return empty analysis instead of error
-        if not transactions:
-            from app.models.schemas import SpendingSummary, CategorySummary
-            empty_summary = SpendingSummary(
-                total_spent=0.0,
-                total_income=0.0,
-                net_balance=0.0,
-                transaction_count=0,
-                categories=[],
-                top_merchants=[],
-                date_range={"start": "", "end": ""}
-            )
-            return AnalysisResponse(
-                summary=empty_summary,
-                insights=[],
-                trends={"period": "monthly", "data": []}
-            )
-        
-        # Get summary
-        summary = stats_service.get_summary(transactions, days=days)
-        
-        # Get insights
-        insights = insights_service.generate_insights(transactions, user_id)
-        
-        # Get trends
-        trends = stats_service.get_trends(transactions, period="monthly")
-        
-        return AnalysisResponse(
-            summary=summary,
-            insights=insights,
-            trends=trends
+        return await cached(
+            user_id, "summary", (days,), lambda: compute_analysis(user_id, days),
+            insights_version=lambda: aget_ai_insights_version(user_id, insights_scope(days))
         )
     
     except HTTPException:
@@ -91,14 +143,11 @@ async def get_trends(
         # Validate UUID format
         validate_uuid(user_id)
         
-        user = get_user_by_id(user_id)
+        user = await aget_user_by_id(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        transactions = get_user_transactions(user_id, days=days)
-        trends = stats_service.get_trends(transactions, period=period)
-        
-        return trends
+        return await cached(user_id, "trends", (period, days), lambda: compute_trends(user_id, period, days))
     
     except HTTPException:
         raise
@@ -115,14 +164,11 @@ async def get_category_breakdown(
         # Validate UUID format
         validate_uuid(user_id)
         
-        user = get_user_by_id(user_id)
+        user = await aget_user_by_id(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        transactions = get_user_transactions(user_id, days=days)
-        breakdown = stats_service.get_category_breakdown(transactions)
-        
-        return breakdown
+        return await cached(user_id, "category", (days,), lambda: compute_category_breakdown(user_id, days))
     
     except HTTPException:
         raise
@@ -1,18 +1,20 @@
 """
 Chat API endpoint for AI financial assistant
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
 import uuid
 from app.models.schemas import ChatMessage, ChatResponse
-from app.models.transaction import get_user_transactions
-from app.models.user import get_user_by_id
-from app.models.memory import search_similar_memories
-from app.services.stats import StatsService
-from app.config.gemini import get_gemini_model
-from typing import List
+from app.models.user import aget_user_by_id
+from app.models.memory import asearch_similar_memories
+from app.services.chat_context import aget_chat_context
+from app.config.gemini import get_gemini_gateway, GeminiQuotaError, PRIORITY_CHAT
+from app.config.settings import settings
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
 
 router = APIRouter()
-stats_service = StatsService()
 
 def validate_uuid(user_id: str) -> None:
     """Validate that user_id is a valid UUID"""
@@ -24,70 +26,25 @@ def validate_uuid(user_id: str) -> None:
             detail=f"Invalid user ID format. Expected UUID, got: {user_id}. Please log in again to get a valid user ID."
         )
 
+GEMINI_DISABLED_MESSAGE = "I'm currently unable to process requests due to API quota limits. Please try again later or contact support."
+GEMINI_BUSY_MESSAGE = "I'm currently experiencing high demand and cannot process your request right now. Please try again in a few minutes. In the meantime, you can view your transaction summary and charts above."
+
 @router.post("/message", response_model=ChatResponse)
 async def chat(message: ChatMessage):
     """Chat with AI financial assistant"""
     try:
-        # Validate UUID format
-        validate_uuid(message.user_id)
-        
-        # Verify user exists
-        user = get_user_by_id(message.user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Get user transactions (last 90 days)
-        transactions = get_user_transactions(message.user_id, days=90)
-        
-        # Get summary
-        summary = stats_service.get_summary(transactions, days=90)
-        
-        # Search similar memories
-        similar_memories = search_similar_memories(
-            message.user_id,
-            message.message,
-            limit=5,
-            threshold=0.6
-        )
-        
-        # Build context
-        context = _build_rag_context(
-            transactions,
-            summary,
-            similar_memories
-        )
+        prompt, sources = await _prepare_chat(message)
         
         # Generate response with Gemini
         try:
-            from app.config.settings import settings
             if not settings.is_gemini_enabled:
-                response_text = "I'm currently unable to process requests due to API quota limits. Please try again later or contact support."
+                response_text = GEMINI_DISABLED_MESSAGE
             else:
-                model = get_gemini_model()
-                
-                prompt = f"""You are UPISensei, an AI financial assistant. Answer the user's question based on their transaction data.
-
-USER'S FINANCIAL CONTEXT:
-{context}
-
-USER QUESTION: {message.message}
-
-Provide a helpful, specific answer based on the data. If the question cannot be answered from the data, say so politely."""
-
-                response = model.generate_content(prompt)
-                response_text = response.text
+                response_text = await get_gemini_gateway().agenerate(prompt, priority=PRIORITY_CHAT)
+        except GeminiQuotaError:
+            response_text = GEMINI_BUSY_MESSAGE
         except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "quota" in error_str.lower() or "rate limit" in error_str.lower():
-                response_text = "I'm currently experiencing high demand and cannot process your request right now. Please try again in a few minutes. In the meantime, you can view your transaction summary and charts above."
-            else:
-                response_text = f"I encountered an error processing your request: {str(e)}. Please try again."
-        
-        # Extract sources from similar memories
-        sources = [
-            mem.text[:100] + "..." if len(mem.text) > 100 else mem.text
-            for mem in similar_memories[:3]
-        ]
+            response_text = f"I encountered an error processing your request: {str(e)}. Please try again."
         
         return ChatResponse(
             response=response_text,
@@ -99,39 +56,137 @@ Provide a helpful, specific answer based on the data. If the question cannot be
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
+@router.post("/stream")
+async def chat_stream(message: ChatMessage, request: Request):
+    """
+    Chat with AI financial assistant, streaming the answer as Server-Sent Events
+    
+    Events: "sources" (first, {"sources": [...]}), then "chunk" ({"text": ...})
+    as Gemini produces text, then "done". If the client disconnects the
+    upstream Gemini call is abandoned.
+    """
+    try:
+        prompt, sources = await _prepare_chat(message)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
+    
+    async def events():
+        yield _sse("sources", {"sources": sources})
+        
+        if not settings.is_gemini_enabled:
+            yield _sse("chunk", {"text": GEMINI_DISABLED_MESSAGE})
+        else:
+            stream = get_gemini_gateway().astream(prompt, priority=PRIORITY_CHAT)
+            try:
+                async for text in stream:
+                    if await request.is_disconnected():
+                        break
+                    yield _sse("chunk", {"text": text})
+            except GeminiQuotaError:
+                yield _sse("chunk", {"text": GEMINI_BUSY_MESSAGE})
+            except Exception as e:
+                yield _sse("error", {"message": f"I encountered an error processing your request: {str(e)}. Please try again."})
+            finally:
+                # Closing the generator cancels the upstream call if it is still streaming
+                await stream.aclose()
+        
+        yield _sse("done", {})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _prepare_chat(message: ChatMessage) -> Tuple[str, List[str]]:
+    """Validate the request, gather context and build the Gemini prompt and sources"""
+    # Validate UUID format
+    validate_uuid(message.user_id)
+    
+    # Fetch context concurrently; the user check is required, the rest is optional
+    chat_context, similar_memories = await _gather_context(message.user_id, message.message)
+    
+    # Build context
+    context = _build_rag_context(chat_context, similar_memories)
+    
+    prompt = f"""You are UPISensei, an AI financial assistant. Answer the user's question based on their transaction data.
+
+USER'S FINANCIAL CONTEXT:
+{context}
+
+USER QUESTION: {message.message}
+
+Provide a helpful, specific answer based on the data. If the question cannot be answered from the data, say so politely."""
+    
+    # Extract sources from similar memories
+    sources = [
+        mem.text[:100] + "..." if len(mem.text) > 100 else mem.text
+        for mem in similar_memories[:3]
+    ]
+    
+    return prompt, sources
+
+async def _optional_stage(stage: str, awaitable: Awaitable, timeout: float, default: Any) -> Any:
+    """Await an optional context stage, returning default if it times out or fails"""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        print(f"Chat context stage '{stage}' timed out after {timeout}s - answering without it")
+    except Exception as e:
+        print(f"Chat context stage '{stage}' failed - answering without it: {e}")
+    return default
+
+async def _gather_context(user_id: str, query: str):
+    """
+    Run the user check, the context snapshot lookup and the memory search
+    (query embedding plus vector lookup) at the same time
+    
+    The snapshot comes back as None and memories as [] when their stage
+    misses its timeout, so the answer can go ahead without them. A missing
+    user cancels the other stages and raises 404.
+    """
+    context_task = asyncio.create_task(_optional_stage(
+        "context",
+        aget_chat_context(user_id),
+        settings.CHAT_CONTEXT_TIMEOUT_SECONDS,
+        None
+    ))
+    memories_task = asyncio.create_task(_optional_stage(
+        "memories",
+        asearch_similar_memories(user_id, query, limit=5, threshold=0.6),
+        settings.CHAT_MEMORY_TIMEOUT_SECONDS,
+        []
+    ))
+    
+    try:
+        user = await aget_user_by_id(user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+    except BaseException:
+        context_task.cancel()
+        memories_task.cancel()
+        raise
+    
+    return await asyncio.gather(context_task, memories_task)
+
 def _build_rag_context(
-    transactions: List,
-    summary,
+    chat_context: Optional[Dict[str, Any]],
     similar_memories: List
 ) -> str:
     """Build RAG context for chat"""
     context_parts = []
     
-    # Summary
-    context_parts.append(f"Total Spent: ₹{summary.total_spent:,.0f}")
-    context_parts.append(f"Total Income: ₹{summary.total_income:,.0f}")
-    context_parts.append(f"Net Balance: ₹{summary.net_balance:,.0f}")
-    context_parts.append(f"Transaction Count: {summary.transaction_count}")
-    
-    # Top categories
-    if summary.categories:
-        context_parts.append("\nTop Spending Categories:")
-        for cat in summary.categories[:5]:
-            context_parts.append(f"- {cat.category}: ₹{cat.amount:,.0f} ({cat.percentage:.1f}%)")
-    
-    # Top merchants
-    if summary.top_merchants:
-        context_parts.append("\nTop Merchants:")
-        for merchant in summary.top_merchants[:5]:
-            context_parts.append(f"- {merchant['merchant']}: ₹{merchant['amount']:,.0f} ({merchant['count']} transactions)")
-    
-    # Recent transactions
-    if transactions:
-        context_parts.append("\nRecent Transactions (last 10):")
-        for txn in transactions[:10]:
-            context_parts.append(
-                f"- {txn.date.strftime('%Y-%m-%d')}: {txn.merchant or txn.raw_text[:50]} - ₹{txn.amount:,.0f} ({txn.category})"
-            )
+    # Summary, top categories and merchants, recent transactions (pre-rendered)
+    if chat_context is None:
+        context_parts.append("Transaction data is temporarily unavailable.")
+    else:
+        context_parts.append(chat_context["text"])
     
     # Similar memories
     if similar_memories:
@@ -140,4 +195,3 @@ def _build_rag_context(
             context_parts.append(f"- {mem.text}")
     
     return "\n".join(context_parts)
-
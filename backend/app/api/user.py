@@ -3,8 +3,8 @@ User API endpoints
 """
 from fastapi import APIRouter, HTTPException
 import uuid
-from app.models.user import get_user_by_id, get_or_create_user
-from app.models.transaction import get_user_transactions
+from app.models.user import aget_user_by_id, aget_or_create_user
+from app.models.transaction import aget_user_transactions
 from app.models.schemas import UserResponse
 from typing import Optional
 
@@ -24,7 +24,7 @@ def validate_uuid(user_id: str) -> None:
 async def get_user(user_id: str):
     """Get user by ID"""
     validate_uuid(user_id)
-    user = get_user_by_id(user_id)
+    user = await aget_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -32,7 +32,7 @@ async def get_user(user_id: str):
 @router.get("/phone/{phone}", response_model=UserResponse)
 async def get_user_by_phone(phone: str):
     """Get or create user by phone number"""
-    user = get_or_create_user(phone)
+    user = await aget_or_create_user(phone)
     return user
 
 @router.get("/{user_id}/transactions")
@@ -43,11 +43,11 @@ async def get_user_transactions_endpoint(
 ):
     """Get user transactions"""
     validate_uuid(user_id)
-    user = get_user_by_id(user_id)
+    user = await aget_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    transactions = get_user_transactions(user_id, limit=limit, days=days)
+    transactions = await aget_user_transactions(user_id, limit=limit, days=days)
     
     return {
         "user_id": user_id,
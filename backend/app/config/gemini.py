@@ -1,12 +1,405 @@
 """
 Google Gemini AI configuration
 """
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from concurrent.futures import Future
+import asyncio
+import hashlib
+import heapq
+import threading
+import time
 import google.generativeai as genai
 from app.config.settings import settings
 
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # Installed with google-generativeai; string matching covers its absence
+    google_exceptions = None
+
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
-def get_gemini_model(model_name: str = "gemini-2.0-flash-exp"):
+# Priority lanes: lower values are served first
+PRIORITY_CHAT = 0
+PRIORITY_INSIGHTS = 1
+PRIORITY_CLASSIFICATION = 2
+
+_models: Dict[str, "genai.GenerativeModel"] = {}
+_models_lock = threading.Lock()
+
+def get_gemini_model(model_name: Optional[str] = None):
     """Get Gemini model instance"""
-    return genai.GenerativeModel(model_name)
+    model_name = model_name or settings.GEMINI_MODEL
+    if model_name not in _models:
+        with _models_lock:
+            if model_name not in _models:
+                _models[model_name] = genai.GenerativeModel(model_name)
+    return _models[model_name]
+
+class GeminiError(Exception):
+    """A Gemini request failed"""
+
+class GeminiQuotaError(GeminiError):
+    """Quota exhausted, rate limited locally, or circuit open - callers should fall back"""
+
+class GeminiCircuitOpen(GeminiQuotaError):
+    """Failing fast while the circuit breaker is open"""
+
+def is_quota_error(error: Exception) -> bool:
+    """Whether an exception from the Gemini client means quota/rate limiting"""
+    if google_exceptions is not None and isinstance(
+        error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+    ):
+        return True
+    error_str = str(error).lower()
+    return "429" in error_str or "quota" in error_str or "rate limit" in error_str
+
+class GeminiGateway:
+    """
+    Single process-wide entry point for Gemini calls
+    
+    - Token bucket: requests_per_minute sustained, burst in reserve.
+      Waiting callers are served by priority lane, then arrival order,
+      and give up with GeminiQuotaError after queue_timeout seconds.
+    - Circuit breaker: a quota error (or failure_threshold consecutive
+      errors) opens the circuit for cooldown_seconds, doubling on repeat
+      trips. While open every call raises GeminiCircuitOpen immediately;
+      afterwards one probe request decides whether to close it.
+    - Coalescing: identical prompts already in flight share one call.
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        requests_per_minute: float,
+        burst: int,
+        queue_timeout: float = 10.0,
+        request_timeout: float = 30.0,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 60.0,
+        max_cooldown_seconds: float = 600.0
+    ):
+        self.model_name = model_name
+        self.rate = max(requests_per_minute, 0.001) / 60.0
+        self.capacity = max(1, burst)
+        self.queue_timeout = queue_timeout
+        self.request_timeout = request_timeout
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown_seconds
+        self.max_cooldown = max_cooldown_seconds
+        
+        # Token bucket and priority queue
+        self._cond = threading.Condition()
+        self._tokens = float(self.capacity)
+        self._refilled_at = time.monotonic()
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = 0
+        
+        # Circuit breaker: "closed", "open" or "half_open"
+        self._state = "closed"
+        self._opened_until = 0.0
+        self._trips = 0
+        self._failures = 0
+        self._probe_in_flight = False
+        
+        # In-flight prompts
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        
+        self._counters = {
+            "requests": 0,
+            "coalesced": 0,
+            "rate_limited": 0,
+            "circuit_rejected": 0,
+            "quota_errors": 0,
+            "errors": 0
+        }
+    
+    def generate(self, prompt: str, priority: int = PRIORITY_CLASSIFICATION, timeout: Optional[float] = None) -> str:
+        """Run a prompt and return the response text"""
+        key = self._key(prompt)
+        
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self._counters["coalesced"] += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            text = self._call(prompt, priority, self.queue_timeout if timeout is None else timeout)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(text)
+            return text
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    async def agenerate(self, prompt: str, priority: int = PRIORITY_CLASSIFICATION, timeout: Optional[float] = None) -> str:
+        """generate() for async callers: awaits the token and the API call without blocking the event loop"""
+        key = self._key(prompt)
+        
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self._counters["coalesced"] += 1
+        
+        if not leader:
+            return await asyncio.wrap_future(future)
+        
+        try:
+            text = await self._acall(prompt, priority, self.queue_timeout if timeout is None else timeout)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(text)
+            return text
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    async def astream(self, prompt: str, priority: int = PRIORITY_CHAT, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Run a prompt and yield the response text as the model streams it
+        
+        Goes through the circuit breaker and token bucket like generate(),
+        but is never coalesced. Errors raised before the first chunk count
+        against the breaker; closing the iterator (or cancelling the task
+        consuming it) abandons the upstream call.
+        """
+        probe = self._admit()
+        try:
+            if not self._try_acquire():
+                await asyncio.to_thread(self._acquire, priority, self.queue_timeout if timeout is None else timeout)
+        except BaseException:
+            self._release_probe(probe)
+            raise
+        
+        self._count_request()
+        chunks = None
+        started = False
+        try:
+            response = await get_gemini_model(self.model_name).generate_content_async(
+                prompt,
+                stream=True,
+                request_options={"timeout": self.request_timeout}
+            )
+            chunks = response.__aiter__()
+            async for chunk in chunks:
+                try:
+                    text = chunk.text
+                except ValueError:  # Chunk without text parts (e.g. only safety ratings)
+                    continue
+                if not started:
+                    started = True
+                    self._record_success()
+                if text:
+                    yield text
+        except (asyncio.CancelledError, GeneratorExit):
+            # The consumer went away; don't leave a half-open probe stuck in flight
+            self._release_probe(probe)
+            raise
+        except Exception as e:
+            if started:
+                raise GeminiError(str(e)) from e
+            raise self._failure(e) from e
+        finally:
+            if chunks is not None and hasattr(chunks, "aclose"):
+                await chunks.aclose()
+        
+        if not started:
+            self._record_success()
+    
+    def _key(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{prompt}".encode("utf-8")).hexdigest()
+    
+    def _call(self, prompt: str, priority: int, timeout: float) -> str:
+        probe = self._admit()
+        try:
+            self._acquire(priority, timeout)
+        except BaseException:
+            self._release_probe(probe)
+            raise
+        
+        self._count_request()
+        try:
+            response = get_gemini_model(self.model_name).generate_content(
+                prompt,
+                request_options={"timeout": self.request_timeout}
+            )
+            text = response.text
+        except Exception as e:
+            raise self._failure(e) from e
+        
+        self._record_success()
+        return text
+    
+    async def _acall(self, prompt: str, priority: int, timeout: float) -> str:
+        probe = self._admit()
+        try:
+            # Queueing for a token blocks on a condition; only leave the loop when we must wait
+            if not self._try_acquire():
+                await asyncio.to_thread(self._acquire, priority, timeout)
+        except BaseException:
+            self._release_probe(probe)
+            raise
+        
+        self._count_request()
+        try:
+            response = await get_gemini_model(self.model_name).generate_content_async(
+                prompt,
+                request_options={"timeout": self.request_timeout}
+            )
+            text = response.text
+        except asyncio.CancelledError:
+            # The caller went away; don't leave a half-open probe stuck in flight
+            self._release_probe(probe)
+            raise
+        except Exception as e:
+            raise self._failure(e) from e
+        
+        self._record_success()
+        return text
+    
+    def _count_request(self) -> None:
+        with self._cond:
+            self._counters["requests"] += 1
+    
+    def _failure(self, error: Exception) -> GeminiError:
+        """Record a failed call and wrap its exception"""
+        quota = is_quota_error(error)
+        self._record_failure(quota)
+        if quota:
+            return GeminiQuotaError(str(error))
+        return GeminiError(str(error))
+    
+    # Circuit breaker
+    def _admit(self) -> bool:
+        """Raise if the circuit is open; returns True if this call is the half-open probe"""
+        with self._cond:
+            if self._state == "open":
+                if time.monotonic() < self._opened_until:
+                    self._counters["circuit_rejected"] += 1
+                    raise GeminiCircuitOpen("Gemini circuit open after quota errors")
+                self._state = "half_open"
+            if self._state == "half_open":
+                if self._probe_in_flight:
+                    self._counters["circuit_rejected"] += 1
+                    raise GeminiCircuitOpen("Gemini circuit half-open, probe in flight")
+                self._probe_in_flight = True
+                return True
+            return False
+    
+    def _release_probe(self, probe: bool) -> None:
+        if probe:
+            with self._cond:
+                self._probe_in_flight = False
+    
+    def _record_success(self) -> None:
+        with self._cond:
+            self._state = "closed"
+            self._failures = 0
+            self._trips = 0
+            self._probe_in_flight = False
+    
+    def _record_failure(self, quota: bool) -> None:
+        with self._cond:
+            self._counters["quota_errors" if quota else "errors"] += 1
+            self._failures += 1
+            self._probe_in_flight = False
+            if quota or self._failures >= self.failure_threshold or self._state == "half_open":
+                cooldown = min(self.cooldown * (2 ** self._trips), self.max_cooldown)
+                self._trips += 1
+                self._state = "open"
+                self._opened_until = time.monotonic() + cooldown
+                print(f"Gemini circuit open for {cooldown:.0f}s")
+    
+    # Token bucket
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+    
+    def _try_acquire(self) -> bool:
+        """Take a token without waiting, if one is free and nobody is queued"""
+        with self._cond:
+            self._refill()
+            if not self._waiting and self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+    
+    def _acquire(self, priority: int, timeout: float) -> None:
+        """Wait for a token, served in (priority, arrival) order"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._sequence += 1
+            ticket = (priority, self._sequence)
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                self._refill()
+                if self._waiting[0] == ticket and self._tokens >= 1:
+                    heapq.heappop(self._waiting)
+                    self._tokens -= 1
+                    self._cond.notify_all()
+                    return
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._counters["rate_limited"] += 1
+                    self._cond.notify_all()
+                    raise GeminiQuotaError("Gemini request queue timed out")
+                
+                # The head of the queue sleeps until the next token; others until notified
+                if self._waiting[0] == ticket:
+                    remaining = min(remaining, (1 - self._tokens) / self.rate)
+                self._cond.wait(remaining)
+    
+    def stats(self) -> Dict[str, object]:
+        """Gateway counters and breaker state"""
+        with self._cond:
+            self._refill()
+            return {
+                **self._counters,
+                "state": self._state,
+                "tokens": round(self._tokens, 2),
+                "queued": len(self._waiting)
+            }
+
+_gateway: Optional[GeminiGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_gemini_gateway() -> GeminiGateway:
+    """Get the process-wide Gemini gateway"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = GeminiGateway(
+                    settings.GEMINI_MODEL,
+                    requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+                    burst=settings.GEMINI_BURST,
+                    queue_timeout=settings.GEMINI_QUEUE_TIMEOUT_SECONDS,
+                    request_timeout=settings.GEMINI_REQUEST_TIMEOUT_SECONDS,
+                    failure_threshold=settings.GEMINI_BREAKER_FAILURES,
+                    cooldown_seconds=settings.GEMINI_BREAKER_COOLDOWN_SECONDS
+                )
+    return _gateway
 
+def get_gemini_stats() -> Dict[str, object]:
+    """Gateway counters (empty until first use)"""
+    return _gateway.stats() if _gateway is not None else {}
@@ -11,10 +11,29 @@ class Settings(BaseSettings):
     SUPABASE_URL: str = ""
     SUPABASE_KEY: str = ""
     SUPABASE_SERVICE_KEY: str = ""
+    SUPABASE_POOL_SIZE: int = 20  # Pooled keep-alive connections per client
+    SUPABASE_TIMEOUT_SECONDS: float = 10.0
+    SUPABASE_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    SUPABASE_KEEPALIVE_SECONDS: float = 30.0  # Idle time before a pooled connection is dropped
+    
+    # Storage backend: "supabase", "sqlite" (embedded OLTP) or "duckdb" (embedded analytics)
+    STORAGE_BACKEND: str = "supabase"
+    SQLITE_PATH: str = "data/upisensei.sqlite3"
+    DUCKDB_PATH: str = "data/upisensei.duckdb"
+    ROLLUPS_ENABLED: bool = True  # Serve analysis from per-user spending rollups maintained on ingest
     
     # Gemini AI
     GEMINI_API_KEY: str = ""
     GEMINI_ENABLED: str = "true"  # Can disable Gemini to avoid quota issues (set to "false" in .env)
+    GEMINI_MODEL: str = "gemini-2.0-flash-exp"
+    GEMINI_REQUESTS_PER_MINUTE: float = 10.0  # Process-wide token bucket rate, sized to the API quota
+    GEMINI_BURST: int = 5  # Requests that may go out back-to-back
+    GEMINI_QUEUE_TIMEOUT_SECONDS: float = 10.0  # Max wait for a token before falling back
+    GEMINI_REQUEST_TIMEOUT_SECONDS: float = 30.0
+    GEMINI_BREAKER_FAILURES: int = 3  # Consecutive errors that open the circuit (quota errors open it at once)
+    GEMINI_BREAKER_COOLDOWN_SECONDS: float = 60.0  # Fail-fast period, doubled on repeated trips
+    GEMINI_BATCH_SIZE: int = 25  # Unresolved descriptions classified per prompt
+    GEMINI_BATCH_CONCURRENCY: int = 2  # Batch prompts in flight per classify_many call
     
     @property
     def is_gemini_enabled(self) -> bool:
@@ -28,14 +47,74 @@ class Settings(BaseSettings):
     # Embeddings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION: int = 384
+    EMBEDDING_CACHE_SIZE: int = 10000  # Vectors kept in the in-memory LRU tier
+    EMBEDDING_CACHE_PATH: str = ".cache/embeddings.sqlite3"  # On-disk tier (empty = memory only)
+    EMBEDDING_BATCHING: bool = True  # Coalesce concurrent encode requests into shared batches
+    EMBEDDING_BATCH_MAX_SIZE: int = 64  # Texts per coalesced encode() call
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0  # How long the first request waits for company
+    
+    # Memory storage
+    MEMORY_BATCH_SIZE: int = 256  # Memories encoded and inserted per bulk chunk
+    
+    # Local vector index for memory search
+    VECTOR_INDEX_ENABLED: bool = True  # Search memories in-process instead of via the database
+    VECTOR_INDEX_PATH: str = ".cache/vector_index"  # One directory of memory-mapped files per user
+    VECTOR_INDEX_IVF_THRESHOLD: int = 2048  # Users with more vectors get an IVF-partitioned index
+    VECTOR_INDEX_NPROBE: int = 8  # IVF partitions scored per query
+    VECTOR_INDEX_VERIFY_SECONDS: float = 300.0  # How long an index checked against the database is trusted
+    
+    # Analysis response cache (entries are keyed by the user's data version)
+    ANALYSIS_CACHE_ENABLED: bool = True
+    ANALYSIS_CACHE_SIZE: int = 1024  # Cached responses kept in memory
+    ANALYSIS_CACHE_TTL_SECONDS: float = 300.0  # Served without recomputing
+    ANALYSIS_CACHE_STALE_SECONDS: float = 3600.0  # Past TTL, served while a background refresh runs
+    
+    # AI insights (generated in the background, served from storage)
+    AI_INSIGHTS_CHANGE_THRESHOLD: float = 0.1  # Relative change in category spend that triggers regeneration
+    AI_INSIGHTS_WORKERS: int = 1  # Concurrent background Gemini calls
+    AI_INSIGHTS_RETRY_SECONDS: float = 300.0  # Back-off for a user after a failed generation
+    AI_INSIGHTS_MIN_INTERVAL_SECONDS: float = 600.0  # Minimum time between regenerations for a user
+    
+    # Chat context (fetched concurrently; optional stages that miss their timeout are left out of the prompt)
+    CHAT_CONTEXT_TIMEOUT_SECONDS: float = 3.0  # Stored snapshot, or rebuilding it from transactions
+    CHAT_MEMORY_TIMEOUT_SECONDS: float = 1.5  # Query embedding plus vector search
+    CHAT_CONTEXT_MAX_AGE_SECONDS: float = 21600.0  # Snapshots are rebuilt on new data, or after this long as the 90-day window slides
+    
+    # Insight rules
+    INSIGHT_RULES_PATH: str = ""  # JSON list of rule definitions (empty = built-in rules)
     
     # Classification
     CLASSIFICATION_CONFIDENCE_THRESHOLD: float = 0.7
+    CLASSIFICATION_CACHE_ENABLED: bool = True  # Reuse results for descriptions seen before
+    CLASSIFICATION_CACHE_SIZE: int = 50000  # Results kept in the in-memory LRU tier
+    CLASSIFICATION_CACHE_PATH: str = ".cache/classifications.sqlite3"  # On-disk tier (empty = memory only)
+    CATEGORY_EMBEDDINGS_PATH: str = ".cache/category_embeddings"  # Saved category embedding matrices (empty = rebuild per process)
     
     # File upload
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_FILE_TYPES: List[str] = ["pdf", "csv"]
     
+    # PDF extraction
+    PDF_EXTRACT_WORKERS: int = 0  # Process pool size for page-sharded extraction (0 = CPU count, 1 = disabled)
+    PDF_PARALLEL_MIN_PAGES: int = 8  # Statements shorter than this are extracted by a single pool worker
+    
+    def get_pdf_extract_workers(self) -> int:
+        """Resolve the PDF extraction worker count"""
+        if self.PDF_EXTRACT_WORKERS > 0:
+            return self.PDF_EXTRACT_WORKERS
+        return os.cpu_count() or 1
+    
+    # Background ingestion jobs
+    INGESTION_WORKERS: int = 2  # Uploads processed concurrently per API process
+    INGESTION_MAX_PENDING: int = 20  # Queued + running jobs before new uploads get 429
+    INGESTION_JOB_TTL_SECONDS: int = 3600  # How long finished job results stay pollable
+    
+    # Synchronous uploads (/upload/pdf, /upload/csv)
+    UPLOAD_MAX_CONCURRENT: int = 2  # Uploads processed at once per API process (size of the upload thread pool)
+    UPLOAD_MAX_QUEUED: int = 4  # Uploads allowed to wait for a slot; more get 429
+    UPLOAD_QUEUE_TIMEOUT_SECONDS: float = 15.0  # Max wait for a slot before 429
+    UPLOAD_RETRY_AFTER_SECONDS: int = 5  # Retry-After hint until upload durations have been measured
+    
     def get_cors_origins(self) -> List[str]:
         """Parse CORS origins from string (comma-separated or JSON array)"""
         origins_str = self.CORS_ORIGINS.strip()
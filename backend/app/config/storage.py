@@ -0,0 +1,70 @@
+"""
+Storage backend selection
+"""
+from typing import Optional
+import threading
+from app.config.settings import settings
+from app.db.base import StorageBackend, AsyncStorageBackend
+
+_storage: Optional[StorageBackend] = None
+_async_storage: Optional[AsyncStorageBackend] = None
+_lock = threading.RLock()  # get_async_storage may create the sync backend while holding it
+
+def _create_storage() -> StorageBackend:
+    backend = settings.STORAGE_BACKEND.lower()
+    
+    if backend == "sqlite":
+        from app.db.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(settings.SQLITE_PATH)
+    
+    if backend == "duckdb":
+        from app.db.duckdb_backend import DuckDBBackend
+        return DuckDBBackend(settings.DUCKDB_PATH)
+    
+    if backend == "supabase":
+        from app.db.supabase_backend import SupabaseBackend
+        return SupabaseBackend()
+    
+    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+
+def _create_async_storage() -> AsyncStorageBackend:
+    if settings.STORAGE_BACKEND.lower() == "supabase":
+        from app.db.async_supabase_backend import AsyncSupabaseBackend
+        return AsyncSupabaseBackend()
+    
+    # Embedded engines have no async driver; run their calls in threads
+    from app.db.threaded_backend import ThreadedAsyncBackend
+    return ThreadedAsyncBackend(get_storage())
+
+def get_storage() -> StorageBackend:
+    """Get the configured storage backend"""
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                _storage = _create_storage()
+    return _storage
+
+def close_storage() -> None:
+    """Close the storage backend (called on application shutdown)"""
+    global _storage
+    with _lock:
+        if _storage is not None:
+            _storage.close()
+            _storage = None
+
+def get_async_storage() -> AsyncStorageBackend:
+    """Get the configured storage backend for use from async code"""
+    global _async_storage
+    if _async_storage is None:
+        with _lock:
+            if _async_storage is None:
+                _async_storage = _create_async_storage()
+    return _async_storage
+
+async def close_async_storage() -> None:
+    """Close the async storage backend (called on application shutdown)"""
+    global _async_storage
+    storage, _async_storage = _async_storage, None
+    if storage is not None:
+        await storage.close()
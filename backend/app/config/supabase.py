@@ -1,14 +1,119 @@
 """
 Supabase client configuration
 """
-from supabase import create_client, Client
+from typing import Optional
+import asyncio
+import threading
+import httpx
+from supabase import create_client, acreate_client, Client, AsyncClient
+from supabase.lib.client_options import ClientOptions, AsyncClientOptions
 from app.config.settings import settings
 
+# Process-wide clients, created on first use and reused by every request
+_client: Optional[Client] = None
+_service_client: Optional[Client] = None
+_lock = threading.Lock()
+
+# Async client for request handlers (bound to the server's event loop)
+_async_client: Optional[AsyncClient] = None
+_async_lock = asyncio.Lock()
+
+def _pool_options() -> dict:
+    """Timeouts and connection limits shared by the sync and async sessions"""
+    return {
+        "timeout": httpx.Timeout(
+            settings.SUPABASE_TIMEOUT_SECONDS,
+            connect=settings.SUPABASE_CONNECT_TIMEOUT_SECONDS
+        ),
+        "limits": httpx.Limits(
+            max_connections=settings.SUPABASE_POOL_SIZE,
+            max_keepalive_connections=settings.SUPABASE_POOL_SIZE,
+            keepalive_expiry=settings.SUPABASE_KEEPALIVE_SECONDS
+        ),
+        "follow_redirects": True,
+        "http2": True
+    }
+
+def _build_client(key: str) -> Client:
+    """Create a client whose PostgREST session uses a pooled keep-alive connection pool"""
+    options = ClientOptions(postgrest_client_timeout=settings.SUPABASE_TIMEOUT_SECONDS)
+    client = create_client(settings.SUPABASE_URL, key, options=options)
+    
+    # Replace PostgREST's default session with one sized for our worker concurrency
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    postgrest.session = httpx.Client(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        **_pool_options()
+    )
+    default_session.close()
+    
+    return client
+
+async def _build_async_client(key: str) -> AsyncClient:
+    """Async counterpart of _build_client, on a pooled httpx.AsyncClient"""
+    options = AsyncClientOptions(postgrest_client_timeout=settings.SUPABASE_TIMEOUT_SECONDS)
+    client = await acreate_client(settings.SUPABASE_URL, key, options=options)
+    
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    postgrest.session = httpx.AsyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        **_pool_options()
+    )
+    await default_session.aclose()
+    
+    return client
+
 def get_supabase_client() -> Client:
     """Get Supabase client instance"""
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _build_client(settings.SUPABASE_KEY)
+    return _client
 
 def get_supabase_service_client() -> Client:
     """Get Supabase service client with elevated permissions"""
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+    global _service_client
+    if _service_client is None:
+        with _lock:
+            if _service_client is None:
+                _service_client = _build_client(settings.SUPABASE_SERVICE_KEY)
+    return _service_client
+
+async def get_async_supabase_client() -> AsyncClient:
+    """Get the async Supabase client used by request handlers"""
+    global _async_client
+    if _async_client is None:
+        async with _async_lock:
+            if _async_client is None:
+                _async_client = await _build_async_client(settings.SUPABASE_KEY)
+    return _async_client
+
+async def close_async_supabase_client() -> None:
+    """Close the async client's pooled connections (called on application shutdown)"""
+    global _async_client
+    async with _async_lock:
+        if _async_client is not None:
+            try:
+                await _async_client.postgrest.session.aclose()
+            except Exception as e:
+                print(f"Error closing async Supabase client: {e}")
+            _async_client = None
 
+def close_supabase_clients() -> None:
+    """Close pooled connections (called on application shutdown)"""
+    global _client, _service_client
+    with _lock:
+        for client in (_client, _service_client):
+            if client is not None:
+                try:
+                    client.postgrest.session.close()
+                except Exception as e:
+                    print(f"Error closing Supabase client: {e}")
+        _client = None
+        _service_client = None
@@ -0,0 +1,131 @@
+"""
+Async Supabase (PostgREST + pgvector) storage backend
+"""
+from typing import List, Optional
+from datetime import datetime
+from app.config.supabase import get_async_supabase_client
+from app.db.base import AsyncStorageBackend, Row
+from app.db.supabase_backend import PAGE_SIZE
+
+class AsyncSupabaseBackend(AsyncStorageBackend):
+    """Read from Supabase over a pooled async HTTP client"""
+    
+    async def get_user_by_phone(self, phone: str) -> Optional[Row]:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("users").select("*").eq("phone", phone).execute()
+        return result.data[0] if result.data else None
+    
+    async def get_user_by_id(self, user_id: str) -> Optional[Row]:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("users").select("*").eq("id", user_id).execute()
+        return result.data[0] if result.data else None
+    
+    async def create_user(self, phone: str, name: Optional[str] = None) -> Row:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("users").insert({
+            "phone": phone,
+            "name": name
+        }).execute()
+        return result.data[0]
+    
+    async def get_data_version(self, user_id: str) -> Optional[str]:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("data_versions").select("version").eq("user_id", user_id).execute()
+        return result.data[0]["version"] if result.data else None
+    
+    async def query_transactions(
+        self,
+        user_id: str,
+        since: Optional[datetime] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        until: Optional[datetime] = None
+    ) -> List[Row]:
+        supabase = await get_async_supabase_client()
+        
+        def build():
+            query = supabase.table("transactions").select("*").eq("user_id", user_id)
+            
+            if category:
+                query = query.eq("category", category)
+            
+            if since:
+                query = query.gte("date", since.isoformat())
+            
+            if until:
+                query = query.lt("date", until.isoformat())
+            
+            # id breaks ties between equal dates so pages don't overlap
+            return query.order("date", desc=True).order("id")
+        
+        if limit and limit <= PAGE_SIZE:
+            return (await build().limit(limit).execute()).data
+        
+        # PostgREST caps rows per response; page until the limit or the last row
+        rows: List[Row] = []
+        while not limit or len(rows) < limit:
+            size = min(PAGE_SIZE, limit - len(rows)) if limit else PAGE_SIZE
+            page = (await build().range(len(rows), len(rows) + size - 1).execute()).data
+            rows.extend(page)
+            if len(page) < size:
+                break
+        return rows
+    
+    async def has_rollups(self, user_id: str) -> bool:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("rollup_state").select("user_id").eq("user_id", user_id).execute()
+        return bool(result.data)
+    
+    async def query_rollups(self, table: str, user_id: str, after: Optional[str] = None) -> List[Row]:
+        supabase = await get_async_supabase_client()
+        
+        query = supabase.table(f"rollup_{table}").select("*").eq("user_id", user_id)
+        
+        if after:
+            query = query.gt("month" if table == "month_type" else "day", after)
+        
+        return (await query.execute()).data
+    
+    async def match_memory_vectors(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Row]:
+        supabase = await get_async_supabase_client()
+        result = await supabase.rpc(
+            "match_memory_vectors",
+            {
+                "query_embedding": query_embedding,
+                "match_user_id": user_id,
+                "match_threshold": threshold,
+                "match_count": limit
+            }
+        ).execute()
+        return result.data
+    
+    async def list_memory_vectors(self, user_id: str, limit: Optional[int] = None) -> List[Row]:
+        supabase = await get_async_supabase_client()
+        
+        query = supabase.table("memory_vectors").select("id,user_id,text,metadata,created_at").eq("user_id", user_id)
+        
+        if limit:
+            query = query.limit(limit)
+        
+        return (await query.execute()).data
+    
+    async def count_memory_vectors(self, user_id: str) -> int:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("memory_vectors").select("id", count="exact").eq("user_id", user_id).limit(1).execute()
+        return result.count or 0
+    
+    async def get_ai_insights(self, user_id: str, scope: str) -> Optional[Row]:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("ai_insights").select("*").eq("user_id", user_id).eq("scope", scope).execute()
+        return result.data[0] if result.data else None
+    
+    async def get_chat_context(self, user_id: str) -> Optional[Row]:
+        supabase = await get_async_supabase_client()
+        result = await supabase.table("chat_contexts").select("*").eq("user_id", user_id).execute()
+        return result.data[0] if result.data else None
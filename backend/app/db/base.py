@@ -0,0 +1,202 @@
+"""
+Storage backend interface for the model layer
+"""
+from abc import ABC, abstractmethod
+from typing import List, Optional, Dict, Any
+from datetime import datetime
+
+# Rows are plain dicts shaped like Supabase/PostgREST results:
+# ids are strings, timestamps are ISO-8601 strings, metadata is a dict.
+Row = Dict[str, Any]
+
+class StorageBackend(ABC):
+    """Persistence operations used by app.models"""
+    
+    # Users
+    @abstractmethod
+    def get_user_by_phone(self, phone: str) -> Optional[Row]:
+        """Get a user row by normalized phone number"""
+    
+    @abstractmethod
+    def get_user_by_id(self, user_id: str) -> Optional[Row]:
+        """Get a user row by id"""
+    
+    @abstractmethod
+    def create_user(self, phone: str, name: Optional[str] = None) -> Row:
+        """Insert a user and return the stored row"""
+    
+    @abstractmethod
+    def get_data_version(self, user_id: str) -> Optional[str]:
+        """Token that changes whenever the user's transactions change (None if never written)"""
+    
+    @abstractmethod
+    def bump_data_version(self, user_id: str) -> str:
+        """Replace the user's data version with a new token and return it"""
+    
+    # Transactions
+    @abstractmethod
+    def insert_transactions(self, rows: List[Row]) -> List[Row]:
+        """Bulk insert transactions and return the stored rows"""
+    
+    @abstractmethod
+    def query_transactions(
+        self,
+        user_id: str,
+        since: Optional[datetime] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        until: Optional[datetime] = None
+    ) -> List[Row]:
+        """Get a user's transactions, newest first (since inclusive, until exclusive; every match unless limit)"""
+    
+    # Spending rollups
+    # Tables: "day_category" (day, category, type), "day_merchant" (day,
+    # merchant, type) and "month_type" (month, type). Rows carry amount and
+    # count; day_category rows also carry first_at/last_at timestamps.
+    @abstractmethod
+    def has_rollups(self, user_id: str) -> bool:
+        """Whether the user's rollups have been built"""
+    
+    @abstractmethod
+    def apply_rollups(self, user_id: str, rollups: Dict[str, List[Row]], replace: bool = False) -> None:
+        """
+        Add rollup deltas to a user's rollups in one transaction and mark them built
+        
+        With replace=True the user's existing rollups are dropped first.
+        """
+    
+    @abstractmethod
+    def query_rollups(self, table: str, user_id: str, after: Optional[str] = None) -> List[Row]:
+        """Get a user's rollup rows, optionally only those keyed after a day/month"""
+    
+    @abstractmethod
+    def clear_rollups(self, user_id: str) -> None:
+        """Drop a user's rollups so reads fall back to transactions until rebuilt"""
+    
+    # Memory vectors
+    @abstractmethod
+    def insert_memory_vectors(self, rows: List[Row]) -> List[Row]:
+        """Bulk insert memory vectors (rows carry an 'embedding' list)"""
+    
+    @abstractmethod
+    def match_memory_vectors(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Row]:
+        """Cosine-similarity search over a user's memory vectors"""
+    
+    @abstractmethod
+    def list_memory_vectors(self, user_id: str, limit: Optional[int] = None) -> List[Row]:
+        """Get a user's memory vectors (without embeddings)"""
+    
+    @abstractmethod
+    def list_memory_vector_embeddings(self, user_id: str) -> List[Row]:
+        """Get all of a user's memory vectors with their embeddings (float lists), for rebuilding the local index"""
+    
+    @abstractmethod
+    def count_memory_vectors(self, user_id: str) -> int:
+        """Number of memory vectors stored for the user"""
+    
+    # AI insights
+    @abstractmethod
+    def get_ai_insights(self, user_id: str, scope: str) -> Optional[Row]:
+        """Get the user's stored AI insights row for a scope (summary_hash, summary, insights, updated_at)"""
+    
+    @abstractmethod
+    def save_ai_insights(
+        self,
+        user_id: str,
+        scope: str,
+        summary_hash: str,
+        summary: Dict[str, Any],
+        insights: List[Row]
+    ) -> None:
+        """Store AI insights with the summary that produced them, replacing older ones for the scope"""
+    
+    # Chat context snapshots
+    @abstractmethod
+    def get_chat_context(self, user_id: str) -> Optional[Row]:
+        """Get the user's chat context snapshot row (data_version, context, updated_at)"""
+    
+    @abstractmethod
+    def save_chat_context(self, user_id: str, data_version: str, context: Dict[str, Any]) -> None:
+        """Store the chat context built at data_version, replacing the previous one"""
+    
+    def close(self) -> None:
+        """Release connections"""
+
+class AsyncStorageBackend(ABC):
+    """
+    Awaitable reads used by request handlers
+    
+    Mirrors the read side of StorageBackend (plus create_user, which
+    login needs) so endpoints never block the event loop on I/O. Bulk
+    writes happen in ingestion worker threads and stay synchronous.
+    """
+    
+    @abstractmethod
+    async def get_user_by_phone(self, phone: str) -> Optional[Row]:
+        """Get a user row by normalized phone number"""
+    
+    @abstractmethod
+    async def get_user_by_id(self, user_id: str) -> Optional[Row]:
+        """Get a user row by id"""
+    
+    @abstractmethod
+    async def create_user(self, phone: str, name: Optional[str] = None) -> Row:
+        """Insert a user and return the stored row"""
+    
+    @abstractmethod
+    async def get_data_version(self, user_id: str) -> Optional[str]:
+        """Token that changes whenever the user's transactions change (None if never written)"""
+    
+    @abstractmethod
+    async def query_transactions(
+        self,
+        user_id: str,
+        since: Optional[datetime] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        until: Optional[datetime] = None
+    ) -> List[Row]:
+        """Get a user's transactions, newest first (since inclusive, until exclusive)"""
+    
+    @abstractmethod
+    async def has_rollups(self, user_id: str) -> bool:
+        """Whether the user's rollups have been built"""
+    
+    @abstractmethod
+    async def query_rollups(self, table: str, user_id: str, after: Optional[str] = None) -> List[Row]:
+        """Get a user's rollup rows, optionally only those keyed after a day/month"""
+    
+    @abstractmethod
+    async def match_memory_vectors(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Row]:
+        """Cosine-similarity search over a user's memory vectors"""
+    
+    @abstractmethod
+    async def list_memory_vectors(self, user_id: str, limit: Optional[int] = None) -> List[Row]:
+        """Get a user's memory vectors (without embeddings)"""
+    
+    @abstractmethod
+    async def count_memory_vectors(self, user_id: str) -> int:
+        """Number of memory vectors stored for the user"""
+    
+    @abstractmethod
+    async def get_ai_insights(self, user_id: str, scope: str) -> Optional[Row]:
+        """Get the user's stored AI insights row for a scope"""
+    
+    @abstractmethod
+    async def get_chat_context(self, user_id: str) -> Optional[Row]:
+        """Get the user's chat context snapshot row"""
+    
+    async def close(self) -> None:
+        """Release connections"""
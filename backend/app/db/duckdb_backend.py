@@ -0,0 +1,43 @@
+"""
+DuckDB storage backend (embedded columnar store for analytics)
+"""
+import os
+import threading
+from typing import Any
+from app.db.sql_backend import SQLBackend
+
+try:
+    import duckdb
+except ImportError:  # Optional dependency
+    duckdb = None
+
+class DuckDBBackend(SQLBackend):
+    """
+    Store everything in a local DuckDB database file
+    
+    DuckDB allows one writer process per file, so this backend suits
+    single-process deployments, analytics jobs and load testing.
+    """
+    
+    def __init__(self, path: str):
+        if duckdb is None:
+            raise RuntimeError("DuckDB backend requires the 'duckdb' package (pip install duckdb)")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._database = duckdb.connect(path)
+        self._database_lock = threading.Lock()
+        super().__init__(path)
+    
+    def _connect(self) -> Any:
+        # Connections are not thread-safe; each thread gets its own cursor
+        with self._database_lock:
+            return self._database.cursor()
+    
+    def _begin(self, conn: Any) -> None:
+        # Cursors autocommit each statement unless a transaction is opened explicitly
+        conn.begin()
+    
+    def close(self) -> None:
+        super().close()
+        self._database.close()
@@ -0,0 +1,445 @@
+"""
+Shared implementation for embedded SQL storage backends
+"""
+from typing import List, Optional, Dict, Any, Sequence, Tuple
+from abc import abstractmethod
+from datetime import datetime
+import json
+import threading
+import uuid
+import numpy as np
+from app.db.base import StorageBackend, Row
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        phone TEXT NOT NULL,
+        name TEXT,
+        created_at TEXT NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_phone ON users (phone)",
+    """CREATE TABLE IF NOT EXISTS data_versions (
+        user_id TEXT PRIMARY KEY,
+        version TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS transactions (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        amount DOUBLE NOT NULL,
+        type TEXT NOT NULL,
+        merchant TEXT,
+        category TEXT NOT NULL,
+        raw_text TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions (user_id, category, date)",
+    """CREATE TABLE IF NOT EXISTS memory_vectors (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        text TEXT NOT NULL,
+        embedding BLOB,
+        metadata TEXT,
+        created_at TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_memory_vectors_user ON memory_vectors (user_id)",
+    """CREATE TABLE IF NOT EXISTS ai_insights (
+        user_id TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        summary_hash TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        insights TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, scope)
+    )""",
+    """CREATE TABLE IF NOT EXISTS chat_contexts (
+        user_id TEXT PRIMARY KEY,
+        data_version TEXT NOT NULL,
+        context TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS rollup_day_category (
+        user_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        type TEXT NOT NULL,
+        amount DOUBLE NOT NULL,
+        count INTEGER NOT NULL,
+        first_at TEXT NOT NULL,
+        last_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, day, category, type)
+    )""",
+    """CREATE TABLE IF NOT EXISTS rollup_day_merchant (
+        user_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        merchant TEXT NOT NULL,
+        type TEXT NOT NULL,
+        amount DOUBLE NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, merchant, type)
+    )""",
+    """CREATE TABLE IF NOT EXISTS rollup_month_type (
+        user_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        type TEXT NOT NULL,
+        amount DOUBLE NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, month, type)
+    )""",
+    """CREATE TABLE IF NOT EXISTS rollup_state (
+        user_id TEXT PRIMARY KEY,
+        built_at TEXT NOT NULL
+    )""",
+]
+
+# Rollup table -> (key columns after user_id, range column, extra columns)
+ROLLUP_TABLES = {
+    "day_category": (("day", "category", "type"), "day", ("first_at", "last_at")),
+    "day_merchant": (("day", "merchant", "type"), "day", ()),
+    "month_type": (("month", "type"), "month", ()),
+}
+
+TRANSACTION_COLUMNS = "id, user_id, date, amount, type, merchant, category, raw_text, created_at"
+MEMORY_COLUMNS = "id, user_id, text, metadata, created_at"
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
+class SQLBackend(StorageBackend):
+    """
+    Storage on an embedded SQL engine with DB-API '?' parameters
+    
+    Subclasses provide _connect(), which returns a connection for the
+    calling thread; connections are cached per thread.
+    """
+    
+    schema: List[str] = SCHEMA
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[Any] = []
+        self._write_lock = threading.Lock()
+        self._create_schema()
+    
+    @abstractmethod
+    def _connect(self) -> Any:
+        """Open a connection for the calling thread"""
+    
+    def _connection(self) -> Any:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._write_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self) -> None:
+        with self._write_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections = []
+        self._local = threading.local()
+    
+    def _create_schema(self) -> None:
+        conn = self._connection()
+        for statement in self.schema:
+            conn.execute(statement)
+        conn.commit()
+    
+    def _query(self, sql: str, params: Sequence[Any] = ()) -> List[Row]:
+        cursor = self._connection().execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def _insert_many(self, sql: str, rows: List[Sequence[Any]]) -> None:
+        self._write([(sql, rows)])
+    
+    def _begin(self, conn: Any) -> None:
+        """Open a transaction for _write (sqlite3 opens one implicitly before the first write)"""
+    
+    def _write(self, statements: List[Tuple[str, List[Sequence[Any]]]]) -> None:
+        """Run several statements in one transaction"""
+        conn = self._connection()
+        with self._write_lock:
+            self._begin(conn)
+            try:
+                for sql, rows in statements:
+                    if rows:
+                        conn.executemany(sql, rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    # Users
+    def get_user_by_phone(self, phone: str) -> Optional[Row]:
+        rows = self._query("SELECT * FROM users WHERE phone = ?", (phone,))
+        return rows[0] if rows else None
+    
+    def get_user_by_id(self, user_id: str) -> Optional[Row]:
+        rows = self._query("SELECT * FROM users WHERE id = ?", (user_id,))
+        return rows[0] if rows else None
+    
+    def create_user(self, phone: str, name: Optional[str] = None) -> Row:
+        row = {"id": _new_id(), "phone": phone, "name": name, "created_at": _now()}
+        self._insert_many(
+            "INSERT INTO users (id, phone, name, created_at) VALUES (?, ?, ?, ?)",
+            [(row["id"], row["phone"], row["name"], row["created_at"])]
+        )
+        return row
+    
+    def get_data_version(self, user_id: str) -> Optional[str]:
+        rows = self._query("SELECT version FROM data_versions WHERE user_id = ?", (user_id,))
+        return rows[0]["version"] if rows else None
+    
+    def bump_data_version(self, user_id: str) -> str:
+        version = _new_id()
+        self._insert_many(
+            "INSERT INTO data_versions (user_id, version, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = excluded.version, updated_at = excluded.updated_at",
+            [(user_id, version, _now())]
+        )
+        return version
+    
+    # Transactions
+    def insert_transactions(self, rows: List[Row]) -> List[Row]:
+        created_at = _now()
+        stored = [{"id": _new_id(), **row, "created_at": created_at} for row in rows]
+        self._insert_many(
+            f"INSERT INTO transactions ({TRANSACTION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    row["id"], row["user_id"], row["date"], row["amount"], row["type"],
+                    row.get("merchant"), row["category"], row["raw_text"], row["created_at"]
+                )
+                for row in stored
+            ]
+        )
+        return stored
+    
+    def query_transactions(
+        self,
+        user_id: str,
+        since: Optional[datetime] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        until: Optional[datetime] = None
+    ) -> List[Row]:
+        sql = f"SELECT {TRANSACTION_COLUMNS} FROM transactions WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        
+        if category:
+            sql += " AND category = ?"
+            params.append(category)
+        
+        if since:
+            sql += " AND date >= ?"
+            params.append(since.isoformat())
+        
+        if until:
+            sql += " AND date < ?"
+            params.append(until.isoformat())
+        
+        sql += " ORDER BY date DESC"
+        
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        return self._query(sql, params)
+    
+    # Spending rollups
+    def has_rollups(self, user_id: str) -> bool:
+        return bool(self._query("SELECT user_id FROM rollup_state WHERE user_id = ?", (user_id,)))
+    
+    def apply_rollups(self, user_id: str, rollups: Dict[str, List[Row]], replace: bool = False) -> None:
+        statements: List[Tuple[str, List[Sequence[Any]]]] = []
+        
+        if replace:
+            for table in ROLLUP_TABLES:
+                statements.append((f"DELETE FROM rollup_{table} WHERE user_id = ?", [(user_id,)]))
+        
+        for table, (keys, _, extras) in ROLLUP_TABLES.items():
+            columns = ("user_id",) + keys + ("amount", "count") + extras
+            # Deltas add to existing totals; first_at/last_at widen the range
+            updates = [
+                f"amount = rollup_{table}.amount + excluded.amount",
+                f"count = rollup_{table}.count + excluded.count",
+            ]
+            if "first_at" in extras:
+                updates += [
+                    f"first_at = CASE WHEN excluded.first_at < rollup_{table}.first_at "
+                    f"THEN excluded.first_at ELSE rollup_{table}.first_at END",
+                    f"last_at = CASE WHEN excluded.last_at > rollup_{table}.last_at "
+                    f"THEN excluded.last_at ELSE rollup_{table}.last_at END",
+                ]
+            statements.append((
+                f"INSERT INTO rollup_{table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT (user_id, {', '.join(keys)}) DO UPDATE SET {', '.join(updates)}",
+                [(user_id,) + tuple(row[column] for column in columns[1:]) for row in rollups.get(table, [])]
+            ))
+        
+        statements.append(("DELETE FROM rollup_state WHERE user_id = ?", [(user_id,)]))
+        statements.append(("INSERT INTO rollup_state (user_id, built_at) VALUES (?, ?)", [(user_id, _now())]))
+        self._write(statements)
+    
+    def query_rollups(self, table: str, user_id: str, after: Optional[str] = None) -> List[Row]:
+        keys, range_column, extras = ROLLUP_TABLES[table]
+        columns = ", ".join(keys + ("amount", "count") + extras)
+        sql = f"SELECT {columns} FROM rollup_{table} WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if after:
+            sql += f" AND {range_column} > ?"
+            params.append(after)
+        return self._query(sql, params)
+    
+    def clear_rollups(self, user_id: str) -> None:
+        self._write([
+            (f"DELETE FROM rollup_{table} WHERE user_id = ?", [(user_id,)])
+            for table in list(ROLLUP_TABLES) + ["state"]
+        ])
+    
+    # Memory vectors
+    def insert_memory_vectors(self, rows: List[Row]) -> List[Row]:
+        created_at = _now()
+        stored = []
+        values = []
+        for row in rows:
+            item = {
+                "id": _new_id(),
+                "user_id": row["user_id"],
+                "text": row["text"],
+                "metadata": row.get("metadata") or {},
+                "created_at": created_at
+            }
+            stored.append(item)
+            values.append((
+                item["id"], item["user_id"], item["text"],
+                np.asarray(row["embedding"], dtype=np.float32).tobytes(),
+                json.dumps(item["metadata"]), item["created_at"]
+            ))
+        
+        self._insert_many(
+            "INSERT INTO memory_vectors (id, user_id, text, embedding, metadata, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            values
+        )
+        return stored
+    
+    def match_memory_vectors(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Row]:
+        rows = self._query(
+            f"SELECT {MEMORY_COLUMNS}, embedding FROM memory_vectors WHERE user_id = ?",
+            (user_id,)
+        )
+        if not rows:
+            return []
+        
+        matrix = np.stack([np.frombuffer(row.pop("embedding"), dtype=np.float32) for row in rows])
+        query = np.asarray(query_embedding, dtype=np.float32)
+        
+        # Cosine similarity, same as pgvector's 1 - (a <=> b)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        similarities = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+        
+        order = np.argsort(-similarities)
+        matches = []
+        for i in order:
+            if similarities[i] <= threshold or len(matches) >= limit:
+                break
+            row = self._memory_row(rows[i])
+            row["similarity"] = float(similarities[i])
+            matches.append(row)
+        return matches
+    
+    def list_memory_vectors(self, user_id: str, limit: Optional[int] = None) -> List[Row]:
+        sql = f"SELECT {MEMORY_COLUMNS} FROM memory_vectors WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._memory_row(row) for row in self._query(sql, params)]
+    
+    def list_memory_vector_embeddings(self, user_id: str) -> List[Row]:
+        rows = self._query(
+            f"SELECT {MEMORY_COLUMNS}, embedding FROM memory_vectors WHERE user_id = ?",
+            (user_id,)
+        )
+        for row in rows:
+            row["embedding"] = np.frombuffer(row["embedding"], dtype=np.float32).tolist()
+        return [self._memory_row(row) for row in rows]
+    
+    def count_memory_vectors(self, user_id: str) -> int:
+        rows = self._query("SELECT COUNT(*) AS count FROM memory_vectors WHERE user_id = ?", (user_id,))
+        return int(rows[0]["count"])
+    
+    def _memory_row(self, row: Row) -> Row:
+        metadata = row.get("metadata")
+        row["metadata"] = json.loads(metadata) if metadata else {}
+        return row
+    
+    # AI insights
+    def get_ai_insights(self, user_id: str, scope: str) -> Optional[Row]:
+        rows = self._query(
+            "SELECT user_id, scope, summary_hash, summary, insights, updated_at FROM ai_insights "
+            "WHERE user_id = ? AND scope = ?",
+            (user_id, scope)
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        row["summary"] = json.loads(row["summary"])
+        row["insights"] = json.loads(row["insights"])
+        return row
+    
+    def save_ai_insights(
+        self,
+        user_id: str,
+        scope: str,
+        summary_hash: str,
+        summary: Dict[str, Any],
+        insights: List[Row]
+    ) -> None:
+        self._insert_many(
+            "INSERT INTO ai_insights (user_id, scope, summary_hash, summary, insights, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, scope) DO UPDATE SET summary_hash = excluded.summary_hash, "
+            "summary = excluded.summary, insights = excluded.insights, updated_at = excluded.updated_at",
+            [(user_id, scope, summary_hash, json.dumps(summary), json.dumps(insights), _now())]
+        )
+    
+    # Chat context snapshots
+    def get_chat_context(self, user_id: str) -> Optional[Row]:
+        rows = self._query(
+            "SELECT user_id, data_version, context, updated_at FROM chat_contexts WHERE user_id = ?",
+            (user_id,)
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        row["context"] = json.loads(row["context"])
+        return row
+    
+    def save_chat_context(self, user_id: str, data_version: str, context: Dict[str, Any]) -> None:
+        self._insert_many(
+            "INSERT INTO chat_contexts (user_id, data_version, context, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET data_version = excluded.data_version, "
+            "context = excluded.context, updated_at = excluded.updated_at",
+            [(user_id, data_version, json.dumps(context), _now())]
+        )
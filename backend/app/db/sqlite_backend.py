@@ -0,0 +1,18 @@
+"""
+SQLite storage backend (embedded OLTP store)
+"""
+import os
+import sqlite3
+from app.db.sql_backend import SQLBackend
+
+class SQLiteBackend(SQLBackend):
+    """Store everything in a local SQLite database file"""
+    
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
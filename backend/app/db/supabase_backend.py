@@ -0,0 +1,229 @@
+"""
+Supabase (PostgREST + pgvector) storage backend
+"""
+from typing import List, Optional, Dict, Any
+import json
+import uuid
+from datetime import datetime
+from app.config.supabase import get_supabase_client
+from app.db.base import StorageBackend, Row
+
+PAGE_SIZE = 1000  # PostgREST's default max rows per response
+
+class SupabaseBackend(StorageBackend):
+    """Store everything in Supabase over its REST API"""
+    
+    def get_user_by_phone(self, phone: str) -> Optional[Row]:
+        supabase = get_supabase_client()
+        result = supabase.table("users").select("*").eq("phone", phone).execute()
+        return result.data[0] if result.data else None
+    
+    def get_user_by_id(self, user_id: str) -> Optional[Row]:
+        supabase = get_supabase_client()
+        result = supabase.table("users").select("*").eq("id", user_id).execute()
+        return result.data[0] if result.data else None
+    
+    def create_user(self, phone: str, name: Optional[str] = None) -> Row:
+        supabase = get_supabase_client()
+        result = supabase.table("users").insert({
+            "phone": phone,
+            "name": name
+        }).execute()
+        return result.data[0]
+    
+    def get_data_version(self, user_id: str) -> Optional[str]:
+        supabase = get_supabase_client()
+        result = supabase.table("data_versions").select("version").eq("user_id", user_id).execute()
+        return result.data[0]["version"] if result.data else None
+    
+    def bump_data_version(self, user_id: str) -> str:
+        supabase = get_supabase_client()
+        # A fresh random token, so no read-modify-write is needed
+        version = str(uuid.uuid4())
+        supabase.table("data_versions").upsert({
+            "user_id": user_id,
+            "version": version,
+            "updated_at": datetime.utcnow().isoformat()
+        }).execute()
+        return version
+    
+    def insert_transactions(self, rows: List[Row]) -> List[Row]:
+        supabase = get_supabase_client()
+        result = supabase.table("transactions").insert(rows).execute()
+        return result.data
+    
+    def query_transactions(
+        self,
+        user_id: str,
+        since: Optional[datetime] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        until: Optional[datetime] = None
+    ) -> List[Row]:
+        supabase = get_supabase_client()
+        
+        def build():
+            query = supabase.table("transactions").select("*").eq("user_id", user_id)
+            
+            if category:
+                query = query.eq("category", category)
+            
+            if since:
+                query = query.gte("date", since.isoformat())
+            
+            if until:
+                query = query.lt("date", until.isoformat())
+            
+            # id breaks ties between equal dates so pages don't overlap
+            return query.order("date", desc=True).order("id")
+        
+        if limit and limit <= PAGE_SIZE:
+            return build().limit(limit).execute().data
+        
+        # PostgREST caps rows per response; page until the limit or the last row
+        rows: List[Row] = []
+        while not limit or len(rows) < limit:
+            size = min(PAGE_SIZE, limit - len(rows)) if limit else PAGE_SIZE
+            page = build().range(len(rows), len(rows) + size - 1).execute().data
+            rows.extend(page)
+            if len(page) < size:
+                break
+        return rows
+    
+    def has_rollups(self, user_id: str) -> bool:
+        supabase = get_supabase_client()
+        result = supabase.table("rollup_state").select("user_id").eq("user_id", user_id).execute()
+        return bool(result.data)
+    
+    def apply_rollups(self, user_id: str, rollups: Dict[str, List[Row]], replace: bool = False) -> None:
+        supabase = get_supabase_client()
+        
+        # Increments need read-modify-write, so they run in a database function
+        supabase.rpc(
+            "apply_spending_rollups",
+            {
+                "match_user_id": user_id,
+                "deltas": rollups,
+                "replace_existing": replace
+            }
+        ).execute()
+    
+    def query_rollups(self, table: str, user_id: str, after: Optional[str] = None) -> List[Row]:
+        supabase = get_supabase_client()
+        
+        query = supabase.table(f"rollup_{table}").select("*").eq("user_id", user_id)
+        
+        if after:
+            query = query.gt("month" if table == "month_type" else "day", after)
+        
+        return query.execute().data
+    
+    def clear_rollups(self, user_id: str) -> None:
+        supabase = get_supabase_client()
+        # Drop the marker first so readers stop trusting the rows immediately
+        supabase.table("rollup_state").delete().eq("user_id", user_id).execute()
+        for table in ("day_category", "day_merchant", "month_type"):
+            supabase.table(f"rollup_{table}").delete().eq("user_id", user_id).execute()
+    
+    def insert_memory_vectors(self, rows: List[Row]) -> List[Row]:
+        supabase = get_supabase_client()
+        result = supabase.table("memory_vectors").insert(rows).execute()
+        return result.data
+    
+    def match_memory_vectors(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Row]:
+        supabase = get_supabase_client()
+        
+        # Note: This requires pgvector extension in Supabase
+        result = supabase.rpc(
+            "match_memory_vectors",
+            {
+                "query_embedding": query_embedding,
+                "match_user_id": user_id,
+                "match_threshold": threshold,
+                "match_count": limit
+            }
+        ).execute()
+        return result.data
+    
+    def list_memory_vectors(self, user_id: str, limit: Optional[int] = None) -> List[Row]:
+        supabase = get_supabase_client()
+        
+        query = supabase.table("memory_vectors").select("id,user_id,text,metadata,created_at").eq("user_id", user_id)
+        
+        if limit:
+            query = query.limit(limit)
+        
+        return query.execute().data
+    
+    def list_memory_vector_embeddings(self, user_id: str) -> List[Row]:
+        supabase = get_supabase_client()
+        
+        # PostgREST caps rows per response; page through the user's vectors
+        rows: List[Row] = []
+        while True:
+            page = (
+                supabase.table("memory_vectors")
+                .select("id,user_id,text,metadata,created_at,embedding")
+                .eq("user_id", user_id)
+                .order("id")
+                .range(len(rows), len(rows) + PAGE_SIZE - 1)
+                .execute()
+                .data
+            )
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+        
+        for row in rows:
+            # pgvector columns come back as "[0.1,0.2,...]" strings
+            if isinstance(row["embedding"], str):
+                row["embedding"] = json.loads(row["embedding"])
+        return rows
+    
+    def count_memory_vectors(self, user_id: str) -> int:
+        supabase = get_supabase_client()
+        result = supabase.table("memory_vectors").select("id", count="exact").eq("user_id", user_id).limit(1).execute()
+        return result.count or 0
+    
+    def get_ai_insights(self, user_id: str, scope: str) -> Optional[Row]:
+        supabase = get_supabase_client()
+        result = supabase.table("ai_insights").select("*").eq("user_id", user_id).eq("scope", scope).execute()
+        return result.data[0] if result.data else None
+    
+    def save_ai_insights(
+        self,
+        user_id: str,
+        scope: str,
+        summary_hash: str,
+        summary: Dict[str, Any],
+        insights: List[Row]
+    ) -> None:
+        supabase = get_supabase_client()
+        supabase.table("ai_insights").upsert({
+            "user_id": user_id,
+            "scope": scope,
+            "summary_hash": summary_hash,
+            "summary": summary,
+            "insights": insights,
+            "updated_at": datetime.utcnow().isoformat()
+        }, on_conflict="user_id,scope").execute()
+    
+    def get_chat_context(self, user_id: str) -> Optional[Row]:
+        supabase = get_supabase_client()
+        result = supabase.table("chat_contexts").select("*").eq("user_id", user_id).execute()
+        return result.data[0] if result.data else None
+    
+    def save_chat_context(self, user_id: str, data_version: str, context: Dict[str, Any]) -> None:
+        supabase = get_supabase_client()
+        supabase.table("chat_contexts").upsert({
+            "user_id": user_id,
+            "data_version": data_version,
+            "context": context,
+            "updated_at": datetime.utcnow().isoformat()
+        }).execute()
@@ -0,0 +1,80 @@
+"""
+Async adapter that runs a synchronous storage backend in worker threads
+"""
+from typing import List, Optional
+from datetime import datetime
+import asyncio
+from app.db.base import AsyncStorageBackend, StorageBackend, Row
+
+class ThreadedAsyncBackend(AsyncStorageBackend):
+    """
+    Serve async reads from a synchronous backend via asyncio.to_thread
+    
+    Used for the embedded engines (SQLite, DuckDB), whose drivers have no
+    async API; calls are in-process, so a thread hop is all it takes to
+    keep them off the event loop. Connections stay per-thread as in
+    SQLBackend.
+    """
+    
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+    
+    async def get_user_by_phone(self, phone: str) -> Optional[Row]:
+        return await asyncio.to_thread(self.backend.get_user_by_phone, phone)
+    
+    async def get_user_by_id(self, user_id: str) -> Optional[Row]:
+        return await asyncio.to_thread(self.backend.get_user_by_id, user_id)
+    
+    async def create_user(self, phone: str, name: Optional[str] = None) -> Row:
+        return await asyncio.to_thread(self.backend.create_user, phone, name)
+    
+    async def get_data_version(self, user_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.backend.get_data_version, user_id)
+    
+    async def query_transactions(
+        self,
+        user_id: str,
+        since: Optional[datetime] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None,
+        until: Optional[datetime] = None
+    ) -> List[Row]:
+        return await asyncio.to_thread(
+            self.backend.query_transactions,
+            user_id,
+            since=since,
+            category=category,
+            limit=limit,
+            until=until
+        )
+    
+    async def has_rollups(self, user_id: str) -> bool:
+        return await asyncio.to_thread(self.backend.has_rollups, user_id)
+    
+    async def query_rollups(self, table: str, user_id: str, after: Optional[str] = None) -> List[Row]:
+        return await asyncio.to_thread(self.backend.query_rollups, table, user_id, after)
+    
+    async def match_memory_vectors(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        threshold: float,
+        limit: int
+    ) -> List[Row]:
+        return await asyncio.to_thread(self.backend.match_memory_vectors, user_id, query_embedding, threshold, limit)
+    
+    async def list_memory_vectors(self, user_id: str, limit: Optional[int] = None) -> List[Row]:
+        return await asyncio.to_thread(self.backend.list_memory_vectors, user_id, limit)
+    
+    async def count_memory_vectors(self, user_id: str) -> int:
+        return await asyncio.to_thread(self.backend.count_memory_vectors, user_id)
+    
+    async def get_ai_insights(self, user_id: str, scope: str) -> Optional[Row]:
+        return await asyncio.to_thread(self.backend.get_ai_insights, user_id, scope)
+    
+    async def get_chat_context(self, user_id: str) -> Optional[Row]:
+        return await asyncio.to_thread(self.backend.get_chat_context, user_id)
+    
+    async def close(self) -> None:
+        # The wrapped backend is owned (and closed) by app.config.storage
+        pass
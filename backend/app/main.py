@@ -3,15 +3,51 @@ UPISensei FastAPI Backend
 Main application entry point
 """
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import api_router
+from app.api import upload
 from app.config.settings import settings
+from app.config.supabase import close_supabase_clients, close_async_supabase_client
+from app.config.storage import close_storage, close_async_storage
+from app.config.gemini import get_gemini_stats
+from app.services.pdf_parser import shutdown_page_pool
+from app.services.response_cache import get_analysis_cache_stats, shutdown_analysis_cache
+from app.services.ai_insights import shutdown_ai_insights
+from app.services.vector_index import shutdown_vector_index
+from app.services.classification_cache import get_classification_cache_stats, close_classification_cache
+from app.services.embeddings import (
+    get_embedding_cache_stats,
+    get_embedding_batcher_stats,
+    close_embedding_cache,
+    stop_embedding_batcher
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks"""
+    yield
+    # Release worker pools on shutdown
+    upload.job_manager.shutdown()
+    upload.upload_executor.shutdown(wait=False, cancel_futures=True)
+    shutdown_page_pool()
+    shutdown_analysis_cache()
+    shutdown_ai_insights()
+    shutdown_vector_index()
+    stop_embedding_batcher()
+    close_embedding_cache()
+    close_classification_cache()
+    await close_async_storage()
+    close_storage()
+    await close_async_supabase_client()
+    close_supabase_clients()
 
 app = FastAPI(
     title="UPISensei API",
     description="AI-driven financial intelligence system for UPI transaction analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -34,3 +70,13 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "embedding_cache": get_embedding_cache_stats(),
+        "embedding_batcher": get_embedding_batcher_stats(),
+        "analysis_cache": get_analysis_cache_stats(),
+        "classification_cache": get_classification_cache_stats(),
+        "uploads": upload.upload_admission.stats(),
+        "gemini": get_gemini_stats()
+    }
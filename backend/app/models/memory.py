@@ -1,82 +1,130 @@
 """
 Memory vector model and database operations
 """
-from typing import List, Optional, Dict, Any
-from app.config.supabase import get_supabase_client
+from typing import List, Optional, Dict, Any, Tuple
+import numpy as np
+from app.config.settings import settings
+from app.config.storage import get_storage, get_async_storage
 from app.models.schemas import MemoryVectorCreate, MemoryVectorResponse
-from app.services.embeddings import get_embedding
+from app.services.embeddings import get_embedding, aget_embedding
+from app.services.vector_index import get_vector_index
+
+def _to_memory_response(item: Dict[str, Any]) -> MemoryVectorResponse:
+    """Convert a stored row to a response model"""
+    return MemoryVectorResponse(
+        id=item["id"],
+        user_id=item["user_id"],
+        text=item["text"],
+        metadata=item.get("metadata")
+    )
 
 def create_memory_vector(memory: MemoryVectorCreate, embedding: List[float]) -> MemoryVectorResponse:
     """Create a new memory vector"""
-    supabase = get_supabase_client()
-    
-    result = supabase.table("memory_vectors").insert({
+    rows = get_storage().insert_memory_vectors([{
         "user_id": memory.user_id,
         "text": memory.text,
         "embedding": embedding,
         "metadata": memory.metadata or {}
-    }).execute()
+    }])
     
-    item = result.data[0]
-    return MemoryVectorResponse(
-        id=item["id"],
-        user_id=item["user_id"],
-        text=item["text"],
-        metadata=item.get("metadata")
-    )
+    return _to_memory_response(rows[0])
+
+def create_memory_vectors(
+    memories: List[MemoryVectorCreate],
+    embeddings: List[List[float]]
+) -> List[MemoryVectorResponse]:
+    """Bulk insert memory vectors in a single write"""
+    rows = get_storage().insert_memory_vectors([
+        {
+            "user_id": memory.user_id,
+            "text": memory.text,
+            "embedding": embedding,
+            "metadata": memory.metadata or {}
+        }
+        for memory, embedding in zip(memories, embeddings)
+    ])
+    
+    return [_to_memory_response(item) for item in rows]
 
 def search_similar_memories(
     user_id: str,
     query_text: str,
     limit: int = 5,
-    threshold: float = 0.7
+    threshold: float = 0.7,
+    query_embedding: Optional[List[float]] = None
 ) -> List[MemoryVectorResponse]:
-    """Search for similar memories using vector similarity"""
-    supabase = get_supabase_client()
+    """
+    Search for similar memories using vector similarity
     
+    Pass query_embedding when the caller has already encoded query_text
+    (e.g. batched classification) to skip a second model call. Users whose
+    local vector index holds every stored memory are searched in-process;
+    others fall back to the storage backend while the index is rebuilt.
+    The stored memory count is only read when the index's last check has
+    expired (VECTOR_INDEX_VERIFY_SECONDS).
+    """
     # Get embedding for query
-    query_embedding = get_embedding(query_text)
+    if query_embedding is None:
+        query_embedding = get_embedding(query_text)
     
     # Perform vector similarity search
-    # Note: This requires pgvector extension in Supabase
-    result = supabase.rpc(
-        "match_memory_vectors",
-        {
-            "query_embedding": query_embedding,
-            "match_user_id": user_id,
-            "match_threshold": threshold,
-            "match_count": limit
-        }
-    ).execute()
+    if settings.VECTOR_INDEX_ENABLED:
+        index = get_vector_index()
+        if index.is_trusted(user_id) or _use_index(index, user_id, get_storage().count_memory_vectors(user_id)):
+            rows = index.search(user_id, query_embedding, limit, threshold)
+            return [_to_memory_response(item) for item in rows]
+    
+    rows = get_storage().match_memory_vectors(user_id, query_embedding, threshold, limit)
     
-    return [
-        MemoryVectorResponse(
-            id=item["id"],
-            user_id=item["user_id"],
-            text=item["text"],
-            metadata=item.get("metadata")
-        )
-        for item in result.data
-    ]
+    return [_to_memory_response(item) for item in rows]
 
-def get_user_memories(user_id: str, limit: Optional[int] = None) -> List[MemoryVectorResponse]:
-    """Get all memories for a user"""
-    supabase = get_supabase_client()
+async def asearch_similar_memories(
+    user_id: str,
+    query_text: str,
+    limit: int = 5,
+    threshold: float = 0.7,
+    query_embedding: Optional[List[float]] = None
+) -> List[MemoryVectorResponse]:
+    """search_similar_memories without blocking the event loop"""
+    if query_embedding is None:
+        query_embedding = await aget_embedding(query_text)
     
-    query = supabase.table("memory_vectors").select("*").eq("user_id", user_id)
+    # The local index is a memory-mapped scan; only the database path does network I/O
+    if settings.VECTOR_INDEX_ENABLED:
+        index = get_vector_index()
+        if index.is_trusted(user_id) or _use_index(
+            index, user_id, await get_async_storage().count_memory_vectors(user_id)
+        ):
+            rows = index.search(user_id, query_embedding, limit, threshold)
+            return [_to_memory_response(item) for item in rows]
     
-    if limit:
-        query = query.limit(limit)
+    rows = await get_async_storage().match_memory_vectors(user_id, query_embedding, threshold, limit)
     
-    result = query.execute()
+    return [_to_memory_response(item) for item in rows]
+
+def _use_index(index, user_id: str, stored_count: int) -> bool:
+    """Whether the local index can answer for the user; schedules a rebuild when it can't"""
+    if index.is_current(user_id, stored_count):
+        return True
+    # Memories stored before the index existed, a failed append, or rows another replica indexed
+    index.schedule_rebuild(user_id, load_index_rows)
+    return False
+
+def load_index_rows(user_id: str) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """Every stored memory for the user, as vector index items and embeddings"""
+    rows = get_storage().list_memory_vector_embeddings(user_id)
+    items = [{"id": row["id"], "text": row["text"], "metadata": row.get("metadata") or {}} for row in rows]
+    embeddings = np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+    return items, embeddings.reshape(len(rows), settings.EMBEDDING_DIMENSION)
+
+def get_user_memories(user_id: str, limit: Optional[int] = None) -> List[MemoryVectorResponse]:
+    """Get all memories for a user"""
+    rows = get_storage().list_memory_vectors(user_id, limit=limit)
     
-    return [
-        MemoryVectorResponse(
-            id=item["id"],
-            user_id=item["user_id"],
-            text=item["text"],
-            metadata=item.get("metadata")
-        )
-        for item in result.data
-    ]
+    return [_to_memory_response(item) for item in rows]
 
+async def aget_user_memories(user_id: str, limit: Optional[int] = None) -> List[MemoryVectorResponse]:
+    """Get all memories for a user without blocking the event loop"""
+    rows = await get_async_storage().list_memory_vectors(user_id, limit=limit)
+    
+    return [_to_memory_response(item) for item in rows]
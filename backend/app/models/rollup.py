@@ -0,0 +1,162 @@
+"""
+Spending rollup model and database operations
+"""
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta, time
+import asyncio
+import threading
+from app.config.storage import get_storage, get_async_storage
+
+# Serializes rollup maintenance per user (striped to bound memory)
+_locks = [threading.Lock() for _ in range(64)]
+
+class SpendingRollups:
+    """
+    Rollup rows covering one analysis window
+    
+    day_category and day_merchant always cover the whole window;
+    month_type is only set when the window is the full history.
+    """
+    
+    def __init__(
+        self,
+        day_category: List[Dict[str, Any]],
+        day_merchant: List[Dict[str, Any]],
+        month_type: Optional[List[Dict[str, Any]]] = None
+    ):
+        self.day_category = day_category
+        self.day_merchant = day_merchant
+        self.month_type = month_type
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def build_rollups(rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Aggregate stored transaction rows into rollup deltas"""
+    day_category: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    day_merchant: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    month_type: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    
+    for row in rows:
+        date = _parse_date(row["date"])
+        day = date.strftime("%Y-%m-%d")
+        month = date.strftime("%Y-%m")
+        txn_type = row["type"]
+        amount = row["amount"]
+        
+        key = (day, row["category"], txn_type)
+        item = day_category.get(key)
+        if item is None:
+            day_category[key] = {
+                "day": day, "category": row["category"], "type": txn_type,
+                "amount": amount, "count": 1, "first_at": row["date"], "last_at": row["date"]
+            }
+        else:
+            item["amount"] += amount
+            item["count"] += 1
+            if _parse_date(item["first_at"]) > date:
+                item["first_at"] = row["date"]
+            if _parse_date(item["last_at"]) < date:
+                item["last_at"] = row["date"]
+        
+        if row.get("merchant"):
+            key = (day, row["merchant"], txn_type)
+            item = day_merchant.setdefault(key, {
+                "day": day, "merchant": row["merchant"], "type": txn_type, "amount": 0.0, "count": 0
+            })
+            item["amount"] += amount
+            item["count"] += 1
+        
+        key = (month, txn_type)
+        item = month_type.setdefault(key, {"month": month, "type": txn_type, "amount": 0.0, "count": 0})
+        item["amount"] += amount
+        item["count"] += 1
+    
+    return {
+        "day_category": list(day_category.values()),
+        "day_merchant": list(day_merchant.values()),
+        "month_type": list(month_type.values())
+    }
+
+def update_rollups(user_id: str, rows: List[Dict[str, Any]]) -> None:
+    """Fold newly stored transaction rows into the user's rollups"""
+    storage = get_storage()
+    with _locks[hash(user_id) % len(_locks)]:
+        try:
+            if storage.has_rollups(user_id):
+                storage.apply_rollups(user_id, build_rollups(rows))
+            else:
+                # First write since rollups were introduced: build from the full history
+                storage.apply_rollups(user_id, build_rollups(storage.query_transactions(user_id)), replace=True)
+        except Exception as e:
+            print(f"Error updating rollups for user {user_id}: {e}")
+            # A missed delta would make the rollups wrong; fall back to raw reads until rebuilt
+            try:
+                storage.clear_rollups(user_id)
+            except Exception as e:
+                print(f"Error clearing rollups for user {user_id}: {e}")
+
+def get_spending_rollups(user_id: str, days: Optional[int] = None) -> Optional[SpendingRollups]:
+    """
+    Get rollups for the last `days` days (all history when falsy)
+    
+    Returns None when the user's rollups have not been built. Whole days
+    inside the window come from the day rollups; the partial first day is
+    aggregated from its raw transactions so totals match a transaction scan.
+    """
+    storage = get_storage()
+    if not storage.has_rollups(user_id):
+        return None
+    
+    if not days:
+        return SpendingRollups(
+            day_category=storage.query_rollups("day_category", user_id),
+            day_merchant=storage.query_rollups("day_merchant", user_id),
+            month_type=storage.query_rollups("month_type", user_id)
+        )
+    
+    since = datetime.utcnow() - timedelta(days=days)
+    first_day = since.date()
+    edge = build_rollups(storage.query_transactions(
+        user_id,
+        since=since,
+        until=datetime.combine(first_day + timedelta(days=1), time.min)
+    ))
+    
+    after = first_day.isoformat()
+    return SpendingRollups(
+        day_category=storage.query_rollups("day_category", user_id, after=after) + edge["day_category"],
+        day_merchant=storage.query_rollups("day_merchant", user_id, after=after) + edge["day_merchant"]
+    )
+
+async def aget_spending_rollups(user_id: str, days: Optional[int] = None) -> Optional[SpendingRollups]:
+    """get_spending_rollups without blocking the event loop (the reads run concurrently)"""
+    storage = get_async_storage()
+    if not await storage.has_rollups(user_id):
+        return None
+    
+    if not days:
+        day_category, day_merchant, month_type = await asyncio.gather(
+            storage.query_rollups("day_category", user_id),
+            storage.query_rollups("day_merchant", user_id),
+            storage.query_rollups("month_type", user_id)
+        )
+        return SpendingRollups(day_category=day_category, day_merchant=day_merchant, month_type=month_type)
+    
+    since = datetime.utcnow() - timedelta(days=days)
+    first_day = since.date()
+    after = first_day.isoformat()
+    edge_rows, day_category, day_merchant = await asyncio.gather(
+        storage.query_transactions(
+            user_id,
+            since=since,
+            until=datetime.combine(first_day + timedelta(days=1), time.min)
+        ),
+        storage.query_rollups("day_category", user_id, after=after),
+        storage.query_rollups("day_merchant", user_id, after=after)
+    )
+    edge = build_rollups(edge_rows)
+    return SpendingRollups(
+        day_category=day_category + edge["day_category"],
+        day_merchant=day_merchant + edge["day_merchant"]
+    )
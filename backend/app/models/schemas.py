@@ -58,6 +58,23 @@ class UploadResponse(BaseModel):
     transaction_count: int
     message: str
 
+class UploadJobStage(BaseModel):
+    name: str
+    status: str = "pending"  # pending, running, completed, failed
+    progress: float = 0.0
+    detail: Optional[str] = None
+
+class UploadJobResponse(BaseModel):
+    job_id: str
+    kind: str  # pdf/csv
+    filename: Optional[str] = None
+    status: str  # queued, running, completed, failed
+    stages: List[UploadJobStage]
+    result: Optional[UploadResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 # Analysis schemas
 class CategorySummary(BaseModel):
     category: str
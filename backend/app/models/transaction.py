@@ -1,15 +1,30 @@
 """
 Transaction model and database operations
 """
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from app.config.supabase import get_supabase_client
+from app.config.settings import settings
+from app.config.storage import get_storage, get_async_storage
+from app.models.rollup import update_rollups
+from app.models.user import bump_data_version
 from app.models.schemas import TransactionCreate, TransactionResponse
 
+def _to_transaction_response(item: Dict[str, Any]) -> TransactionResponse:
+    """Convert a stored row to a response model"""
+    return TransactionResponse(
+        id=item["id"],
+        user_id=item["user_id"],
+        date=datetime.fromisoformat(item["date"].replace("Z", "+00:00")),
+        amount=item["amount"],
+        type=item["type"],
+        merchant=item.get("merchant"),
+        category=item["category"],
+        raw_text=item["raw_text"],
+        created_at=datetime.fromisoformat(item["created_at"].replace("Z", "+00:00"))
+    )
+
 def create_transactions(transactions: List[TransactionCreate]) -> List[TransactionResponse]:
     """Bulk insert transactions"""
-    supabase = get_supabase_client()
-    
     transaction_data = [
         {
             "user_id": txn.user_id,
@@ -23,22 +38,18 @@ def create_transactions(transactions: List[TransactionCreate]) -> List[Transacti
         for txn in transactions
     ]
     
-    result = supabase.table("transactions").insert(transaction_data).execute()
+    rows = get_storage().insert_transactions(transaction_data)
     
-    return [
-        TransactionResponse(
-            id=item["id"],
-            user_id=item["user_id"],
-            date=datetime.fromisoformat(item["date"].replace("Z", "+00:00")),
-            amount=item["amount"],
-            type=item["type"],
-            merchant=item.get("merchant"),
-            category=item["category"],
-            raw_text=item["raw_text"],
-            created_at=datetime.fromisoformat(item["created_at"].replace("Z", "+00:00"))
-        )
-        for item in result.data
-    ]
+    rows_by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for item in rows:
+        rows_by_user.setdefault(item["user_id"], []).append(item)
+    for user_id, user_rows in rows_by_user.items():
+        if settings.ROLLUPS_ENABLED:
+            update_rollups(user_id, user_rows)
+        # Invalidates cached analysis for the user
+        bump_data_version(user_id)
+    
+    return [_to_transaction_response(item) for item in rows]
 
 def get_user_transactions(
     user_id: str,
@@ -46,35 +57,11 @@ def get_user_transactions(
     days: Optional[int] = None
 ) -> List[TransactionResponse]:
     """Get transactions for a user"""
-    supabase = get_supabase_client()
-    
-    query = supabase.table("transactions").select("*").eq("user_id", user_id)
-    
-    if days:
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        query = query.gte("date", cutoff_date.isoformat())
+    since = datetime.utcnow() - timedelta(days=days) if days else None
     
-    query = query.order("date", desc=True)
+    rows = get_storage().query_transactions(user_id, since=since, limit=limit)
     
-    if limit:
-        query = query.limit(limit)
-    
-    result = query.execute()
-    
-    return [
-        TransactionResponse(
-            id=item["id"],
-            user_id=item["user_id"],
-            date=datetime.fromisoformat(item["date"].replace("Z", "+00:00")),
-            amount=item["amount"],
-            type=item["type"],
-            merchant=item.get("merchant"),
-            category=item["category"],
-            raw_text=item["raw_text"],
-            created_at=datetime.fromisoformat(item["created_at"].replace("Z", "+00:00"))
-        )
-        for item in result.data
-    ]
+    return [_to_transaction_response(item) for item in rows]
 
 def get_transactions_by_category(
     user_id: str,
@@ -82,28 +69,32 @@ def get_transactions_by_category(
     days: Optional[int] = None
 ) -> List[TransactionResponse]:
     """Get transactions filtered by category"""
-    supabase = get_supabase_client()
+    since = datetime.utcnow() - timedelta(days=days) if days else None
     
-    query = supabase.table("transactions").select("*").eq("user_id", user_id).eq("category", category)
+    rows = get_storage().query_transactions(user_id, since=since, category=category)
     
-    if days:
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        query = query.gte("date", cutoff_date.isoformat())
+    return [_to_transaction_response(item) for item in rows]
+
+async def aget_user_transactions(
+    user_id: str,
+    limit: Optional[int] = None,
+    days: Optional[int] = None
+) -> List[TransactionResponse]:
+    """Get transactions for a user without blocking the event loop"""
+    since = datetime.utcnow() - timedelta(days=days) if days else None
     
-    result = query.order("date", desc=True).execute()
+    rows = await get_async_storage().query_transactions(user_id, since=since, limit=limit)
     
-    return [
-        TransactionResponse(
-            id=item["id"],
-            user_id=item["user_id"],
-            date=datetime.fromisoformat(item["date"].replace("Z", "+00:00")),
-            amount=item["amount"],
-            type=item["type"],
-            merchant=item.get("merchant"),
-            category=item["category"],
-            raw_text=item["raw_text"],
-            created_at=datetime.fromisoformat(item["created_at"].replace("Z", "+00:00"))
-        )
-        for item in result.data
-    ]
+    return [_to_transaction_response(item) for item in rows]
 
+async def aget_transactions_by_category(
+    user_id: str,
+    category: str,
+    days: Optional[int] = None
+) -> List[TransactionResponse]:
+    """Get transactions filtered by category without blocking the event loop"""
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    
+    rows = await get_async_storage().query_transactions(user_id, since=since, category=category)
+    
+    return [_to_transaction_response(item) for item in rows]
@@ -1,59 +1,79 @@
 """
 User model and database operations
 """
-from typing import Optional
+from typing import Optional, Dict, Any
 from datetime import datetime
-from app.config.supabase import get_supabase_client
+from app.config.storage import get_storage, get_async_storage
 from app.models.schemas import UserCreate, UserResponse
 
+def _to_user_response(user_data: Dict[str, Any]) -> UserResponse:
+    """Convert a stored row to a response model"""
+    return UserResponse(
+        id=user_data["id"],
+        phone=user_data["phone"],
+        name=user_data.get("name"),
+        created_at=datetime.fromisoformat(user_data["created_at"].replace("Z", "+00:00"))
+    )
+
 def get_or_create_user(phone: str, name: Optional[str] = None) -> UserResponse:
     """Get existing user or create new one"""
-    supabase = get_supabase_client()
+    storage = get_storage()
     
     # Normalize phone number
     phone = normalize_phone(phone)
     
     # Check if user exists
-    result = supabase.table("users").select("*").eq("phone", phone).execute()
+    user_data = storage.get_user_by_phone(phone)
     
-    if result.data:
-        user_data = result.data[0]
-        return UserResponse(
-            id=user_data["id"],
-            phone=user_data["phone"],
-            name=user_data.get("name"),
-            created_at=datetime.fromisoformat(user_data["created_at"].replace("Z", "+00:00"))
-        )
+    if user_data:
+        return _to_user_response(user_data)
     
     # Create new user
-    new_user = supabase.table("users").insert({
-        "phone": phone,
-        "name": name
-    }).execute()
-    
-    user_data = new_user.data[0]
-    return UserResponse(
-        id=user_data["id"],
-        phone=user_data["phone"],
-        name=user_data.get("name"),
-        created_at=datetime.fromisoformat(user_data["created_at"].replace("Z", "+00:00"))
-    )
+    return _to_user_response(storage.create_user(phone, name))
 
 def get_user_by_id(user_id: str) -> Optional[UserResponse]:
     """Get user by ID"""
-    supabase = get_supabase_client()
-    result = supabase.table("users").select("*").eq("id", user_id).execute()
+    user_data = get_storage().get_user_by_id(user_id)
+    
+    if user_data:
+        return _to_user_response(user_data)
+    return None
+
+async def aget_or_create_user(phone: str, name: Optional[str] = None) -> UserResponse:
+    """Get existing user or create new one without blocking the event loop"""
+    storage = get_async_storage()
+    phone = normalize_phone(phone)
     
-    if result.data:
-        user_data = result.data[0]
-        return UserResponse(
-            id=user_data["id"],
-            phone=user_data["phone"],
-            name=user_data.get("name"),
-            created_at=datetime.fromisoformat(user_data["created_at"].replace("Z", "+00:00"))
-        )
+    user_data = await storage.get_user_by_phone(phone)
+    if user_data:
+        return _to_user_response(user_data)
+    
+    return _to_user_response(await storage.create_user(phone, name))
+
+async def aget_user_by_id(user_id: str) -> Optional[UserResponse]:
+    """Get user by ID without blocking the event loop"""
+    user_data = await get_async_storage().get_user_by_id(user_id)
+    
+    if user_data:
+        return _to_user_response(user_data)
     return None
 
+def get_data_version(user_id: str) -> Optional[str]:
+    """Get the token that changes whenever the user's transactions change"""
+    return get_storage().get_data_version(user_id)
+
+async def aget_data_version(user_id: str) -> Optional[str]:
+    """Get the user's data version without blocking the event loop"""
+    return await get_async_storage().get_data_version(user_id)
+
+def bump_data_version(user_id: str) -> Optional[str]:
+    """Mark the user's data as changed so cached results are recomputed"""
+    try:
+        return get_storage().bump_data_version(user_id)
+    except Exception as e:
+        print(f"Error bumping data version for user {user_id}: {e}")
+        return None
+
 def normalize_phone(phone: str) -> str:
     """Normalize phone number to standard format"""
     # Remove all non-digit characters
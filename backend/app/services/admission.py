@@ -0,0 +1,114 @@
+"""
+Admission control for CPU-heavy requests
+"""
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Executor
+import asyncio
+import math
+import time
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in seconds"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bound how many requests run a heavy operation at once
+    
+    Up to max_concurrent requests run; up to max_queued more wait (at
+    most queue_timeout seconds) for a slot; anything beyond that is
+    rejected immediately with a Retry-After estimate derived from recent
+    run times. Slots are held until the submitted work actually finishes,
+    even if the client disconnects first. Meant to be used from one
+    event loop.
+    """
+    
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queued: int,
+        queue_timeout: float,
+        default_retry_after: int = 5
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+        self.default_retry_after = default_retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._running = 0
+        self._waiting = 0
+        # Exponentially weighted mean run time (seconds), None until measured
+        self._mean_seconds: Optional[float] = None
+        
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+    
+    async def run(self, executor: Executor, fn: Callable[..., Any], *args: Any) -> Any:
+        """Wait for a slot, then run fn(*args) on executor and return its result"""
+        await self._acquire()
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        
+        def done(_) -> None:
+            try:
+                loop.call_soon_threadsafe(self._release, time.monotonic() - started)
+            except RuntimeError:
+                pass  # Event loop already closed (shutdown)
+        
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(done)
+        return await asyncio.wrap_future(future)
+    
+    async def _acquire(self) -> None:
+        if not self._semaphore.locked():
+            # A slot is free: acquire() returns without suspending
+            await self._semaphore.acquire()
+        else:
+            if self._waiting >= self.max_queued:
+                self.rejected += 1
+                raise AdmissionRejected("Too many uploads in progress. Please retry shortly.", self.retry_after())
+            
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise AdmissionRejected("Timed out waiting for an upload slot. Please retry shortly.", self.retry_after())
+            finally:
+                self._waiting -= 1
+        
+        self._running += 1
+        self.admitted += 1
+    
+    def _release(self, seconds: Optional[float]) -> None:
+        self._running -= 1
+        self._semaphore.release()
+        if seconds is not None:
+            self._mean_seconds = seconds if self._mean_seconds is None else 0.8 * self._mean_seconds + 0.2 * seconds
+    
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new request"""
+        if self._mean_seconds is None:
+            return self.default_retry_after
+        rounds = (self._waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(self._mean_seconds * rounds))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Admission counters"""
+        return {
+            "running": self._running,
+            "waiting": self._waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "mean_seconds": round(self._mean_seconds, 3) if self._mean_seconds is not None else None
+        }
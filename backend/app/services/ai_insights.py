@@ -0,0 +1,224 @@
+"""
+Background AI insight generation with per-user caching
+"""
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import threading
+import time
+from app.config.settings import settings
+from app.config.gemini import get_gemini_gateway, GeminiQuotaError, PRIORITY_INSIGHTS
+from app.config.storage import get_storage, get_async_storage
+from app.models.schemas import Insight
+from app.services.features import TransactionFeatures
+
+def summarize(features: TransactionFeatures) -> Dict[str, Any]:
+    """The spending summary AI insights are generated from"""
+    return {
+        "total_spent": round(features.debit_total, 2),
+        "transactions": features.debit_count,
+        "categories": {category: round(amount, 2) for category, amount in features.category_totals.items()}
+    }
+
+def insights_scope(days: Optional[int]) -> str:
+    """Storage scope for insights on a transaction window (one stored row per user and window)"""
+    return f"{days}d" if days else "all"
+
+def summary_hash(summary: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(summary, sort_keys=True).encode("utf-8")).hexdigest()
+
+def summary_change(old: Dict[str, Any], new: Dict[str, Any]) -> float:
+    """Total absolute change in category spend, relative to the larger total"""
+    old_categories = old.get("categories", {})
+    new_categories = new.get("categories", {})
+    difference = sum(
+        abs(new_categories.get(category, 0.0) - old_categories.get(category, 0.0))
+        for category in set(old_categories) | set(new_categories)
+    )
+    return difference / max(old.get("total_spent", 0.0), new.get("total_spent", 0.0), 1.0)
+
+def generate_ai_insights(summary: Dict[str, Any]) -> List[Insight]:
+    """Ask Gemini for insights on a spending summary (raises on API errors)"""
+    prompt = f"""Analyze these transactions and provide 2-3 actionable insights:
+
+Total Spent: ₹{summary["total_spent"]:,.0f}
+Transactions: {summary["transactions"]}
+Categories: {summary["categories"]}
+
+Provide insights in this format:
+1. [TYPE: alert/recommendation/trend] [TITLE] - [MESSAGE]
+2. [TYPE] [TITLE] - [MESSAGE]
+
+Be specific and actionable."""
+    
+    ai_text = get_gemini_gateway().generate(prompt, priority=PRIORITY_INSIGHTS)
+    
+    # Parse AI response into insights
+    insights = []
+    lines = ai_text.split('\n')
+    for line in lines:
+        line = line.strip()
+        if not line or not line[0].isdigit():
+            continue
+        
+        # Extract insight components
+        if ':' in line:
+            parts = line.split(':', 1)
+            if len(parts) == 2:
+                header = parts[0].strip()
+                message = parts[1].strip()
+                
+                # Determine type and title
+                insight_type = "recommendation"
+                if "alert" in header.lower():
+                    insight_type = "alert"
+                elif "trend" in header.lower():
+                    insight_type = "trend"
+                
+                title = header.split(']')[1].strip() if ']' in header else "AI Insight"
+                
+                insights.append(Insight(
+                    type=insight_type,
+                    title=title,
+                    message=message,
+                    severity="medium"
+                ))
+    
+    return insights
+
+class AIInsightsService:
+    """
+    Serve AI insights from storage and regenerate them in the background
+    
+    Each user's insights are stored per scope (the analysis window) with
+    the summary (and its hash) that produced them. A request returns
+    whatever is stored for its scope and, when the current summary differs
+    by more than change_threshold, queues one regeneration for that user
+    and scope, at most once per min_interval_seconds.
+    Requests never wait on the model; a user with nothing stored gets no
+    AI insights until the first run finishes.
+    """
+    
+    def __init__(
+        self,
+        change_threshold: float = 0.1,
+        workers: int = 1,
+        retry_seconds: float = 300.0,
+        min_interval_seconds: float = 600.0
+    ):
+        self.change_threshold = change_threshold
+        self.retry_seconds = retry_seconds
+        self.min_interval = min_interval_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-insights")
+        # (user_id, scope) pairs being generated
+        self._pending: set = set()
+        # Earliest time each (user_id, scope) may be regenerated again
+        self._next_allowed: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+    
+    def get_insights(self, user_id: str, scope: str, features: TransactionFeatures) -> List[Insight]:
+        """Stored insights for the user and scope; schedules a refresh if the summary moved"""
+        try:
+            stored = get_storage().get_ai_insights(user_id, scope)
+        except Exception as e:
+            print(f"Error loading AI insights for user {user_id}: {e}")
+            return []
+        return self._serve((user_id, scope), features, stored)
+    
+    async def aget_insights(self, user_id: str, scope: str, features: TransactionFeatures) -> List[Insight]:
+        """get_insights without blocking the event loop on the storage read"""
+        try:
+            stored = await get_async_storage().get_ai_insights(user_id, scope)
+        except Exception as e:
+            print(f"Error loading AI insights for user {user_id}: {e}")
+            return []
+        return self._serve((user_id, scope), features, stored)
+    
+    def _serve(
+        self,
+        key: Tuple[str, str],
+        features: TransactionFeatures,
+        stored: Optional[Dict[str, Any]]
+    ) -> List[Insight]:
+        summary = summarize(features)
+        current_hash = summary_hash(summary)
+        
+        if stored is None:
+            self._schedule(key, summary, current_hash)
+            return []
+        
+        if stored["summary_hash"] != current_hash and summary_change(stored["summary"], summary) > self.change_threshold:
+            self._schedule(key, summary, current_hash)
+        
+        return [Insight(**item) for item in stored["insights"]]
+    
+    def _schedule(self, key: Tuple[str, str], summary: Dict[str, Any], current_hash: str) -> None:
+        with self._lock:
+            if key in self._pending or time.monotonic() < self._next_allowed.get(key, 0.0):
+                return
+            self._pending.add(key)
+        self._executor.submit(self._generate, key, summary, current_hash)
+    
+    def _generate(self, key: Tuple[str, str], summary: Dict[str, Any], current_hash: str) -> None:
+        user_id, scope = key
+        try:
+            insights = generate_ai_insights(summary)
+            get_storage().save_ai_insights(
+                user_id, scope, current_hash, summary, [insight.model_dump() for insight in insights]
+            )
+            with self._lock:
+                self._next_allowed[key] = time.monotonic() + self.min_interval
+        except Exception as e:
+            if isinstance(e, GeminiQuotaError):
+                print(f"Gemini quota exceeded - skipping AI insights")
+            else:
+                print(f"Error generating AI insights: {e}")
+            with self._lock:
+                self._next_allowed[key] = time.monotonic() + self.retry_seconds
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+    
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_service: Optional[AIInsightsService] = None
+_service_lock = threading.Lock()
+
+def get_ai_insights_service() -> AIInsightsService:
+    """Get the process-wide AI insights service"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AIInsightsService(
+                    change_threshold=settings.AI_INSIGHTS_CHANGE_THRESHOLD,
+                    workers=settings.AI_INSIGHTS_WORKERS,
+                    retry_seconds=settings.AI_INSIGHTS_RETRY_SECONDS,
+                    min_interval_seconds=settings.AI_INSIGHTS_MIN_INTERVAL_SECONDS
+                )
+    return _service
+
+async def aget_ai_insights_version(user_id: str, scope: str) -> Optional[str]:
+    """
+    When the user's stored insights for a scope last changed
+    
+    Part of the cache key for analysis responses that embed AI insights,
+    so a finished regeneration shows up without touching the data version.
+    """
+    if not settings.is_gemini_enabled:
+        return None
+    try:
+        stored = await get_async_storage().get_ai_insights(user_id, scope)
+    except Exception as e:
+        print(f"Error loading AI insights for user {user_id}: {e}")
+        return None
+    return str(stored["updated_at"]) if stored else None
+
+def shutdown_ai_insights() -> None:
+    """Stop background generation (called on application shutdown)"""
+    global _service
+    if _service is not None:
+        _service.shutdown()
+        _service = None
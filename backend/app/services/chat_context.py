@@ -0,0 +1,158 @@
+"""
+Per-user chat context snapshots, rebuilt when the user's data changes
+"""
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+import asyncio
+from app.config.settings import settings
+from app.config.storage import get_storage, get_async_storage
+from app.models.schemas import SpendingSummary, TransactionResponse
+from app.models.transaction import get_user_transactions, aget_user_transactions
+from app.models.user import get_data_version, aget_data_version
+from app.models.rollup import SpendingRollups, get_spending_rollups, aget_spending_rollups
+from app.services.stats import StatsService
+
+CONTEXT_DAYS = 90  # Transaction window the chat assistant sees
+
+stats_service = StatsService()
+
+def build_chat_context(summary: SpendingSummary, recent: List[TransactionResponse]) -> Dict[str, Any]:
+    """Build the chat context snapshot from a spending summary and the newest transactions"""
+    context = {
+        "total_spent": summary.total_spent,
+        "total_income": summary.total_income,
+        "net_balance": summary.net_balance,
+        "transaction_count": summary.transaction_count,
+        "top_categories": [
+            {"category": cat.category, "amount": cat.amount, "percentage": cat.percentage}
+            for cat in summary.categories[:5]
+        ],
+        "top_merchants": [
+            {"merchant": merchant["merchant"], "amount": merchant["amount"], "count": merchant["count"]}
+            for merchant in summary.top_merchants[:5]
+        ],
+        "recent_transactions": [
+            {
+                "date": txn.date.strftime('%Y-%m-%d'),
+                "description": txn.merchant or txn.raw_text[:50],
+                "amount": txn.amount,
+                "category": txn.category
+            }
+            for txn in recent[:10]
+        ]
+    }
+    context["text"] = render_chat_context(context)
+    return context
+
+def render_chat_context(context: Dict[str, Any]) -> str:
+    """Format a snapshot as the financial context block of the chat prompt"""
+    context_parts = []
+    
+    # Summary
+    context_parts.append(f"Total Spent: ₹{context['total_spent']:,.0f}")
+    context_parts.append(f"Total Income: ₹{context['total_income']:,.0f}")
+    context_parts.append(f"Net Balance: ₹{context['net_balance']:,.0f}")
+    context_parts.append(f"Transaction Count: {context['transaction_count']}")
+    
+    # Top categories
+    if context["top_categories"]:
+        context_parts.append("\nTop Spending Categories:")
+        for cat in context["top_categories"]:
+            context_parts.append(f"- {cat['category']}: ₹{cat['amount']:,.0f} ({cat['percentage']:.1f}%)")
+    
+    # Top merchants
+    if context["top_merchants"]:
+        context_parts.append("\nTop Merchants:")
+        for merchant in context["top_merchants"]:
+            context_parts.append(f"- {merchant['merchant']}: ₹{merchant['amount']:,.0f} ({merchant['count']} transactions)")
+    
+    # Recent transactions
+    if context["recent_transactions"]:
+        context_parts.append("\nRecent Transactions (last 10):")
+        for txn in context["recent_transactions"]:
+            context_parts.append(
+                f"- {txn['date']}: {txn['description']} - ₹{txn['amount']:,.0f} ({txn['category']})"
+            )
+    
+    return "\n".join(context_parts)
+
+def _is_fresh(stored: Optional[Dict[str, Any]], data_version: Optional[str]) -> bool:
+    """Whether a stored snapshot was built from the current data, recently enough"""
+    if stored is None or stored["data_version"] != (data_version or ""):
+        return False
+    # The transaction window slides even when the data doesn't change
+    updated_at = stored["updated_at"]
+    if isinstance(updated_at, str):
+        updated_at = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
+    updated_at = updated_at.replace(tzinfo=None)
+    return datetime.utcnow() - updated_at < timedelta(seconds=settings.CHAT_CONTEXT_MAX_AGE_SECONDS)
+
+def _context_from_rollups(rollups: SpendingRollups, recent: List[TransactionResponse]) -> Dict[str, Any]:
+    return build_chat_context(stats_service.get_rollup_summary(rollups), recent)
+
+def _context_from_transactions(transactions: List[TransactionResponse]) -> Dict[str, Any]:
+    return build_chat_context(stats_service.get_summary(transactions, days=CONTEXT_DAYS), transactions[:10])
+
+def refresh_chat_context(user_id: str) -> Dict[str, Any]:
+    """Rebuild and store the user's snapshot (called after ingestion)"""
+    # Read the version first: a write landing mid-build then leaves the snapshot stale, not wrongly fresh
+    data_version = get_data_version(user_id)
+    
+    # Summary from rollups when they have been built, otherwise from the raw window
+    rollups = get_spending_rollups(user_id, days=CONTEXT_DAYS) if settings.ROLLUPS_ENABLED else None
+    if rollups is not None:
+        context = _context_from_rollups(rollups, get_user_transactions(user_id, limit=10, days=CONTEXT_DAYS))
+    else:
+        context = _context_from_transactions(get_user_transactions(user_id, days=CONTEXT_DAYS))
+    
+    get_storage().save_chat_context(user_id, data_version or "", context)
+    return context
+
+# Snapshot rebuilds in flight, per user (held so they are not garbage collected)
+_rebuilds: Dict[str, asyncio.Task] = {}
+
+async def _arebuild(user_id: str, data_version: Optional[str]) -> Dict[str, Any]:
+    """refresh_chat_context for the event loop: I/O is awaited, summarizing runs in a worker thread"""
+    rollups = await aget_spending_rollups(user_id, days=CONTEXT_DAYS) if settings.ROLLUPS_ENABLED else None
+    if rollups is not None:
+        recent = await aget_user_transactions(user_id, limit=10, days=CONTEXT_DAYS)
+        context = await asyncio.to_thread(_context_from_rollups, rollups, recent)
+    else:
+        transactions = await aget_user_transactions(user_id, days=CONTEXT_DAYS)
+        context = await asyncio.to_thread(_context_from_transactions, transactions)
+    
+    try:
+        await asyncio.to_thread(get_storage().save_chat_context, user_id, data_version or "", context)
+    except Exception as e:
+        print(f"Error saving chat context for user {user_id}: {e}")
+    return context
+
+async def aget_chat_context(user_id: str) -> Dict[str, Any]:
+    """
+    The user's snapshot, rebuilt first if their data version has moved on
+    
+    The rebuild runs as its own task, shared by concurrent callers and
+    shielded from their cancellation: a chat request that stops waiting
+    (its context stage timed out) still leaves a saved snapshot behind
+    for the next message.
+    """
+    data_version, stored = await asyncio.gather(
+        aget_data_version(user_id),
+        get_async_storage().get_chat_context(user_id)
+    )
+    if _is_fresh(stored, data_version):
+        return stored["context"]
+    
+    task = _rebuilds.get(user_id)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.create_task(_arebuild(user_id, data_version))
+        _rebuilds[user_id] = task
+        task.add_done_callback(lambda done: _rebuild_done(user_id, done))
+    return await asyncio.shield(task)
+
+def _rebuild_done(user_id: str, task: asyncio.Task) -> None:
+    if _rebuilds.get(user_id) is task:
+        del _rebuilds[user_id]
+    # Every waiter may have given up already; report failures here instead of as unretrieved
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error rebuilding chat context for user {user_id}: {task.exception()}")
@@ -0,0 +1,228 @@
+"""
+Classification result cache keyed by normalized description (in-memory LRU + SQLite on disk)
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from app.config.settings import settings
+from app.utils.categories import get_taxonomy_hash
+
+# Scope for results that do not depend on the user's history
+GLOBAL_SCOPE = "*"
+
+_MONTHS = "jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec"
+_NOISE_PATTERNS = [
+    # Labelled references: "UTR 412345678901", "Ref No: AB12CD34", "txn id #99812"
+    re.compile(r"\b(?:utr|rrn|ref|reference|txn|transaction|order)\b\s*(?:no\.?|number|id)?\s*[:#\-]?\s*[a-z0-9\-]*\d[a-z0-9\-]*"),
+    # Dates: 12/03/2024, 2024-03-12, 12-Mar-2024, 12 march 24
+    re.compile(r"\b\d{1,4}[/\-.]\d{1,2}[/\-.]\d{1,4}\b"),
+    re.compile(rf"\b\d{{1,2}}[\s\-]?(?:{_MONTHS})[a-z]*[\s\-,]*\d{{2,4}}\b"),
+    # Times: 10:42, 10:42:07
+    re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b"),
+    # Bare UTR/RRN-length numbers (longer than a phone number)
+    re.compile(r"\b\d{11,}\b"),
+]
+_SEPARATORS = re.compile(r"[\s/|,;:\-_#*]+")
+
+def normalize_description(description: str) -> str:
+    """Lowercase and strip per-transaction noise (references, UTR ids, dates, times)"""
+    text = description.lower()
+    for pattern in _NOISE_PATTERNS:
+        text = pattern.sub(" ", text)
+    return _SEPARATORS.sub(" ", text).strip()
+
+class ClassificationCache:
+    """
+    Two-tier cache for classifier results
+    
+    Entries are keyed by (scope, normalized description) under the
+    current taxonomy hash, where scope is a user id for results that
+    came from that user's history and GLOBAL_SCOPE otherwise. Opening
+    the disk tier drops rows written under any other taxonomy, so
+    editing the categories or keywords invalidates everything.
+    """
+    
+    def __init__(self, taxonomy_hash: str, max_entries: int = 50000, db_path: Optional[str] = None):
+        self.taxonomy_hash = taxonomy_hash
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if db_path:
+            self._db = self._open_db(db_path)
+    
+    def _open_db(self, db_path: str) -> Optional[sqlite3.Connection]:
+        """Open the disk tier; the cache keeps working memory-only if this fails"""
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS classifications ("
+                "key TEXT PRIMARY KEY, taxonomy TEXT NOT NULL, category TEXT NOT NULL, "
+                "confidence REAL NOT NULL, method TEXT NOT NULL)"
+            )
+            db.execute("DELETE FROM classifications WHERE taxonomy != ?", (self.taxonomy_hash,))
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            print(f"Classification disk cache unavailable ({db_path}): {e}")
+            return None
+    
+    def key(self, scope: str, normalized: str) -> str:
+        """Cache key for a normalized description under the current taxonomy"""
+        return hashlib.sha256(f"{self.taxonomy_hash}\0{scope}\0{normalized}".encode("utf-8")).hexdigest()
+    
+    def get_many(self, user_id: str, normalized: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Look up descriptions, preferring the user's own entry over the global one"""
+        candidates = [(self.key(user_id, text), self.key(GLOBAL_SCOPE, text)) for text in normalized]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(normalized)
+        
+        with self._lock:
+            disk_lookup: List[int] = []
+            for i, keys in enumerate(candidates):
+                if not normalized[i]:
+                    # Nothing left after normalization (only refs, dates, digits): never cached
+                    continue
+                results[i] = self._from_memory(keys)
+                if results[i] is None:
+                    disk_lookup.append(i)
+            
+            if disk_lookup and self._db is not None:
+                found = self._read_disk([key for i in disk_lookup for key in candidates[i]])
+                for key, result in found.items():
+                    self._remember(key, result)
+                remaining = []
+                for i in disk_lookup:
+                    result = next((found[key] for key in candidates[i] if key in found), None)
+                    if result is not None:
+                        results[i] = result
+                        self.disk_hits += 1
+                    else:
+                        remaining.append(i)
+                disk_lookup = remaining
+            
+            self.misses += len(disk_lookup)
+        
+        return [dict(result) if result is not None else None for result in results]
+    
+    def put_many(self, entries: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """Store (scope, normalized description, result) entries in both tiers"""
+        rows = []
+        with self._lock:
+            for scope, normalized, result in entries:
+                if not normalized:
+                    continue
+                key = self.key(scope, normalized)
+                value = {
+                    "category": result["category"],
+                    "confidence": float(result["confidence"]),
+                    "method": result["method"]
+                }
+                self._remember(key, value)
+                rows.append((key, self.taxonomy_hash, value["category"], value["confidence"], value["method"]))
+            
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO classifications "
+                        "(key, taxonomy, category, confidence, method) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing classification cache: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_enabled": self._db is not None,
+                "taxonomy": self.taxonomy_hash
+            }
+    
+    def close(self) -> None:
+        """Close the disk tier"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    def _from_memory(self, keys: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """First memory-tier hit among keys (lock held)"""
+        for key in keys:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return result
+        return None
+    
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        """Insert into the LRU tier, evicting the oldest entries (lock held)"""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def _read_disk(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch results for keys from SQLite (lock held)"""
+        found = {}
+        try:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, category, confidence, method FROM classifications WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, category, confidence, method in rows:
+                    found[key] = {"category": category, "confidence": confidence, "method": method}
+        except sqlite3.Error as e:
+            print(f"Error reading classification cache: {e}")
+        return found
+
+_cache: Optional[ClassificationCache] = None
+_cache_lock = threading.Lock()
+
+def get_classification_cache() -> ClassificationCache:
+    """Get or create the classification cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ClassificationCache(
+                    get_taxonomy_hash(),
+                    max_entries=settings.CLASSIFICATION_CACHE_SIZE,
+                    db_path=settings.CLASSIFICATION_CACHE_PATH or None
+                )
+    return _cache
+
+def get_classification_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters (empty until first use)"""
+    return _cache.stats() if _cache is not None else {}
+
+def close_classification_cache() -> None:
+    """Close the classification cache's disk tier"""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
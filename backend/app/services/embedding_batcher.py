@@ -0,0 +1,143 @@
+"""
+Micro-batching dispatcher for embedding requests
+"""
+from typing import List, Callable, Dict, Optional, Tuple
+from concurrent.futures import Future
+import asyncio
+import queue
+import threading
+import time
+import numpy as np
+
+# encode(texts) -> float32 array of shape (len(texts), dim)
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent embedding requests into shared encode() calls
+    
+    Callers submit texts and get a Future back. A single dispatcher thread
+    waits for the first request, keeps collecting requests until either
+    max_batch_size texts are queued or max_wait_ms has passed, runs one
+    encode for the whole batch and hands every caller its own rows.
+    """
+    
+    def __init__(self, encode_fn: EncodeFn, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Optional[Tuple[List[str], Future]]]" = queue.Queue()
+        self._stopped = False
+        self._lock = threading.Lock()
+        
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for encoding; the future resolves to their vectors"""
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        # Checked and enqueued under the lock stop() takes, so nothing lands behind the sentinel
+        with self._lock:
+            if self._stopped:
+                future.set_exception(RuntimeError("Embedding batcher is stopped"))
+                return future
+            self._queue.put((list(texts), future))
+        return future
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts, blocking until their batch has run"""
+        return self.submit(texts).result()
+    
+    async def aencode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(texts))
+    
+    def stats(self) -> Dict[str, float]:
+        """Batching counters"""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "queued": self._queue.qsize()
+            }
+    
+    def stop(self) -> None:
+        """Stop the dispatcher; queued requests fail"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+        self._thread.join(timeout=5.0)
+    
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            
+            batch = [first]
+            size = len(first[0])
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            
+            # Keep collecting until the batch is full or the window closes
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request[0])
+            
+            self._dispatch(batch)
+            if stopping:
+                break
+        
+        # Fail anything still queued behind the sentinel
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[1].set_exception(RuntimeError("Embedding batcher is stopped"))
+    
+    def _dispatch(self, batch: List[Tuple[List[str], Future]]) -> None:
+        """Run one encode for the batch and split the rows back out"""
+        batch = [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+        
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.items += len(texts)
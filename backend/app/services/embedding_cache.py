@@ -0,0 +1,149 @@
+"""
+Content-addressed embedding cache (in-memory LRU + SQLite on disk)
+"""
+from typing import List, Optional, Dict
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embedding vectors
+    
+    Entries are keyed by sha256(model name + text), so switching the
+    embedding model never returns stale vectors. The memory tier is a
+    bounded LRU; the disk tier is a SQLite table of float32 blobs that
+    survives restarts and is shared by all workers on the host.
+    """
+    
+    def __init__(self, model_name: str, max_entries: int = 10000, db_path: Optional[str] = None):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if db_path:
+            self._db = self._open_db(db_path)
+    
+    def _open_db(self, db_path: str) -> Optional[sqlite3.Connection]:
+        """Open the disk tier; the cache keeps working memory-only if this fails"""
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            print(f"Embedding disk cache unavailable ({db_path}): {e}")
+            return None
+    
+    def key(self, text: str) -> str:
+        """Content-address for a text under the current model"""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up texts; returns None for every miss"""
+        keys = [self.key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        disk_lookup: Dict[str, List[int]] = {}
+        
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = vector
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+            
+            if disk_lookup and self._db is not None:
+                found = self._read_disk(list(disk_lookup.keys()))
+                for key, vector in found.items():
+                    self._remember(key, vector)
+                    for i in disk_lookup.pop(key):
+                        results[i] = vector
+                        self.disk_hits += 1
+            
+            self.misses += sum(len(indexes) for indexes in disk_lookup.values())
+        
+        return results
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Store freshly computed vectors in both tiers"""
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, int(vector.shape[0]), vector.tobytes()))
+            
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                        rows
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing embedding cache: {e}")
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_enabled": self._db is not None
+            }
+    
+    def close(self) -> None:
+        """Close the disk tier"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Insert into the LRU tier, evicting the oldest entries (lock held)"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch vectors for keys from SQLite (lock held)"""
+        found = {}
+        try:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        except sqlite3.Error as e:
+            print(f"Error reading embedding cache: {e}")
+        return found
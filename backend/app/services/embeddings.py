@@ -1,29 +1,137 @@
 """
 Embedding service using SentenceTransformers
 """
-from typing import List
+from typing import List, Dict, Optional
+import asyncio
+import threading
 from sentence_transformers import SentenceTransformer
+import numpy as np
 from app.config.settings import settings
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_batcher import EmbeddingBatcher
 
 # Load model once (singleton)
 _model = None
+_cache: Optional[EmbeddingCache] = None
+_batcher: Optional[EmbeddingBatcher] = None
+_init_lock = threading.Lock()
 
 def get_embedding_model() -> SentenceTransformer:
     """Get or load the embedding model"""
     global _model
     if _model is None:
-        _model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        with _init_lock:
+            if _model is None:
+                _model = SentenceTransformer(settings.EMBEDDING_MODEL)
     return _model
 
+def _encode(texts: List[str]) -> np.ndarray:
+    """Run the model on a list of texts"""
+    model = get_embedding_model()
+    return np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Get or start the micro-batching dispatcher"""
+    global _batcher
+    if _batcher is None:
+        with _init_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher(
+                    _encode,
+                    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS
+                )
+    return _batcher
+
+def stop_embedding_batcher() -> None:
+    """Stop the micro-batching dispatcher"""
+    global _batcher
+    if _batcher is not None:
+        _batcher.stop()
+        _batcher = None
+
+def get_embedding_batcher_stats() -> Dict[str, float]:
+    """Batching counters (empty when batching is disabled or unused)"""
+    return _batcher.stats() if _batcher is not None else {}
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get or create the embedding cache"""
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    settings.EMBEDDING_MODEL,
+                    max_entries=settings.EMBEDDING_CACHE_SIZE,
+                    db_path=settings.EMBEDDING_CACHE_PATH or None
+                )
+    return _cache
+
+def get_embedding_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters for the embedding cache"""
+    return get_embedding_cache().stats()
+
+def close_embedding_cache() -> None:
+    """Close the embedding cache's disk tier"""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
 def get_embedding(text: str) -> List[float]:
     """Get embedding vector for text"""
-    model = get_embedding_model()
-    embedding = model.encode(text, normalize_embeddings=True)
-    return embedding.tolist()
+    return get_embeddings([text])[0]
 
 def get_embeddings(texts: List[str]) -> List[List[float]]:
     """Get embeddings for multiple texts"""
-    model = get_embedding_model()
-    embeddings = model.encode(texts, normalize_embeddings=True)
-    return embeddings.tolist()
+    cache = get_embedding_cache()
+    cached = cache.get_many(texts)
+    
+    # Encode each distinct miss once
+    missing = _missing_texts(texts, cached)
+    if missing:
+        if settings.EMBEDDING_BATCHING:
+            # Share an encode() call with concurrent requests
+            encoded = get_embedding_batcher().encode(missing)
+        else:
+            encoded = _encode(missing)
+        cached = _merge_encoded(texts, cached, missing, encoded)
+    
+    return [vector.tolist() for vector in cached]
+
+async def aget_embedding(text: str) -> List[float]:
+    """Get embedding vector for text without blocking the event loop"""
+    return (await aget_embeddings([text]))[0]
+
+async def aget_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get embeddings for multiple texts without blocking the event loop"""
+    cache = get_embedding_cache()
+    cached = cache.get_many(texts)
+    
+    missing = _missing_texts(texts, cached)
+    if missing:
+        if settings.EMBEDDING_BATCHING:
+            encoded = await get_embedding_batcher().aencode(missing)
+        else:
+            encoded = await asyncio.to_thread(_encode, missing)
+        cached = _merge_encoded(texts, cached, missing, encoded)
+    
+    return [vector.tolist() for vector in cached]
+
+def _missing_texts(texts: List[str], cached: List[Optional[np.ndarray]]) -> List[str]:
+    """Distinct texts that missed the cache, in first-seen order"""
+    return list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
 
+def _merge_encoded(
+    texts: List[str],
+    cached: List[Optional[np.ndarray]],
+    missing: List[str],
+    encoded: np.ndarray
+) -> List[np.ndarray]:
+    """Store freshly encoded vectors and fill them into the cache results"""
+    get_embedding_cache().put_many(missing, encoded)
+    fresh = dict(zip(missing, encoded))
+    return [
+        vector if vector is not None else fresh[text]
+        for text, vector in zip(texts, cached)
+    ]
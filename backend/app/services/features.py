@@ -0,0 +1,98 @@
+"""
+Per-request transaction features shared by stats and insights
+"""
+from typing import List, Dict, Optional, Tuple
+from datetime import date, datetime
+import numpy as np
+from app.models.schemas import TransactionResponse
+from app.services.frame import TransactionFrame, EPOCH_ORDINAL, PERIOD_FORMATS, ranked
+from app.utils.keyword_matcher import KeywordMatcher
+
+# Debits above this amount count as large transactions
+LARGE_TRANSACTION_AMOUNT = 5000
+
+# Merchants whose name contains one of these are food delivery
+DELIVERY_KEYWORDS = ["swiggy", "zomato", "uber eats", "instamart"]
+DELIVERY_MATCHER = KeywordMatcher(DELIVERY_KEYWORDS)
+
+class TransactionFeatures:
+    """
+    Aggregates computed once per transaction list
+    
+    Built from a TransactionFrame with a handful of vectorized passes.
+    Category and merchant totals cover debits only and are ordered by
+    amount, largest first (ties keep first-seen order).
+    """
+    
+    def __init__(self, frame: TransactionFrame):
+        self.frame = frame
+        debit = frame.debit
+        
+        self.transaction_count = len(frame)
+        self.debit_total = frame.total(debit)
+        self.credit_total = frame.total(frame.credit)
+        self.debit_count = int(debit.sum())
+        self.credit_count = int(frame.credit.sum())
+        
+        amounts, counts = frame.group_by_category(debit)
+        order = ranked(amounts, counts)
+        self.category_totals: Dict[str, float] = {frame.categories[c]: float(amounts[c]) for c in order}
+        self.category_counts: Dict[str, int] = {frame.categories[c]: int(counts[c]) for c in order}
+        
+        amounts, counts = frame.group_by_merchant(debit)
+        order = ranked(amounts, counts)
+        self.merchant_totals: Dict[str, float] = {frame.merchants[c]: float(amounts[c]) for c in order}
+        self.merchant_counts: Dict[str, int] = {frame.merchants[c]: int(counts[c]) for c in order}
+        
+        # Most frequent debit merchant; ties go to the one that appears first among the debits
+        codes, first_rows = np.unique(frame.merchant_codes[debit & (frame.merchant_codes >= 0)], return_index=True)
+        if len(codes):
+            tied = counts[codes] == counts[codes].max()
+            self.top_merchant = frame.merchants[codes[tied][first_rows[tied].argmin()]]
+        else:
+            self.top_merchant = ""
+        
+        # Debit counts per hour of day
+        self.hour_histogram = np.bincount(frame.seconds[debit] // 3600, minlength=24)
+        
+        self.large_transaction_count = int((debit & (frame.amount > LARGE_TRANSACTION_AMOUNT)).sum())
+        
+        # Match keywords once per distinct merchant, then count by code
+        # (the trailing False is what code -1, no merchant, indexes)
+        delivery_merchants = np.array(
+            [DELIVERY_MATCHER.contains_any(merchant) for merchant in frame.merchants] + [False],
+            dtype=bool
+        )
+        self.delivery_count = int((debit & delivery_merchants[frame.merchant_codes]).sum())
+        
+        # Debit totals per distinct day, ascending
+        days, inverse = np.unique(frame.day[debit], return_inverse=True)
+        self.daily_totals: List[Tuple[date, float]] = [
+            (date.fromordinal(d + EPOCH_ORDINAL), amount)
+            for d, amount in zip(
+                days.tolist(),
+                np.bincount(inverse, weights=frame.amount[debit], minlength=len(days)).tolist()
+            )
+        ]
+        
+        bounds = frame.date_bounds()
+        self.first_date: Optional[datetime] = frame.transactions[bounds[0]].date if bounds else None
+        self.last_date: Optional[datetime] = frame.transactions[bounds[1]].date if bounds else None
+    
+    @classmethod
+    def from_transactions(cls, transactions: List[TransactionResponse]) -> "TransactionFeatures":
+        return cls(TransactionFrame.from_transactions(transactions))
+    
+    @property
+    def late_night_count(self) -> int:
+        """Debits between 10 PM and 6 AM"""
+        return int(self.hour_histogram[22:].sum() + self.hour_histogram[:6].sum())
+    
+    def period_totals(self, period: str) -> List[Tuple[str, float]]:
+        """Debit total per period label (daily/weekly/monthly), sorted by label"""
+        _, label_format = PERIOD_FORMATS.get(period, PERIOD_FORMATS["monthly"])
+        totals: Dict[str, float] = {}
+        for day, amount in self.daily_totals:
+            label = day.strftime(label_format)
+            totals[label] = totals.get(label, 0.0) + amount
+        return sorted(totals.items())
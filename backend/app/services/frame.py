@@ -0,0 +1,128 @@
+"""
+Columnar transaction frame for vectorized analytics
+"""
+from typing import List, Dict, Optional, Tuple
+from datetime import date
+import numpy as np
+from app.models.schemas import TransactionResponse
+
+# Days are stored relative to 1970-01-01 (epoch-day)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+TYPE_DEBIT = 0
+TYPE_CREDIT = 1
+TYPE_OTHER = 2
+TYPE_CODES = {"debit": TYPE_DEBIT, "credit": TYPE_CREDIT}
+
+# strftime patterns for each trend granularity
+PERIOD_FORMATS = {
+    "daily": ("date", "%Y-%m-%d"),
+    "weekly": ("week", "%Y-W%W"),
+    "monthly": ("month", "%Y-%m"),
+}
+
+class TransactionFrame:
+    """
+    Transactions as parallel NumPy columns
+    
+    Categories and merchants are dictionary-encoded: category_codes[i]
+    indexes into categories, merchant_codes[i] into merchants (-1 when a
+    transaction has no merchant). Dictionaries are in first-seen order.
+    Aggregations are bincounts over those codes.
+    """
+    
+    def __init__(
+        self,
+        transactions: List[TransactionResponse],
+        amount: np.ndarray,
+        day: np.ndarray,
+        seconds: np.ndarray,
+        type_code: np.ndarray,
+        category_codes: np.ndarray,
+        categories: List[str],
+        merchant_codes: np.ndarray,
+        merchants: List[str]
+    ):
+        self.transactions = transactions
+        self.amount = amount
+        self.day = day
+        self.seconds = seconds
+        self.type_code = type_code
+        self.category_codes = category_codes
+        self.categories = categories
+        self.merchant_codes = merchant_codes
+        self.merchants = merchants
+        self.debit = type_code == TYPE_DEBIT
+        self.credit = type_code == TYPE_CREDIT
+    
+    @classmethod
+    def from_transactions(cls, transactions: List[TransactionResponse]) -> "TransactionFrame":
+        """Build the frame in a single pass over the transactions"""
+        count = len(transactions)
+        amount = np.empty(count, dtype=np.float64)
+        day = np.empty(count, dtype=np.int32)
+        seconds = np.empty(count, dtype=np.int32)
+        type_code = np.empty(count, dtype=np.int8)
+        category_codes = np.empty(count, dtype=np.int32)
+        merchant_codes = np.empty(count, dtype=np.int32)
+        
+        category_index: Dict[str, int] = {}
+        merchant_index: Dict[str, int] = {}
+        
+        for i, t in enumerate(transactions):
+            amount[i] = t.amount
+            day[i] = t.date.toordinal() - EPOCH_ORDINAL
+            seconds[i] = t.date.hour * 3600 + t.date.minute * 60 + t.date.second
+            type_code[i] = TYPE_CODES.get(t.type, TYPE_OTHER)
+            category_codes[i] = category_index.setdefault(t.category, len(category_index))
+            merchant_codes[i] = merchant_index.setdefault(t.merchant, len(merchant_index)) if t.merchant else -1
+        
+        return cls(
+            transactions,
+            amount,
+            day,
+            seconds,
+            type_code,
+            category_codes,
+            list(category_index),
+            merchant_codes,
+            list(merchant_index)
+        )
+    
+    def __len__(self) -> int:
+        return len(self.amount)
+    
+    def total(self, mask: np.ndarray) -> float:
+        return float(self.amount[mask].sum())
+    
+    def group_by_category(self, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(amount, count) per category code for rows in mask"""
+        codes = self.category_codes[mask]
+        size = len(self.categories)
+        return (
+            np.bincount(codes, weights=self.amount[mask], minlength=size),
+            np.bincount(codes, minlength=size)
+        )
+    
+    def group_by_merchant(self, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(amount, count) per merchant code for rows in mask that have a merchant"""
+        mask = mask & (self.merchant_codes >= 0)
+        codes = self.merchant_codes[mask]
+        size = len(self.merchants)
+        return (
+            np.bincount(codes, weights=self.amount[mask], minlength=size),
+            np.bincount(codes, minlength=size)
+        )
+    
+    def date_bounds(self) -> Optional[Tuple[int, int]]:
+        """Row indexes of the earliest and latest transaction"""
+        if len(self) == 0:
+            return None
+        instant = self.day.astype(np.int64) * 86400 + self.seconds
+        return int(np.argmin(instant)), int(np.argmax(instant))
+
+def ranked(amounts: np.ndarray, counts: np.ndarray, limit: Optional[int] = None) -> List[int]:
+    """Codes present in the group, largest amount first (ties keep first-seen order)"""
+    order = np.argsort(-amounts, kind="stable")
+    order = [int(code) for code in order if counts[code] > 0]
+    return order[:limit] if limit is not None else order
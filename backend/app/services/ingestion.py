@@ -0,0 +1,351 @@
+"""
+Statement ingestion pipeline and background job manager
+"""
+from typing import List, Dict, Optional, Callable
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import io
+import threading
+import uuid
+from app.config.settings import settings
+from app.services.pdf_parser import PDFParser
+from app.services.transaction_classifier import TransactionClassifier
+from app.services.memory import MemoryService
+from app.models.user import get_or_create_user
+from app.models.transaction import create_transactions
+from app.services.chat_context import refresh_chat_context
+from app.models.schemas import TransactionCreate, UploadResponse, UploadJobResponse, UploadJobStage
+from app.utils.phone import extract_phone_from_text
+
+# progress(stage, status, progress, detail)
+ProgressCallback = Callable[[str, str, float, Optional[str]], None]
+
+PDF_STAGES = ["extract", "parse", "classify", "store", "memory"]
+CSV_STAGES = ["parse", "classify", "store", "memory"]
+
+def _no_progress(stage: str, status: str, progress: float, detail: Optional[str] = None) -> None:
+    pass
+
+class IngestionError(Exception):
+    """Raised when an uploaded file cannot be ingested"""
+    
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+class IngestionPipeline:
+    """Run the extract -> classify -> store -> memory stages for an upload"""
+    
+    def __init__(
+        self,
+        pdf_parser: PDFParser,
+        classifier: TransactionClassifier,
+        memory_service: MemoryService
+    ):
+        self.pdf_parser = pdf_parser
+        self.classifier = classifier
+        self.memory_service = memory_service
+    
+    def process_pdf(
+        self,
+        content: bytes,
+        progress: ProgressCallback = _no_progress
+    ) -> UploadResponse:
+        """Process a PDF statement"""
+        # Extract text from PDF
+        progress("extract", "running", 0.0, None)
+        text = self.pdf_parser.extract_text(content)
+        
+        if not text.strip():
+            raise IngestionError("No text found in PDF")
+        progress("extract", "completed", 1.0, None)
+        
+        # Extract phone number and parse transactions
+        progress("parse", "running", 0.0, None)
+        phone, raw_transactions = self.pdf_parser.parse_statement(text)
+        if not phone:
+            raise IngestionError("Phone number not found in PDF")
+        
+        # Get or create user
+        user = get_or_create_user(phone)
+        
+        if not raw_transactions:
+            raise IngestionError("No transactions found in PDF")
+        progress("parse", "completed", 1.0, f"{len(raw_transactions)} transactions found")
+        
+        # Classify the whole statement in one batch
+        progress("classify", "running", 0.0, None)
+        classifications = self.classifier.classify_many(
+            [raw_txn["description"] for raw_txn in raw_transactions],
+            user.id,
+            [raw_txn["amount"] for raw_txn in raw_transactions]
+        )
+        
+        # Create transactions
+        transaction_creates = []
+        for raw_txn, classification in zip(raw_transactions, classifications):
+            transaction_type = self.pdf_parser.determine_transaction_type(
+                raw_txn["description"],
+                raw_txn["amount"]
+            )
+            
+            merchant = self.pdf_parser.extract_merchant(raw_txn["description"])
+            
+            transaction_creates.append(TransactionCreate(
+                user_id=user.id,
+                date=raw_txn["date"],
+                amount=raw_txn["amount"],
+                type=transaction_type,
+                merchant=merchant,
+                category=classification["category"],
+                raw_text=raw_txn["raw_text"]
+            ))
+        progress("classify", "completed", 1.0, None)
+        
+        return self._store(user, transaction_creates, progress)
+    
+    def process_csv(
+        self,
+        content: bytes,
+        filename: Optional[str] = None,
+        progress: ProgressCallback = _no_progress
+    ) -> UploadResponse:
+        """Process a CSV statement"""
+        progress("parse", "running", 0.0, None)
+        text = content.decode('utf-8')
+        
+        # Extract phone number (might be in filename or first few lines)
+        phone = extract_phone_from_text(text[:1000])
+        if not phone and filename:
+            # Try to extract from filename
+            phone = extract_phone_from_text(filename)
+        
+        if not phone:
+            raise IngestionError("Phone number not found")
+        
+        # Get or create user
+        user = get_or_create_user(phone)
+        
+        # Parse CSV
+        csv_reader = csv.DictReader(io.StringIO(text))
+        rows = list(csv_reader)
+        
+        if not rows:
+            raise IngestionError("No data found in CSV")
+        progress("parse", "completed", 1.0, f"{len(rows)} rows found")
+        
+        # Process rows
+        progress("classify", "running", 0.0, None)
+        parsed_rows = []
+        for row in rows:
+            # Try to extract transaction data
+            description = row.get("description") or row.get("Description") or row.get("narration") or ""
+            amount_str = row.get("amount") or row.get("Amount") or row.get("debit") or "0"
+            date_str = row.get("date") or row.get("Date") or ""
+            
+            if not description or not amount_str:
+                continue
+            
+            try:
+                amount = abs(float(str(amount_str).replace(",", "").replace("₹", "").strip()))
+                if amount == 0:
+                    continue
+            except ValueError:
+                continue
+            
+            # Parse date
+            try:
+                date = datetime.strptime(date_str, "%Y-%m-%d")
+            except:
+                try:
+                    date = datetime.strptime(date_str, "%d/%m/%Y")
+                except:
+                    date = datetime.now()
+            
+            parsed_rows.append((description, amount, date))
+        
+        # Classify all rows in one batch
+        classifications = self.classifier.classify_many(
+            [description for description, _, _ in parsed_rows],
+            user.id,
+            [amount for _, amount, _ in parsed_rows]
+        )
+        
+        transaction_creates = []
+        for (description, amount, date), classification in zip(parsed_rows, classifications):
+            # Determine type
+            transaction_type = "debit"
+            if any(kw in description.lower() for kw in ["credit", "salary", "refund"]):
+                transaction_type = "credit"
+            
+            merchant = self.pdf_parser.extract_merchant(description)
+            
+            transaction_creates.append(TransactionCreate(
+                user_id=user.id,
+                date=date,
+                amount=amount,
+                type=transaction_type,
+                merchant=merchant,
+                category=classification["category"],
+                raw_text=description
+            ))
+        
+        if not transaction_creates:
+            raise IngestionError("No valid transactions found in CSV")
+        progress("classify", "completed", 1.0, None)
+        
+        return self._store(user, transaction_creates, progress)
+    
+    def _store(
+        self,
+        user,
+        transaction_creates: List[TransactionCreate],
+        progress: ProgressCallback
+    ) -> UploadResponse:
+        """Save classified transactions and their memories"""
+        # Save transactions
+        progress("store", "running", 0.0, None)
+        transactions = create_transactions(transaction_creates)
+        # Chat reads this snapshot instead of re-summarizing 90 days of transactions per message
+        try:
+            refresh_chat_context(user.id)
+        except Exception as e:
+            print(f"Error refreshing chat context for user {user.id}: {e}")
+        progress("store", "completed", 1.0, f"{len(transactions)} transactions saved")
+        
+        # Store in memory
+        progress("memory", "running", 0.0, None)
+        memory_report = self.memory_service.store_batch_memories(user.id, transactions)
+        progress(
+            "memory",
+            "completed",
+            1.0,
+            f"{memory_report['stored']} memories stored, {memory_report['failed']} failed"
+        )
+        
+        return UploadResponse(
+            user=user,
+            transaction_count=len(transactions),
+            message=f"Successfully processed {len(transactions)} transactions"
+        )
+
+class JobQueueFull(Exception):
+    """Raised when the ingestion queue is at capacity"""
+
+class IngestionJobManager:
+    """
+    Run ingestion pipelines on a bounded background worker pool
+    
+    Job state is kept in process memory, so job ids are only visible to
+    the worker process that accepted the upload.
+    """
+    
+    def __init__(self, pipeline: IngestionPipeline):
+        self.pipeline = pipeline
+        self._jobs: Dict[str, UploadJobResponse] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.INGESTION_WORKERS,
+            thread_name_prefix="ingestion"
+        )
+    
+    def submit_pdf(self, content: bytes, filename: Optional[str] = None) -> UploadJobResponse:
+        """Queue a PDF upload for background processing"""
+        job = self._create_job("pdf", filename, PDF_STAGES)
+        self._executor.submit(self._run, job.job_id, "PDF", self.pipeline.process_pdf, content)
+        return job
+    
+    def submit_csv(self, content: bytes, filename: Optional[str] = None) -> UploadJobResponse:
+        """Queue a CSV upload for background processing"""
+        job = self._create_job("csv", filename, CSV_STAGES)
+        self._executor.submit(self._run, job.job_id, "CSV", self.pipeline.process_csv, content, filename)
+        return job
+    
+    def get_job(self, job_id: str) -> Optional[UploadJobResponse]:
+        """Get a snapshot of job state"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy(deep=True) if job else None
+    
+    def stats(self) -> Dict[str, int]:
+        """Count jobs by status"""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+    
+    def shutdown(self) -> None:
+        """Stop accepting jobs and cancel the ones still queued"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _create_job(self, kind: str, filename: Optional[str], stages: List[str]) -> UploadJobResponse:
+        now = datetime.utcnow()
+        job = UploadJobResponse(
+            job_id=str(uuid.uuid4()),
+            kind=kind,
+            filename=filename,
+            status="queued",
+            stages=[UploadJobStage(name=name) for name in stages],
+            created_at=now,
+            updated_at=now
+        )
+        
+        with self._lock:
+            self._prune_locked()
+            pending = sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+            if pending >= settings.INGESTION_MAX_PENDING:
+                raise JobQueueFull(
+                    f"Too many uploads in progress ({pending}). Please retry shortly."
+                )
+            self._jobs[job.job_id] = job
+            return job.model_copy(deep=True)
+    
+    def _run(self, job_id: str, label: str, process: Callable, *args) -> None:
+        self._update(job_id, status="running")
+        
+        def progress(stage: str, status: str, value: float, detail: Optional[str] = None) -> None:
+            with self._lock:
+                job = self._jobs[job_id]
+                for job_stage in job.stages:
+                    if job_stage.name == stage:
+                        job_stage.status = status
+                        job_stage.progress = round(value, 3)
+                        if detail is not None:
+                            job_stage.detail = detail
+                job.updated_at = datetime.utcnow()
+        
+        try:
+            result = process(*args, progress=progress)
+            self._update(job_id, status="completed", result=result)
+        except IngestionError as e:
+            self._fail(job_id, e.message)
+        except Exception as e:
+            self._fail(job_id, f"Error processing {label}: {str(e)}")
+    
+    def _fail(self, job_id: str, error: str) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            for job_stage in job.stages:
+                if job_stage.status == "running":
+                    job_stage.status = "failed"
+        self._update(job_id, status="failed", error=error)
+    
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.updated_at = datetime.utcnow()
+    
+    def _prune_locked(self) -> None:
+        """Drop finished jobs older than the retention window"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.INGESTION_JOB_TTL_SECONDS)
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in ("completed", "failed") and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
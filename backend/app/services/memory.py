@@ -1,36 +1,31 @@
 """
 Memory service for storing and retrieving transaction memories
 """
-from typing import List
-from app.models.memory import create_memory_vector, MemoryVectorCreate
-from app.services.embeddings import get_embedding
-from app.models.schemas import TransactionResponse
+from typing import List, Dict, Any
+from app.config.settings import settings
+from app.models.memory import create_memory_vector, create_memory_vectors, load_index_rows, MemoryVectorCreate
+from app.services.embeddings import get_embedding, get_embeddings
+from app.services.vector_index import get_vector_index
+from app.models.schemas import TransactionResponse, MemoryVectorResponse
 
 class MemoryService:
     """Service for managing user financial memories"""
     
-    def store_transaction_memory(
-        self,
-        user_id: str,
-        transaction: TransactionResponse
-    ) -> None:
-        """Store transaction as a memory vector"""
-        # Create memory text
-        memory_text = (
+    def _memory_text(self, transaction: TransactionResponse) -> str:
+        """Create memory text for a transaction"""
+        return (
             f"Transaction: {transaction.merchant or transaction.raw_text} "
             f"Amount: ₹{transaction.amount} "
             f"Category: {transaction.category} "
             f"Type: {transaction.type} "
             f"Date: {transaction.date.strftime('%Y-%m-%d')}"
         )
-        
-        # Get embedding
-        embedding = get_embedding(memory_text)
-        
-        # Store in database
-        memory = MemoryVectorCreate(
+    
+    def _memory(self, user_id: str, transaction: TransactionResponse) -> MemoryVectorCreate:
+        """Build the memory record for a transaction"""
+        return MemoryVectorCreate(
             user_id=user_id,
-            text=memory_text,
+            text=self._memory_text(transaction),
             metadata={
                 "transaction_id": transaction.id,
                 "category": transaction.category,
@@ -40,19 +35,98 @@ class MemoryService:
                 "date": transaction.date.isoformat()
             }
         )
+    
+    def _index(self, user_id: str, stored: List[MemoryVectorResponse], embeddings: List[List[float]]) -> None:
+        """Keep the local vector index in step with the database"""
+        if not settings.VECTOR_INDEX_ENABLED or not stored:
+            return
+        try:
+            get_vector_index().add(
+                user_id,
+                [{"id": item.id, "text": item.text, "metadata": item.metadata} for item in stored],
+                embeddings
+            )
+        except Exception as e:
+            # The database has rows the index lacks; don't trust it until it is rebuilt
+            print(f"Error indexing memories for user {user_id}, scheduling a rebuild: {e}")
+            index = get_vector_index()
+            try:
+                index.mark_stale(user_id)
+            except Exception as mark_error:
+                print(f"Error flagging vector index for user {user_id}: {mark_error}")
+            index.schedule_rebuild(user_id, load_index_rows)
+    
+    def store_transaction_memory(
+        self,
+        user_id: str,
+        transaction: TransactionResponse
+    ) -> None:
+        """Store transaction as a memory vector"""
+        memory = self._memory(user_id, transaction)
+        
+        # Get embedding
+        embedding = get_embedding(memory.text)
+        
+        # Store in database
+        stored = create_memory_vector(memory, embedding)
         
-        create_memory_vector(memory, embedding)
+        self._index(user_id, [stored], [embedding])
     
     def store_batch_memories(
         self,
         user_id: str,
         transactions: List[TransactionResponse]
+    ) -> Dict[str, Any]:
+        """
+        Store multiple transactions as memories
+        
+        Memory texts are encoded and inserted MEMORY_BATCH_SIZE at a time.
+        If a bulk insert fails, that chunk is retried row by row so one bad
+        row does not drop its neighbours. Returns counts of stored and
+        failed memories plus the failed transaction ids.
+        """
+        report: Dict[str, Any] = {"stored": 0, "failed": 0, "failed_transaction_ids": []}
+        chunk_size = max(1, settings.MEMORY_BATCH_SIZE)
+        
+        for start in range(0, len(transactions), chunk_size):
+            chunk = transactions[start:start + chunk_size]
+            memories = [self._memory(user_id, transaction) for transaction in chunk]
+            
+            try:
+                embeddings = get_embeddings([memory.text for memory in memories])
+            except Exception as e:
+                print(f"Error embedding memories {start}-{start + len(chunk)}: {e}")
+                self._record_failures(report, chunk)
+                continue
+            
+            try:
+                stored = create_memory_vectors(memories, embeddings)
+                self._index(user_id, stored, embeddings)
+                report["stored"] += len(stored)
+            except Exception as e:
+                print(f"Bulk memory insert failed, retrying rows individually: {e}")
+                self._store_rows(user_id, chunk, memories, embeddings, report)
+        
+        return report
+    
+    def _store_rows(
+        self,
+        user_id: str,
+        transactions: List[TransactionResponse],
+        memories: List[MemoryVectorCreate],
+        embeddings: List[List[float]],
+        report: Dict[str, Any]
     ) -> None:
-        """Store multiple transactions as memories"""
-        for transaction in transactions:
+        """Insert a failed chunk one row at a time to isolate bad rows"""
+        for transaction, memory, embedding in zip(transactions, memories, embeddings):
             try:
-                self.store_transaction_memory(user_id, transaction)
+                stored = create_memory_vector(memory, embedding)
+                self._index(user_id, [stored], [embedding])
+                report["stored"] += 1
             except Exception as e:
                 print(f"Error storing memory for transaction {transaction.id}: {e}")
-                continue
-
+                self._record_failures(report, [transaction])
+    
+    def _record_failures(self, report: Dict[str, Any], transactions: List[TransactionResponse]) -> None:
+        report["failed"] += len(transactions)
+        report["failed_transaction_ids"].extend(transaction.id for transaction in transactions)
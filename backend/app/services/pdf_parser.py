@@ -2,30 +2,149 @@
 PDF parsing service using pdfplumber
 """
 import pdfplumber
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import re
+import threading
 from io import BytesIO
+from app.config.settings import settings
 from app.utils.phone import extract_phone_from_text
+from app.utils.keyword_matcher import KeywordMatcher
+
+# Merchants recognised in descriptions (earlier entries win when several match)
+KNOWN_MERCHANTS = [
+    "swiggy", "zomato", "amazon", "flipkart", "myntra", "uber", "ola",
+    "netflix", "bigbasket", "nykaa", "make my trip", "goibibo"
+]
+MERCHANT_MATCHER = KeywordMatcher(KNOWN_MERCHANTS)
+
+# Process pool for page-sharded extraction (created lazily, shared by all parsers)
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+def _pool_context():
+    """
+    Start workers without fork(): the pool is created after the upload,
+    embedding and HTTP client threads are running, and a forked child can
+    deadlock on a lock one of them held at fork time
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def get_page_pool() -> ProcessPoolExecutor:
+    """Get or create the PDF page extraction process pool"""
+    global _page_pool
+    if _page_pool is None:
+        with _page_pool_lock:
+            if _page_pool is None:
+                _page_pool = ProcessPoolExecutor(
+                    max_workers=settings.get_pdf_extract_workers(),
+                    mp_context=_pool_context()
+                )
+    return _page_pool
+
+def shutdown_page_pool() -> None:
+    """Shut down the PDF page extraction process pool"""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is not None:
+            _page_pool.shutdown(wait=False, cancel_futures=True)
+            _page_pool = None
+
+def _extract_page_range(pdf_bytes: bytes, start: int, end: int) -> List[str]:
+    """Extract text from pages [start, end) - runs inside a pool worker"""
+    text_content = []
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages[start:end]:
+            text = page.extract_text()
+            if text:
+                text_content.append(text)
+            # Release the parsed layout objects; workers handle many pages
+            page.close()
+    return text_content
+
+def _shard_pages(page_count: int, shards: int) -> List[Tuple[int, int]]:
+    """Split page indexes into contiguous, near-equal ranges"""
+    shards = max(1, min(shards, page_count))
+    size, extra = divmod(page_count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
 
 class PDFParser:
     """Parse PDF files to extract transactions and phone numbers"""
     
-    def extract_text(self, pdf_bytes: bytes) -> str:
-        """Extract all text from PDF"""
-        text_content = []
+    def extract_text(self, pdf_bytes: bytes, parallel: Optional[bool] = None) -> str:
+        """
+        Extract all text from PDF
         
+        Extraction runs in the process pool so pdfplumber's CPU work stays
+        out of the API process: long statements are sharded into page
+        ranges across workers, short ones go to a single worker, and the
+        text is reassembled in page order. Pass parallel=False to force
+        in-process extraction.
+        """
         # Convert bytes to file-like object for pdfplumber
         pdf_file = BytesIO(pdf_bytes)
         
         with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
+            page_count = len(pdf.pages)
+            workers = settings.get_pdf_extract_workers()
+            
+            if parallel is None:
+                parallel = workers > 1
+            
+            if not parallel:
+                text_content = []
+                for page in pdf.pages:
+                    text = page.extract_text()
+                    if text:
+                        text_content.append(text)
+                return "\n".join(text_content)
+        
+        shards = workers if page_count >= settings.PDF_PARALLEL_MIN_PAGES else 1
+        return self._extract_text_parallel(pdf_bytes, page_count, shards)
+    
+    def _extract_text_parallel(self, pdf_bytes: bytes, page_count: int, workers: int) -> str:
+        """Extract page ranges across the process pool, preserving page order"""
+        ranges = _shard_pages(page_count, workers)
+        
+        try:
+            pool = get_page_pool()
+            futures = [
+                pool.submit(_extract_page_range, pdf_bytes, start, end)
+                for start, end in ranges
+            ]
+            # Futures are collected in submission order, so pages stay in order
+            text_content = []
+            for future in futures:
+                text_content.extend(future.result())
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM on a malformed page) - rebuild the pool
+            # for later requests and fall back to in-process extraction
+            print(f"PDF page pool failed, extracting in-process: {e}")
+            shutdown_page_pool()
+            text_content = _extract_page_range(pdf_bytes, 0, page_count)
         
         return "\n".join(text_content)
     
+    def parse_statement(self, text: str) -> Tuple[Optional[str], List[Dict]]:
+        """Phone number and transactions from statement text (parsed in the process pool when enabled)"""
+        if settings.get_pdf_extract_workers() > 1:
+            try:
+                return get_page_pool().submit(_parse_statement_text, text).result()
+            except BrokenProcessPool as e:
+                print(f"PDF page pool failed, parsing in-process: {e}")
+                shutdown_page_pool()
+        return self.extract_phone_number(text), self.parse_transactions(text)
+    
     def extract_phone_number(self, text: str) -> Optional[str]:
         """Extract phone number from PDF text"""
         return extract_phone_from_text(text)
@@ -206,16 +325,11 @@ class PDFParser:
     
     def extract_merchant(self, description: str) -> Optional[str]:
         """Extract merchant name from description"""
-        # Common merchant patterns
-        merchants = [
-            "swiggy", "zomato", "amazon", "flipkart", "myntra", "uber", "ola",
-            "netflix", "bigbasket", "nykaa", "make my trip", "goibibo"
-        ]
-        
-        desc_lower = description.lower()
-        for merchant in merchants:
-            if merchant in desc_lower:
-                return merchant.title()
-        
-        return None
+        # Earliest entry of KNOWN_MERCHANTS found in the description
+        merchant = MERCHANT_MATCHER.first_match(description)
+        return merchant.title() if merchant else None
 
+def _parse_statement_text(text: str) -> Tuple[Optional[str], List[Dict]]:
+    """Find the phone number and transactions in statement text - runs inside a pool worker"""
+    parser = PDFParser()
+    return parser.extract_phone_number(text), parser.parse_transactions(text)
@@ -0,0 +1,170 @@
+"""
+In-process response cache with TTL and stale-while-revalidate
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future
+import asyncio
+import threading
+import time
+from app.config.settings import settings
+
+class ResponseCache:
+    """
+    Bounded LRU of computed responses
+    
+    Entries younger than ttl_seconds are served as-is. Entries up to
+    stale_seconds past their TTL are still served, while one background
+    refresh recomputes them. Older entries and misses are computed by the
+    caller; concurrent callers for the same key share that computation.
+    Callers put anything that should invalidate an entry (such as a data
+    version) in the key.
+    
+    aget_or_compute() takes a coroutine function and runs it (and its
+    background refreshes) on the event loop.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 300.0,
+        stale_seconds: float = 3600.0
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.stale = stale_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        # Running async refreshes (held so they are not garbage collected)
+        self._tasks: Set[asyncio.Task] = set()
+        
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+    
+    async def aget_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, awaiting compute() when missing or expired"""
+        def refresh(future: Future) -> None:
+            task = asyncio.get_running_loop().create_task(self._arefresh(key, compute, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        
+        found, value, future, owner = self._claim(key, refresh)
+        if found:
+            return value
+        if owner:
+            await self._arun(key, compute, future)
+        return await asyncio.wrap_future(future)
+    
+    def _claim(self, key: Hashable, refresh: Callable[[Future], None]) -> Tuple[bool, Any, Optional[Future], bool]:
+        """
+        (found, value, future, owner) for a lookup
+        
+        Fresh and stale hits return found=True (a stale hit also starts one
+        refresh via refresh(future)). Otherwise the caller waits on future,
+        computing it first when owner is True.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                age = time.monotonic() - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value, None, False
+                if age < self.ttl + self.stale:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._pending:
+                        future: Future = Future()
+                        self._pending[key] = future
+                        self.refreshes += 1
+                        refresh(future)
+                    return True, value, None, False
+            
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+                self.misses += 1
+            return False, None, future, owner
+    
+    async def _arun(self, key: Hashable, compute: Callable[[], Awaitable[Any]], future: Future) -> None:
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            return
+        self._store(key, future, value)
+    
+    def _store(self, key: Hashable, future: Future, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._pending.pop(key, None)
+        future.set_result(value)
+    
+    def _fail(self, key: Hashable, future: Future, error: BaseException) -> None:
+        # Failures are not cached; waiters get the exception
+        with self._lock:
+            self._pending.pop(key, None)
+        future.set_exception(error)
+    
+    async def _arefresh(self, key: Hashable, compute: Callable[[], Awaitable[Any]], future: Future) -> None:
+        await self._arun(key, compute, future)
+        error = future.exception()
+        if error is not None:
+            # The stale entry stays until it expires or a later refresh succeeds
+            print(f"Error refreshing cached response {key}: {error}")
+    
+    def stats(self) -> Dict[str, int]:
+        """Cache counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions
+            }
+    
+    def shutdown(self) -> None:
+        """Stop background refreshes"""
+        for task in list(self._tasks):
+            task.cancel()
+
+_analysis_cache: Optional[ResponseCache] = None
+_lock = threading.Lock()
+
+def get_analysis_cache() -> ResponseCache:
+    """Get the process-wide cache for analysis responses"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _lock:
+            if _analysis_cache is None:
+                _analysis_cache = ResponseCache(
+                    max_entries=settings.ANALYSIS_CACHE_SIZE,
+                    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+                    stale_seconds=settings.ANALYSIS_CACHE_STALE_SECONDS
+                )
+    return _analysis_cache
+
+def get_analysis_cache_stats() -> Dict[str, int]:
+    """Analysis cache counters (empty until first use)"""
+    return _analysis_cache.stats() if _analysis_cache is not None else {}
+
+def shutdown_analysis_cache() -> None:
+    """Stop background refreshes (called on application shutdown)"""
+    global _analysis_cache
+    if _analysis_cache is not None:
+        _analysis_cache.shutdown()
+        _analysis_cache = None
@@ -0,0 +1,225 @@
+"""
+Declarative insight rules compiled to vectorized NumPy expressions
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import ast
+import json
+import string
+import numpy as np
+from app.models.schemas import Insight
+from app.services.features import TransactionFeatures, LARGE_TRANSACTION_AMOUNT
+from app.utils.insight_rules import get_insight_rules
+
+# Scalar features available to rule expressions and message templates
+SCALAR_FEATURES: Dict[str, Callable[[TransactionFeatures], float]] = {
+    "transaction_count": lambda f: f.transaction_count,
+    "debit_total": lambda f: f.debit_total,
+    "debit_count": lambda f: f.debit_count,
+    "credit_total": lambda f: f.credit_total,
+    "credit_count": lambda f: f.credit_count,
+    "net_balance": lambda f: f.credit_total - f.debit_total,
+    "average_debit": lambda f: f.debit_total / f.debit_count if f.debit_count else 0.0,
+    "large_transaction_count": lambda f: f.large_transaction_count,
+    "delivery_count": lambda f: f.delivery_count,
+    "late_night_count": lambda f: f.late_night_count,
+    "merchant_count": lambda f: len(f.merchant_counts),
+    "top_merchant_count": lambda f: max(f.merchant_counts.values(), default=0),
+    "category_count_distinct": lambda f: len(f.category_counts),
+}
+
+# Parameterized lookups: name(arg) -> column value
+LOOKUP_FEATURES: Dict[str, Callable[[TransactionFeatures, Any], float]] = {
+    "category": lambda f, name: f.category_totals.get(name, 0.0),
+    "category_count": lambda f, name: f.category_counts.get(name, 0),
+    "merchant": lambda f, name: f.merchant_totals.get(name, 0.0),
+    "merchant_count": lambda f, name: f.merchant_counts.get(name, 0),
+    "hour": lambda f, hour: int(f.hour_histogram[hour]),
+}
+
+# Template values that are not matrix columns
+CONSTANTS = {"large_transaction_amount": LARGE_TRANSACTION_AMOUNT}
+LABELS = ("top_merchant",)
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+}
+
+Column = Tuple[str, Any]  # (feature or lookup name, lookup argument or None)
+Vectorized = Callable[[np.ndarray], np.ndarray]
+
+class RuleError(ValueError):
+    """A rule definition could not be compiled"""
+
+class CompiledRule:
+    """One rule with its expression compiled against the engine's columns"""
+    
+    def __init__(self, definition: Dict[str, Any], evaluate: Vectorized):
+        self.id = definition["id"]
+        self.type = definition.get("type", "recommendation")
+        self.severity = definition.get("severity")
+        self.title = definition["title"]
+        self.message = definition["message"]
+        self.op = definition.get("op", ">")
+        self.threshold = float(definition["threshold"])
+        self.evaluate = evaluate
+
+class RuleEngine:
+    """
+    Evaluate many insight rules over many users at once
+    
+    Rules are compiled once into functions over a feature matrix (one row
+    per user, one column per feature the rules use). Each rule is a single
+    NumPy expression over whole columns, so evaluating R rules for N users
+    costs R vector operations instead of R * N Python checks. Only the
+    messages of rules that fire are formatted per user.
+    """
+    
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.columns: List[Column] = [(name, None) for name in SCALAR_FEATURES]
+        self._column_index: Dict[Column, int] = {column: i for i, column in enumerate(self.columns)}
+        self.rules = [self._compile(rule) for rule in rules]
+    
+    # Compilation
+    def _compile(self, rule: Dict[str, Any]) -> CompiledRule:
+        rule_id = rule.get("id", "<unnamed>")
+        for field in ("id", "expression", "threshold", "title", "message"):
+            if field not in rule:
+                raise RuleError(f"Rule {rule_id}: missing '{field}'")
+        if rule.get("op", ">") not in OPERATORS:
+            raise RuleError(f"Rule {rule_id}: unsupported operator {rule['op']!r}")
+        
+        try:
+            tree = ast.parse(rule["expression"], mode="eval")
+        except SyntaxError as e:
+            raise RuleError(f"Rule {rule_id}: invalid expression: {e}")
+        evaluate = self._compile_node(tree.body, rule_id)
+        
+        # Catch template typos at startup rather than when the rule fires
+        known = set(SCALAR_FEATURES) | set(CONSTANTS) | set(LABELS) | {"value"}
+        for _, field, _, _ in string.Formatter().parse(rule["message"]):
+            if field is not None and field not in known:
+                raise RuleError(f"Rule {rule_id}: unknown template field {{{field}}}")
+        
+        return CompiledRule(rule, evaluate)
+    
+    def _column(self, column: Column) -> int:
+        if column not in self._column_index:
+            self._column_index[column] = len(self.columns)
+            self.columns.append(column)
+        return self._column_index[column]
+    
+    def _compile_node(self, node: ast.AST, rule_id: str) -> Vectorized:
+        """Translate a whitelisted expression AST into a column function"""
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda X: np.full(len(X), value)
+        
+        if isinstance(node, ast.Name):
+            if node.id not in SCALAR_FEATURES:
+                raise RuleError(f"Rule {rule_id}: unknown feature '{node.id}'")
+            index = self._column((node.id, None))
+            return lambda X: X[:, index]
+        
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in LOOKUP_FEATURES:
+                raise RuleError(f"Rule {rule_id}: unknown function in {ast.unparse(node)}")
+            if len(node.args) != 1 or node.keywords or not isinstance(node.args[0], ast.Constant):
+                raise RuleError(f"Rule {rule_id}: {node.func.id}() takes one literal argument")
+            argument = node.args[0].value
+            if node.func.id == "hour" and argument not in range(24):
+                raise RuleError(f"Rule {rule_id}: hour() takes 0-23")
+            index = self._column((node.func.id, argument))
+            return lambda X: X[:, index]
+        
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._compile_node(node.operand, rule_id)
+            if isinstance(node.op, ast.USub):
+                return lambda X: -operand(X)
+            return operand
+        
+        if isinstance(node, ast.BinOp):
+            left = self._compile_node(node.left, rule_id)
+            right = self._compile_node(node.right, rule_id)
+            if isinstance(node.op, ast.Add):
+                return lambda X: left(X) + right(X)
+            if isinstance(node.op, ast.Sub):
+                return lambda X: left(X) - right(X)
+            if isinstance(node.op, ast.Mult):
+                return lambda X: left(X) * right(X)
+            if isinstance(node.op, ast.Div):
+                # x / 0 evaluates to 0 so ratio rules stay quiet for empty users
+                def divide(X: np.ndarray) -> np.ndarray:
+                    numerator, denominator = left(X), right(X)
+                    return np.divide(numerator, denominator, out=np.zeros(len(X)), where=denominator != 0)
+                return divide
+        
+        raise RuleError(f"Rule {rule_id}: unsupported expression {ast.unparse(node)!r}")
+    
+    # Evaluation
+    def feature_matrix(self, features: List[TransactionFeatures]) -> np.ndarray:
+        """One row per user with every column the rules reference"""
+        matrix = np.zeros((len(features), len(self.columns)), dtype=np.float64)
+        for row, item in enumerate(features):
+            for col, (name, argument) in enumerate(self.columns):
+                if argument is None:
+                    matrix[row, col] = SCALAR_FEATURES[name](item)
+                else:
+                    matrix[row, col] = LOOKUP_FEATURES[name](item, argument)
+        return matrix
+    
+    def evaluate_matrix(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(fired, values): boolean and float arrays of shape (users, rules)"""
+        values = np.empty((len(matrix), len(self.rules)), dtype=np.float64)
+        fired = np.empty((len(matrix), len(self.rules)), dtype=bool)
+        for i, rule in enumerate(self.rules):
+            values[:, i] = rule.evaluate(matrix)
+            fired[:, i] = OPERATORS[rule.op](values[:, i], rule.threshold)
+        return fired, values
+    
+    def evaluate_many(self, features: List[TransactionFeatures]) -> List[List[Insight]]:
+        """Insights for each user, in rule order"""
+        if not features or not self.rules:
+            return [[] for _ in features]
+        
+        matrix = self.feature_matrix(features)
+        fired, values = self.evaluate_matrix(matrix)
+        
+        results: List[List[Insight]] = []
+        for row, item in enumerate(features):
+            insights = []
+            rule_indexes = np.flatnonzero(fired[row])
+            if len(rule_indexes):
+                context = self._context(item, matrix[row])
+                for i in rule_indexes:
+                    rule = self.rules[i]
+                    insights.append(Insight(
+                        type=rule.type,
+                        title=rule.title,
+                        message=rule.message.format(value=values[row, i], **context),
+                        severity=rule.severity
+                    ))
+            results.append(insights)
+        return results
+    
+    def evaluate(self, features: TransactionFeatures) -> List[Insight]:
+        """Insights for one user"""
+        return self.evaluate_many([features])[0]
+    
+    def _context(self, features: TransactionFeatures, row: np.ndarray) -> Dict[str, Any]:
+        context: Dict[str, Any] = dict(CONSTANTS)
+        for col, (name, argument) in enumerate(self.columns):
+            if argument is None:
+                context[name] = row[col]
+        context["top_merchant"] = features.top_merchant
+        return context
+
+def load_insight_rules(path: Optional[str]) -> List[Dict[str, Any]]:
+    """Rules from a JSON file (a list of rule objects), or the built-in rules"""
+    if not path:
+        return get_insight_rules()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
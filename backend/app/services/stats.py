@@ -1,10 +1,14 @@
 """
 Statistics and analytics service
 """
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, date
 from collections import defaultdict
+import numpy as np
 from app.models.schemas import TransactionResponse, CategorySummary, SpendingSummary
+from app.models.rollup import SpendingRollups
+from app.services.frame import TransactionFrame, PERIOD_FORMATS, ranked
+from app.services.features import TransactionFeatures
 
 class StatsService:
     """Generate statistics and analytics from transactions"""
@@ -12,62 +16,42 @@ class StatsService:
     def get_summary(
         self,
         transactions: List[TransactionResponse],
-        days: int = 30
+        days: int = 30,
+        features: Optional[TransactionFeatures] = None
     ) -> SpendingSummary:
         """Get comprehensive spending summary"""
-        debits = [t for t in transactions if t.type == "debit"]
-        credits = [t for t in transactions if t.type == "credit"]
+        features = features or TransactionFeatures.from_transactions(transactions)
         
-        total_spent = sum(t.amount for t in debits)
-        total_income = sum(t.amount for t in credits)
+        total_spent = features.debit_total
+        total_income = features.credit_total
         net_balance = total_income - total_spent
         
         # Category breakdown
-        category_totals = defaultdict(lambda: {"amount": 0.0, "count": 0})
-        for t in debits:
-            category_totals[t.category]["amount"] += t.amount
-            category_totals[t.category]["count"] += 1
-        
         categories = []
-        for category, data in category_totals.items():
-            percentage = (data["amount"] / total_spent * 100) if total_spent > 0 else 0
+        for category, amount in features.category_totals.items():
+            percentage = (amount / total_spent * 100) if total_spent > 0 else 0
             categories.append(CategorySummary(
                 category=category,
-                amount=data["amount"],
-                count=data["count"],
+                amount=amount,
+                count=features.category_counts[category],
                 percentage=round(percentage, 2)
             ))
         
-        categories.sort(key=lambda x: x.amount, reverse=True)
-        
         # Top merchants
-        merchant_totals = defaultdict(lambda: {"amount": 0.0, "count": 0})
-        for t in debits:
-            if t.merchant:
-                merchant_totals[t.merchant]["amount"] += t.amount
-                merchant_totals[t.merchant]["count"] += 1
-        
         top_merchants = [
             {
                 "merchant": merchant,
-                "amount": data["amount"],
-                "count": data["count"]
+                "amount": amount,
+                "count": features.merchant_counts[merchant]
             }
-            for merchant, data in sorted(
-                merchant_totals.items(),
-                key=lambda x: x[1]["amount"],
-                reverse=True
-            )[:10]
+            for merchant, amount in list(features.merchant_totals.items())[:10]
         ]
         
         # Date range
-        if transactions:
-            dates = [t.date for t in transactions]
-            min_date = min(dates)
-            max_date = max(dates)
+        if features.first_date:
             date_range = {
-                "start": min_date.isoformat(),
-                "end": max_date.isoformat()
+                "start": features.first_date.isoformat(),
+                "end": features.last_date.isoformat()
             }
         else:
             date_range = {
@@ -79,7 +63,7 @@ class StatsService:
             total_spent=total_spent,
             total_income=total_income,
             net_balance=net_balance,
-            transaction_count=len(transactions),
+            transaction_count=features.transaction_count,
             categories=categories,
             top_merchants=top_merchants,
             date_range=date_range
@@ -88,96 +72,139 @@ class StatsService:
     def get_trends(
         self,
         transactions: List[TransactionResponse],
-        period: str = "monthly"
+        period: str = "monthly",
+        features: Optional[TransactionFeatures] = None
     ) -> Dict[str, Any]:
         """Get spending trends"""
-        debits = [t for t in transactions if t.type == "debit"]
-        
-        if period == "daily":
-            # Group by day
-            daily_totals = defaultdict(float)
-            for t in debits:
-                date_key = t.date.strftime("%Y-%m-%d")
-                daily_totals[date_key] += t.amount
-            
-            return {
-                "period": "daily",
-                "data": [
-                    {"date": date, "amount": amount}
-                    for date, amount in sorted(daily_totals.items())
-                ]
-            }
+        features = features or TransactionFeatures.from_transactions(transactions)
         
-        elif period == "weekly":
-            # Group by week
-            weekly_totals = defaultdict(float)
-            for t in debits:
-                week_key = t.date.strftime("%Y-W%W")
-                weekly_totals[week_key] += t.amount
-            
-            return {
-                "period": "weekly",
-                "data": [
-                    {"week": week, "amount": amount}
-                    for week, amount in sorted(weekly_totals.items())
-                ]
-            }
+        if period not in PERIOD_FORMATS:
+            period = "monthly"
+        key, _ = PERIOD_FORMATS[period]
         
-        else:  # monthly
-            # Group by month
-            monthly_totals = defaultdict(float)
-            for t in debits:
-                month_key = t.date.strftime("%Y-%m")
-                monthly_totals[month_key] += t.amount
-            
-            return {
-                "period": "monthly",
-                "data": [
-                    {"month": month, "amount": amount}
-                    for month, amount in sorted(monthly_totals.items())
-                ]
-            }
+        return {
+            "period": period,
+            "data": [
+                {key: label, "amount": amount}
+                for label, amount in features.period_totals(period)
+            ]
+        }
     
     def get_category_breakdown(
         self,
-        transactions: List[TransactionResponse]
+        transactions: List[TransactionResponse],
+        frame: Optional[TransactionFrame] = None
     ) -> Dict[str, Any]:
         """Get detailed category breakdown"""
-        debits = [t for t in transactions if t.type == "debit"]
-        
-        category_data = defaultdict(lambda: {
-            "amount": 0.0,
-            "count": 0,
-            "transactions": []
-        })
-        
-        for t in debits:
-            category_data[t.category]["amount"] += t.amount
-            category_data[t.category]["count"] += 1
-            category_data[t.category]["transactions"].append({
-                "id": t.id,
-                "date": t.date.isoformat(),
-                "merchant": t.merchant,
-                "amount": t.amount
-            })
+        frame = frame or TransactionFrame.from_transactions(transactions)
         
-        total = sum(data["amount"] for data in category_data.values())
+        category_amounts, category_counts = frame.group_by_category(frame.debit)
+        total = float(category_amounts.sum())
+        
+        categories = []
+        for code in ranked(category_amounts, category_counts):
+            amount = float(category_amounts[code])
+            # Top 10 per category, in the order they were fetched
+            rows = np.flatnonzero(frame.debit & (frame.category_codes == code))[:10]
+            categories.append({
+                "category": frame.categories[code],
+                "amount": amount,
+                "count": int(category_counts[code]),
+                "percentage": round((amount / total * 100) if total > 0 else 0, 2),
+                "transactions": [
+                    {
+                        "id": frame.transactions[i].id,
+                        "date": frame.transactions[i].date.isoformat(),
+                        "merchant": frame.transactions[i].merchant,
+                        "amount": frame.transactions[i].amount
+                    }
+                    for i in rows
+                ]
+            })
         
         return {
-            "categories": [
-                {
-                    "category": category,
-                    "amount": data["amount"],
-                    "count": data["count"],
-                    "percentage": round((data["amount"] / total * 100) if total > 0 else 0, 2),
-                    "transactions": data["transactions"][:10]  # Top 10 per category
-                }
-                for category, data in sorted(
-                    category_data.items(),
-                    key=lambda x: x[1]["amount"],
-                    reverse=True
-                )
-            ],
+            "categories": categories,
             "total": total
         }
-
+    
+    def get_rollup_summary(self, rollups: SpendingRollups) -> SpendingSummary:
+        """Spending summary from pre-aggregated rollups"""
+        totals: Dict[str, float] = defaultdict(float)
+        category_amounts: Dict[str, float] = defaultdict(float)
+        category_counts: Dict[str, int] = defaultdict(int)
+        transaction_count = 0
+        first_at: Optional[datetime] = None
+        last_at: Optional[datetime] = None
+        
+        for row in rollups.day_category:
+            totals[row["type"]] += row["amount"]
+            transaction_count += row["count"]
+            if row["type"] == "debit":
+                category_amounts[row["category"]] += row["amount"]
+                category_counts[row["category"]] += row["count"]
+            
+            row_first = datetime.fromisoformat(row["first_at"].replace("Z", "+00:00"))
+            row_last = datetime.fromisoformat(row["last_at"].replace("Z", "+00:00"))
+            first_at = row_first if first_at is None or row_first < first_at else first_at
+            last_at = row_last if last_at is None or row_last > last_at else last_at
+        
+        total_spent = totals["debit"]
+        total_income = totals["credit"]
+        
+        categories = [
+            CategorySummary(
+                category=category,
+                amount=amount,
+                count=category_counts[category],
+                percentage=round((amount / total_spent * 100) if total_spent > 0 else 0, 2)
+            )
+            for category, amount in sorted(category_amounts.items(), key=lambda x: x[1], reverse=True)
+        ]
+        
+        merchant_amounts: Dict[str, float] = defaultdict(float)
+        merchant_counts: Dict[str, int] = defaultdict(int)
+        for row in rollups.day_merchant:
+            if row["type"] == "debit":
+                merchant_amounts[row["merchant"]] += row["amount"]
+                merchant_counts[row["merchant"]] += row["count"]
+        
+        top_merchants = [
+            {"merchant": merchant, "amount": amount, "count": merchant_counts[merchant]}
+            for merchant, amount in sorted(merchant_amounts.items(), key=lambda x: x[1], reverse=True)[:10]
+        ]
+        
+        now = datetime.now().isoformat()
+        return SpendingSummary(
+            total_spent=total_spent,
+            total_income=total_income,
+            net_balance=total_income - total_spent,
+            transaction_count=transaction_count,
+            categories=categories,
+            top_merchants=top_merchants,
+            date_range={
+                "start": first_at.isoformat() if first_at else now,
+                "end": last_at.isoformat() if last_at else now
+            }
+        )
+    
+    def get_rollup_trends(self, rollups: SpendingRollups, period: str = "monthly") -> Dict[str, Any]:
+        """Spending trends from pre-aggregated rollups"""
+        if period not in PERIOD_FORMATS:
+            period = "monthly"
+        key, label_format = PERIOD_FORMATS[period]
+        
+        totals: Dict[str, float] = defaultdict(float)
+        if period == "monthly" and rollups.month_type is not None:
+            for row in rollups.month_type:
+                if row["type"] == "debit":
+                    totals[row["month"]] += row["amount"]
+        else:
+            for row in rollups.day_category:
+                if row["type"] == "debit":
+                    label = date.fromisoformat(row["day"]).strftime(label_format)
+                    totals[label] += row["amount"]
+        
+        return {
+            "period": period,
+            "data": [{key: label, "amount": amount} for label, amount in sorted(totals.items())]
+        }
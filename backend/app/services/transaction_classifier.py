@@ -1,11 +1,19 @@
 """
 Transaction classification service using embeddings + Gemini
 """
-from typing import Dict, Optional, List
-from app.services.embeddings import get_embedding
-from app.config.gemini import get_gemini_model
+from typing import Dict, Optional, List, Tuple
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import threading
+from app.services.embeddings import get_embedding, get_embeddings
+from app.services.classification_cache import get_classification_cache, normalize_description, GLOBAL_SCOPE
+from app.config.gemini import get_gemini_gateway, GeminiQuotaError, PRIORITY_CLASSIFICATION
 from app.config.settings import settings
-from app.utils.categories import CATEGORY_KEYWORDS, get_all_categories
+from app.utils.categories import CATEGORY_KEYWORDS, get_all_categories, get_taxonomy_hash
+from app.utils.keyword_matcher import KeywordMatcher
 from app.models.memory import search_similar_memories
 import numpy as np
 
@@ -15,16 +23,67 @@ class TransactionClassifier:
     def __init__(self):
         self.categories = get_all_categories()
         self.category_keywords = CATEGORY_KEYWORDS
-        self.category_embeddings = self._precompute_category_embeddings()
+        self.category_names = list(self.category_keywords.keys())
+        # One automaton over every category keyword; pattern id -> owning category indexes
+        self.keyword_matcher = KeywordMatcher(
+            keyword for keywords in self.category_keywords.values() for keyword in keywords
+        )
+        self.keyword_categories: List[List[int]] = [[] for _ in self.keyword_matcher.patterns]
+        for index, keywords in enumerate(self.category_keywords.values()):
+            for keyword in keywords:
+                if keyword:
+                    self.keyword_categories[self.keyword_matcher.pattern_id(keyword)].append(index)
+        # Row i of category_matrix is the normalized embedding of category_names[i];
+        # built on first use so importing the module does not load the model
+        self._category_matrix: Optional[np.ndarray] = None
+        self._category_matrix_lock = threading.Lock()
     
-    def _precompute_category_embeddings(self) -> Dict[str, List[float]]:
-        """Precompute embeddings for category keywords"""
-        embeddings = {}
-        for category, keywords in self.category_keywords.items():
-            # Create a representative text for the category
-            category_text = f"{category} {', '.join(keywords[:5])}"
-            embeddings[category] = get_embedding(category_text)
-        return embeddings
+    @property
+    def category_matrix(self) -> np.ndarray:
+        """Normalized float32 category embeddings, shape (categories, dimension)"""
+        if self._category_matrix is None:
+            with self._category_matrix_lock:
+                if self._category_matrix is None:
+                    self._category_matrix = self._load_category_matrix()
+        return self._category_matrix
+    
+    def _category_texts(self) -> List[str]:
+        """Representative text per category, in category_names order"""
+        return [
+            f"{category} {', '.join(self.category_keywords[category][:5])}"
+            for category in self.category_names
+        ]
+    
+    def _load_category_matrix(self) -> np.ndarray:
+        """Read the matrix from disk, or encode it (one batch) and save it"""
+        path = None
+        if settings.CATEGORY_EMBEDDINGS_PATH:
+            # Keyed by model and keyword table, so either changing rebuilds it
+            key = hashlib.sha256(
+                f"{settings.EMBEDDING_MODEL}\0{get_taxonomy_hash()}".encode("utf-8")
+            ).hexdigest()[:16]
+            path = os.path.join(settings.CATEGORY_EMBEDDINGS_PATH, f"{key}.npy")
+            try:
+                matrix = np.load(path)
+                if matrix.ndim == 2 and matrix.shape[0] == len(self.category_names):
+                    return matrix.astype(np.float32, copy=False)
+            except (OSError, ValueError):
+                pass
+        
+        matrix = np.asarray(get_embeddings(self._category_texts()), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+        
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as f:
+                    np.save(f, matrix)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Error saving category embeddings ({path}): {e}")
+        return matrix
     
     def classify(
         self,
@@ -37,7 +96,29 @@ class TransactionClassifier:
         1. Rule-based (keywords) - PRIMARY METHOD
         2. Vector similarity with past transactions
         3. Gemini LLM fallback (only if both above fail and enabled)
+        
+        Results are cached by normalized description, so a recurring
+        merchant only goes through the cascade once.
         """
+        normalized = normalize_description(description) if settings.CLASSIFICATION_CACHE_ENABLED else ""
+        # An empty key (only refs, dates or digits) says nothing about the merchant; don't share results
+        if normalized:
+            cached = get_classification_cache().get_many(user_id, [normalized])[0]
+            if cached is not None:
+                return cached
+            result = self._classify_uncached(description, user_id, amount)
+            self._cache_results(user_id, [normalized], [result])
+            return result
+        
+        return self._classify_uncached(description, user_id, amount)
+    
+    def _classify_uncached(
+        self,
+        description: str,
+        user_id: str,
+        amount: float
+    ) -> Dict[str, any]:
+        """Run the full keyword -> vector -> Gemini cascade for one description"""
         # Step 1: Rule-based classification (improved - lower threshold)
         rule_based = self._classify_by_keywords(description)
         if rule_based["confidence"] >= 0.3:  # Lowered from 0.8 - accept more keyword matches
@@ -61,24 +142,148 @@ class TransactionClassifier:
                 "method": "fallback"
             }
     
+    def classify_many(
+        self,
+        descriptions: List[str],
+        user_id: str,
+        amounts: Optional[List[float]] = None
+    ) -> List[Dict[str, any]]:
+        """
+        Classify a batch of transactions with the same cascade as classify()
+        
+        Keyword matching runs over the whole batch first; every description
+        it cannot resolve is encoded in a single get_embeddings call and
+        scored against the category embedding matrix with one matrix
+        multiply. Results are returned in input order.
+        
+        Cached descriptions are answered from the classification cache,
+        and descriptions that normalize to the same text go through the
+        cascade once per batch. Descriptions that normalize to nothing are
+        classified individually and never cached.
+        """
+        if amounts is None:
+            amounts = [0.0] * len(descriptions)
+        
+        if not settings.CLASSIFICATION_CACHE_ENABLED:
+            return self._classify_many_uncached(descriptions, user_id, amounts)
+        
+        normalized = [normalize_description(description) for description in descriptions]
+        results = get_classification_cache().get_many(user_id, normalized)
+        
+        # One representative per distinct normalized description still missing;
+        # descriptions with an empty key each stand for themselves
+        missing: Dict[str, int] = {}
+        unkeyed: List[int] = []
+        for i, result in enumerate(results):
+            if result is None:
+                if normalized[i]:
+                    missing.setdefault(normalized[i], i)
+                else:
+                    unkeyed.append(i)
+        
+        if missing or unkeyed:
+            indexes = list(missing.values()) + unkeyed
+            computed = self._classify_many_uncached(
+                [descriptions[i] for i in indexes],
+                user_id,
+                [amounts[i] for i in indexes]
+            )
+            self._cache_results(user_id, list(missing.keys()), computed[:len(missing)])
+            by_text = dict(zip(missing.keys(), computed))
+            by_index = dict(zip(unkeyed, computed[len(missing):]))
+            results = [
+                result if result is not None
+                else by_index[i] if i in by_index
+                else dict(by_text[normalized[i]])
+                for i, result in enumerate(results)
+            ]
+        
+        return results
+    
+    def _cache_results(self, user_id: str, normalized: List[str], results: List[Dict[str, any]]) -> None:
+        """Store cascade results; vector results depend on the user's history, the rest do not"""
+        entries = [
+            (user_id if result["method"] == "vector" else GLOBAL_SCOPE, text, result)
+            for text, result in zip(normalized, results)
+            # Fallbacks (quota, errors, Gemini disabled) should be retried next time
+            if not result["method"].startswith("fallback") and text
+        ]
+        if entries:
+            get_classification_cache().put_many(entries)
+    
+    def _classify_many_uncached(
+        self,
+        descriptions: List[str],
+        user_id: str,
+        amounts: List[float]
+    ) -> List[Dict[str, any]]:
+        """Run the cascade for a batch of descriptions"""
+        results: List[Optional[Dict[str, any]]] = [None] * len(descriptions)
+        
+        # Step 1: Rule-based classification over the whole batch
+        unresolved = []
+        for i, description in enumerate(descriptions):
+            rule_based = self._classify_by_keywords(description)
+            if rule_based["confidence"] >= 0.3:
+                results[i] = rule_based
+            else:
+                unresolved.append(i)
+        
+        if not unresolved:
+            return results
+        
+        # Step 2: Vector similarity - one encode and one matmul for the batch
+        embeddings = np.asarray(
+            get_embeddings([descriptions[i] for i in unresolved]),
+            dtype=np.float32
+        )
+        similarities = embeddings @ self.category_matrix.T
+        
+        still_unresolved = []
+        for row, i in enumerate(unresolved):
+            vector_based = self._resolve_vector_match(
+                descriptions[i],
+                user_id,
+                embeddings[row],
+                similarities[row]
+            )
+            if vector_based["confidence"] >= 0.5:
+                results[i] = vector_based
+            else:
+                still_unresolved.append(i)
+        
+        # Step 3: Gemini LLM fallback for whatever is left, several per prompt
+        if still_unresolved:
+            gemini_results = self._classify_many_with_gemini(
+                [(descriptions[i], amounts[i]) for i in still_unresolved]
+            )
+            for i, result in zip(still_unresolved, gemini_results):
+                results[i] = result
+        
+        return results
+    
     def _classify_by_keywords(self, description: str) -> Dict[str, any]:
         """Classify using keyword matching - improved algorithm"""
         desc_lower = description.lower()
         best_match = None
         best_score = 0.0
         
-        for category, keywords in self.category_keywords.items():
-            # Count exact matches
-            exact_matches = sum(1 for keyword in keywords if keyword in desc_lower)
-            
-            # Also check for partial matches (for compound words)
-            partial_matches = sum(
-                1 for keyword in keywords 
-                if any(keyword in word or word in keyword for word in desc_lower.split())
-            )
+        # Exact matches: keywords occurring anywhere in the description
+        exact_ids = self.keyword_matcher.substring_ids(desc_lower)
+        # Partial matches (for compound words): keyword in a word or word in a keyword
+        partial_ids = self.keyword_matcher.token_ids(desc_lower, exact_ids)
+        
+        exact_counts = Counter(c for i in exact_ids for c in self.keyword_categories[i])
+        partial_counts = Counter(c for i in partial_ids for c in self.keyword_categories[i])
+        
+        # Categories in definition order so ties keep going to the first one
+        for index in sorted(partial_counts.keys() | exact_counts.keys()):
+            category = self.category_names[index]
+            keywords = self.category_keywords[category]
+            exact_matches = exact_counts[index]
             
             # Use the better of the two
-            matches = max(exact_matches, partial_matches)
+            matches = max(exact_matches, partial_counts[index])
             
             # Calculate score - if any keyword matches, give it a score
             if matches > 0:
@@ -115,17 +320,28 @@ class TransactionClassifier:
     ) -> Dict[str, any]:
         """Classify using vector similarity with past transactions"""
         # Get embedding for description
-        desc_embedding = np.array(get_embedding(description))
+        desc_embedding = np.asarray(get_embedding(description), dtype=np.float32)
         
         # Compare with category embeddings
+        similarities = self.category_matrix @ desc_embedding
+        
+        return self._resolve_vector_match(description, user_id, desc_embedding, similarities)
+    
+    def _resolve_vector_match(
+        self,
+        description: str,
+        user_id: str,
+        desc_embedding: np.ndarray,
+        similarities: np.ndarray
+    ) -> Dict[str, any]:
+        """Pick the best category from similarity scores, then check user's past transactions"""
         best_category = None
         best_similarity = 0.0
         
-        for category, cat_embedding in self.category_embeddings.items():
-            similarity = np.dot(desc_embedding, np.array(cat_embedding))
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_category = category
+        best_index = int(np.argmax(similarities))
+        if similarities[best_index] > 0:
+            best_similarity = float(similarities[best_index])
+            best_category = self.category_names[best_index]
         
         # Also check user's past transactions
         try:
@@ -133,7 +349,8 @@ class TransactionClassifier:
                 user_id,
                 description,
                 limit=3,
-                threshold=0.6
+                threshold=0.6,
+                query_embedding=desc_embedding.tolist()
             )
             
             if similar_memories:
@@ -146,7 +363,6 @@ class TransactionClassifier:
                 
                 if memory_categories:
                     # Use most common category from similar memories
-                    from collections import Counter
                     most_common = Counter(memory_categories).most_common(1)[0]
                     if most_common[1] >= 2:  # At least 2 similar transactions
                         best_category = most_common[0]
@@ -167,9 +383,7 @@ class TransactionClassifier:
         description: str,
         amount: float
     ) -> Dict[str, any]:
-        """Classify using Gemini LLM - with rate limiting and error handling"""
-        import time
-        
+        """Classify using Gemini LLM (rate limiting and circuit breaking live in the gateway)"""
         # Check if Gemini is enabled (can be disabled via env var)
         if not settings.is_gemini_enabled:
             return {
@@ -179,8 +393,6 @@ class TransactionClassifier:
             }
         
         try:
-            model = get_gemini_model()
-            
             prompt = f"""Classify this transaction into one of these categories:
 {', '.join(self.categories)}
 
@@ -188,9 +400,8 @@ Transaction description: {description}
 Amount: ₹{amount}
 
 Respond with ONLY the category name, nothing else."""
-
-            response = model.generate_content(prompt)
-            category = response.text.strip()
+            
+            category = get_gemini_gateway().generate(prompt, priority=PRIORITY_CLASSIFICATION).strip()
             
             # Clean up response (remove quotes, extra text)
             category = category.strip('"\'')
@@ -205,22 +416,118 @@ Respond with ONLY the category name, nothing else."""
                 "confidence": 0.85,
                 "method": "gemini"
             }
+        except GeminiQuotaError:
+            # Quota exhausted or circuit open - return fallback without retrying
+            return {
+                "category": "Other",
+                "confidence": 0.4,
+                "method": "fallback_quota_exceeded"
+            }
         except Exception as e:
-            error_str = str(e)
-            # Check if it's a quota/rate limit error
-            if "429" in error_str or "quota" in error_str.lower() or "rate limit" in error_str.lower():
-                print(f"Gemini quota exceeded - using fallback classification")
-                # Return fallback without retrying
-                return {
+            print(f"Gemini classification error: {e}")
+            return {
+                "category": "Other",
+                "confidence": 0.4,
+                "method": "fallback_error"
+            }
+    
+    def _classify_many_with_gemini(self, items: List[Tuple[str, float]]) -> List[Dict[str, any]]:
+        """
+        Classify (description, amount) pairs with as few Gemini calls as possible
+        
+        Distinct descriptions are packed GEMINI_BATCH_SIZE to a prompt and
+        up to GEMINI_BATCH_CONCURRENCY prompts run at once. Items a batch
+        answer leaves out (or a batch that fails to parse) are retried one
+        at a time; a quota error falls back for the whole batch instead,
+        since retrying would only hit the open circuit.
+        """
+        if not settings.is_gemini_enabled:
+            return [{
+                "category": "Other",
+                "confidence": 0.4,
+                "method": "fallback_gemini_disabled"
+            } for _ in items]
+        
+        # Repeated descriptions (the same payee over a statement) share one answer
+        distinct: Dict[str, float] = {}
+        for description, amount in items:
+            distinct.setdefault(description, amount)
+        pending = list(distinct.items())
+        
+        size = max(1, settings.GEMINI_BATCH_SIZE)
+        batches = [pending[start:start + size] for start in range(0, len(pending), size)]
+        workers = min(len(batches), max(1, settings.GEMINI_BATCH_CONCURRENCY))
+        
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini-classify") as executor:
+                batch_results = list(executor.map(self._classify_gemini_batch, batches))
+        else:
+            batch_results = [self._classify_gemini_batch(batch) for batch in batches]
+        
+        resolved: Dict[str, Dict[str, any]] = {}
+        for batch_result in batch_results:
+            resolved.update(batch_result)
+        return [resolved[description] for description, _ in items]
+    
+    def _classify_gemini_batch(self, batch: List[Tuple[str, float]]) -> Dict[str, Dict[str, any]]:
+        """Classify one batch with a single prompt; returns description -> result"""
+        if len(batch) == 1:
+            description, amount = batch[0]
+            return {description: self._classify_with_gemini(description, amount)}
+        
+        lines = "\n".join(
+            json.dumps({"id": i, "description": description, "amount": amount}, ensure_ascii=False)
+            for i, (description, amount) in enumerate(batch)
+        )
+        prompt = f"""Classify each transaction into one of these categories:
+{', '.join(self.categories)}
+
+Transactions (one JSON object per line):
+{lines}
+
+Respond with ONLY a JSON object mapping each transaction id to its category name, for example {{"0": "Shopping", "1": "Transfers"}}."""
+        
+        results: Dict[str, Dict[str, any]] = {}
+        try:
+            text = get_gemini_gateway().generate(prompt, priority=PRIORITY_CLASSIFICATION)
+            answers = self._parse_batch_answer(text)
+        except GeminiQuotaError:
+            # Quota exhausted or circuit open - fall back for the whole batch
+            return {
+                description: {
                     "category": "Other",
                     "confidence": 0.4,
                     "method": "fallback_quota_exceeded"
                 }
-            else:
-                print(f"Gemini classification error: {e}")
-                return {
-                    "category": "Other",
-                    "confidence": 0.4,
-                    "method": "fallback_error"
+                for description, _ in batch
+            }
+        except Exception as e:
+            print(f"Gemini batch classification error, retrying individually: {e}")
+            answers = {}
+        
+        for i, (description, amount) in enumerate(batch):
+            category = answers.get(str(i))
+            if isinstance(category, str):
+                category = category.strip().strip('"\'')
+                results[description] = {
+                    "category": category if category in self.categories else "Other",
+                    "confidence": 0.85,
+                    "method": "gemini_batch"
                 }
-
+            else:
+                # Missing from the answer - ask about this one on its own
+                results[description] = self._classify_with_gemini(description, amount)
+        
+        return results
+    
+    @staticmethod
+    def _parse_batch_answer(text: str) -> Dict[str, any]:
+        """Extract the JSON object from a batch answer (tolerates code fences and extra text)"""
+        start = text.find("{")
+        end = text.rfind("}")
+        if start == -1 or end < start:
+            raise ValueError("no JSON object in response")
+        answers = json.loads(text[start:end + 1])
+        if not isinstance(answers, dict):
+            raise ValueError("response is not a JSON object")
+        return {str(key): value for key, value in answers.items()}
@@ -0,0 +1,426 @@
+"""
+Local per-user vector index for memory similarity search
+"""
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import threading
+import time
+import numpy as np
+from app.config.settings import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows - appends are only serialized within the process
+    fcntl = None
+
+VECTORS_FILE = "vectors.f32"
+ITEMS_FILE = "items.jsonl"
+IVF_FILE = "ivf.npz"
+LOCK_FILE = ".lock"
+STALE_FILE = ".stale"  # Present while the index is known to be missing rows
+
+# loader(user_id) -> ({id, text, metadata} items, embeddings) for every stored memory
+IndexLoader = Callable[[str], Tuple[List[Dict[str, Any]], np.ndarray]]
+
+class UserVectorIndex:
+    """
+    Memory vectors for one user, persisted as memory-mapped files
+    
+    vectors.f32 holds a row-major float32 matrix and items.jsonl holds one
+    {id, text, metadata} line per row. Small users are searched with one
+    flat matrix-vector product. Above ivf_threshold vectors the index
+    trains an IVF coarse quantizer (spherical k-means) and only scores the
+    nprobe closest partitions. It retrains once the index has doubled since
+    the last training.
+    """
+    
+    def __init__(self, path: str, user_id: str, dimension: int, ivf_threshold: int, nprobe: int):
+        self.path = path
+        self.user_id = user_id
+        self.dimension = dimension
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+        
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.items: List[Dict[str, Any]] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_count = 0
+        self._lists: List[np.ndarray] = []
+        self._trained_assignments = np.zeros(0, dtype=np.int32)
+        self._ivf_mtime: Optional[float] = None
+        self._all_items: List[Dict[str, Any]] = []
+        self._items_bytes = 0
+        self._loaded_bytes = -1
+        self._inodes: Tuple[int, int] = (0, 0)
+    
+    @property
+    def count(self) -> int:
+        return len(self.items)
+    
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+    
+    def refresh(self) -> None:
+        """(Re)load from disk if another process appended to the index"""
+        vectors_file = self._file(VECTORS_FILE)
+        items_file = self._file(ITEMS_FILE)
+        vectors_stat = os.stat(vectors_file) if os.path.exists(vectors_file) else None
+        items_stat = os.stat(items_file) if os.path.exists(items_file) else None
+        vectors_size = vectors_stat.st_size if vectors_stat else 0
+        items_size = items_stat.st_size if items_stat else 0
+        inodes = (vectors_stat.st_ino if vectors_stat else 0, items_stat.st_ino if items_stat else 0)
+        if inodes == self._inodes and vectors_size == self._loaded_bytes and items_size == self._items_bytes:
+            return
+        
+        if inodes != self._inodes or items_size < self._items_bytes:
+            # The files were replaced (rebuilt); start over
+            self._all_items = []
+            self._items_bytes = 0
+            self._inodes = inodes
+        
+        # Only parse the lines appended since the last refresh
+        if items_size > self._items_bytes:
+            with open(items_file, "rb") as f:
+                f.seek(self._items_bytes)
+                chunk = f.read()
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            self._all_items.extend(
+                json.loads(line) for line in complete.decode("utf-8").splitlines() if line.strip()
+            )
+            self._items_bytes += len(complete)
+        
+        # A crash between the two appends can leave them uneven; trust the shorter one
+        rows = min(vectors_size // (self.dimension * 4), len(self._all_items))
+        if rows:
+            self.vectors = np.memmap(vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+        else:
+            self.vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        
+        self.items = self._all_items[:rows]
+        self._loaded_bytes = vectors_size
+        self._load_ivf()
+    
+    def add(self, items: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Append vectors and their items to the index files"""
+        if not items:
+            return
+        
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(items), self.dimension)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+        
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                # Appends are idempotent: a retried or overlapping write (e.g. during a rebuild) adds nothing twice
+                known = {item["id"] for item in self.items}
+                keep = [i for i, item in enumerate(items) if item["id"] not in known]
+                if not keep:
+                    return
+                items = [items[i] for i in keep]
+                embeddings = embeddings[keep]
+                
+                with open(self._file(ITEMS_FILE), "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(item) + "\n" for item in items))
+                with open(self._file(VECTORS_FILE), "ab") as f:
+                    f.write(embeddings.tobytes())
+                self.refresh()
+                
+                if self.count >= self.ivf_threshold and self.count >= 2 * self.trained_count:
+                    self._train_ivf()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def rebuild(self, items: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Replace the index files with exactly these vectors and items"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(items), self.dimension)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+        
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # New files replace the old ones atomically; readers notice the inode change
+                with open(self._file(ITEMS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(item) + "\n" for item in items))
+                with open(self._file(VECTORS_FILE + ".tmp"), "wb") as f:
+                    f.write(embeddings.tobytes())
+                if os.path.exists(self._file(IVF_FILE)):
+                    os.remove(self._file(IVF_FILE))
+                os.replace(self._file(ITEMS_FILE + ".tmp"), self._file(ITEMS_FILE))
+                os.replace(self._file(VECTORS_FILE + ".tmp"), self._file(VECTORS_FILE))
+                self.refresh()
+                
+                if self.count >= self.ivf_threshold:
+                    self._train_ivf()
+                if os.path.exists(self._file(STALE_FILE)):
+                    os.remove(self._file(STALE_FILE))
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def search(self, query: np.ndarray, limit: int, threshold: float) -> List[Dict[str, Any]]:
+        """Return up to limit items with cosine similarity above threshold"""
+        if self.count == 0:
+            return []
+        
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        
+        if self.centroids is not None and self._lists:
+            # Score only the partitions closest to the query
+            probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+            candidates = np.concatenate([self._lists[p] for p in probes])
+            # Vectors appended since training are not in any list yet
+            if self.count > len(self.assignments):
+                candidates = np.concatenate([candidates, np.arange(len(self.assignments), self.count)])
+            similarities = self.vectors[candidates] @ query
+        else:
+            candidates = np.arange(self.count)
+            similarities = self.vectors @ query
+        
+        keep = similarities > threshold
+        candidates = candidates[keep]
+        similarities = similarities[keep]
+        if len(similarities) > limit:
+            top = np.argpartition(-similarities, limit)[:limit]
+            candidates = candidates[top]
+            similarities = similarities[top]
+        order = np.argsort(-similarities)
+        
+        return [
+            {**self.items[int(candidates[i])], "user_id": self.user_id, "similarity": float(similarities[i])}
+            for i in order
+        ]
+    
+    def _train_ivf(self) -> None:
+        """Spherical k-means over the current vectors"""
+        vectors = np.asarray(self.vectors)
+        count = len(vectors)
+        nlist = int(min(1024, max(8, np.sqrt(count))))
+        
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(count, size=nlist, replace=False)].copy()
+        for _ in range(10):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty partitions keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.where(norms == 0, 1.0, norms), centroids)
+        assignments = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        
+        tmp_file = self._file(IVF_FILE + ".tmp.npz")
+        np.savez(tmp_file, centroids=centroids.astype(np.float32), assignments=assignments)
+        os.replace(tmp_file, self._file(IVF_FILE))
+        self._ivf_mtime = None
+        self._load_ivf()
+    
+    def _load_ivf(self) -> None:
+        ivf_file = self._file(IVF_FILE)
+        mtime = os.path.getmtime(ivf_file) if os.path.exists(ivf_file) else None
+        if mtime is not None and mtime == self._ivf_mtime:
+            # Unchanged partitions; only clip to the current row count
+            self.assignments = self._trained_assignments[:self.count]
+            return
+        self._ivf_mtime = mtime
+        
+        if mtime is None:
+            self.centroids = None
+            self.assignments = np.zeros(0, dtype=np.int32)
+            self.trained_count = 0
+            self._lists = []
+            return
+        
+        data = np.load(ivf_file)
+        self.centroids = data["centroids"]
+        self._trained_assignments = data["assignments"]
+        self.assignments = self._trained_assignments[:self.count]
+        self.trained_count = len(self.assignments)
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(self.assignments, minlength=len(self.centroids)))
+        self._lists = np.split(order, bounds[:-1])
+
+class VectorIndexStore:
+    """
+    Load, cache and update per-user vector indexes under a root directory
+    
+    An index is compared with the database (by row count) at most once per
+    verify_seconds. In between it is trusted as long as it isn't flagged
+    stale: memories this process stores are appended as they are written,
+    and the periodic check catches rows written elsewhere.
+    """
+    
+    def __init__(
+        self,
+        root: str,
+        dimension: int,
+        ivf_threshold: int = 2048,
+        nprobe: int = 8,
+        max_loaded: int = 256,
+        verify_seconds: float = 300.0
+    ):
+        self.root = root
+        self.dimension = dimension
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.max_loaded = max_loaded
+        self.verify_seconds = verify_seconds
+        self._indexes: "OrderedDict[str, UserVectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._rebuild_executor: Optional[ThreadPoolExecutor] = None
+        self._rebuilding: set = set()
+        # Monotonic time until which each user's index is trusted without a database check
+        self._verified_until: Dict[str, float] = {}
+        # Appends per user, so a rebuild can tell whether rows landed while it was loading
+        self._writes: Dict[str, int] = {}
+    
+    def _user_path(self, user_id: str) -> str:
+        # User ids are UUIDs; strip anything that could escape the root
+        safe_id = "".join(c for c in user_id if c.isalnum() or c == "-")
+        return os.path.join(self.root, safe_id)
+    
+    def _get(self, user_id: str) -> UserVectorIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = UserVectorIndex(
+                    self._user_path(user_id), user_id, self.dimension, self.ivf_threshold, self.nprobe
+                )
+                self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_loaded:
+                self._indexes.popitem(last=False)
+            return index
+    
+    def has_user(self, user_id: str) -> bool:
+        """Whether any memories have been indexed for the user"""
+        return os.path.exists(os.path.join(self._user_path(user_id), VECTORS_FILE))
+    
+    def _is_stale(self, user_id: str) -> bool:
+        return os.path.exists(os.path.join(self._user_path(user_id), STALE_FILE))
+    
+    def is_trusted(self, user_id: str) -> bool:
+        """Whether searches can use the index without asking the database first"""
+        with self._lock:
+            verified = time.monotonic() < self._verified_until.get(user_id, 0.0)
+        return verified and not self._is_stale(user_id)
+    
+    def is_current(self, user_id: str, stored_count: int) -> bool:
+        """
+        Whether the user's index holds exactly the stored_count memories in
+        the database and has not been flagged stale; a match is trusted for
+        the next verify_seconds
+        """
+        if self._is_stale(user_id) or self.count(user_id) != stored_count:
+            return False
+        with self._lock:
+            self._verified_until[user_id] = time.monotonic() + self.verify_seconds
+        return True
+    
+    def mark_stale(self, user_id: str) -> None:
+        """Flag the index as missing rows so it is not trusted until rebuilt"""
+        with self._lock:
+            self._verified_until.pop(user_id, None)
+        path = self._user_path(user_id)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, STALE_FILE), "a"):
+            pass
+    
+    def rebuild(self, user_id: str, loader: IndexLoader) -> None:
+        """Rebuild the user's index from the rows the loader returns (the database)"""
+        with self._lock:
+            writes = self._writes.get(user_id, 0)
+        # Load outside the lock so searches keep answering
+        items, embeddings = loader(user_id)
+        index = self._get(user_id)
+        with index.lock:
+            index.rebuild(items, embeddings)
+        with self._lock:
+            if self._writes.get(user_id, 0) == writes:
+                self._verified_until[user_id] = time.monotonic() + self.verify_seconds
+            else:
+                # Rows appended while loading may have gone to the replaced files; recount first
+                self._verified_until.pop(user_id, None)
+    
+    def schedule_rebuild(self, user_id: str, loader: IndexLoader) -> None:
+        """Rebuild the user's index on a background thread (once at a time per user)"""
+        with self._lock:
+            if user_id in self._rebuilding:
+                return
+            self._rebuilding.add(user_id)
+            if self._rebuild_executor is None:
+                self._rebuild_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-index-rebuild")
+            executor = self._rebuild_executor
+        executor.submit(self._run_rebuild, user_id, loader)
+    
+    def _run_rebuild(self, user_id: str, loader: IndexLoader) -> None:
+        try:
+            self.rebuild(user_id, loader)
+        except Exception as e:
+            print(f"Error rebuilding vector index for user {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding.discard(user_id)
+    
+    def shutdown(self) -> None:
+        """Stop background rebuilds (called on application shutdown)"""
+        with self._lock:
+            executor, self._rebuild_executor = self._rebuild_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def add(self, user_id: str, items: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        """Index new memories ({id, text, metadata} items) for a user"""
+        index = self._get(user_id)
+        with index.lock:
+            index.add(items, embeddings)
+        with self._lock:
+            self._writes[user_id] = self._writes.get(user_id, 0) + 1
+    
+    def search(self, user_id: str, query_embedding: List[float], limit: int, threshold: float) -> List[Dict[str, Any]]:
+        """Similarity search over a user's memories"""
+        index = self._get(user_id)
+        with index.lock:
+            index.refresh()
+            return index.search(np.asarray(query_embedding, dtype=np.float32), limit, threshold)
+    
+    def count(self, user_id: str) -> int:
+        index = self._get(user_id)
+        with index.lock:
+            index.refresh()
+            return index.count
+
+_store: Optional[VectorIndexStore] = None
+_store_lock = threading.Lock()
+
+def get_vector_index() -> VectorIndexStore:
+    """Get the process-wide vector index store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = VectorIndexStore(
+                    settings.VECTOR_INDEX_PATH,
+                    settings.EMBEDDING_DIMENSION,
+                    ivf_threshold=settings.VECTOR_INDEX_IVF_THRESHOLD,
+                    nprobe=settings.VECTOR_INDEX_NPROBE,
+                    verify_seconds=settings.VECTOR_INDEX_VERIFY_SECONDS
+                )
+    return _store
+
+def shutdown_vector_index() -> None:
+    """Stop background index rebuilds"""
+    if _store is not None:
+        _store.shutdown()
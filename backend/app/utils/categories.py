@@ -2,6 +2,8 @@
 Transaction category definitions and utilities
 """
 from typing import Dict, List
+import hashlib
+import json
 
 # Standard categories
 CATEGORIES = [
@@ -80,3 +82,7 @@ def get_all_categories() -> List[str]:
     """Get all available categories"""
     return CATEGORIES
 
+def get_taxonomy_hash() -> str:
+    """Fingerprint of the categories and their keywords (changes invalidate cached classifications)"""
+    payload = json.dumps([CATEGORIES, CATEGORY_KEYWORDS], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
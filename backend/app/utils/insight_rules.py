@@ -0,0 +1,77 @@
+"""
+Insight rule definitions
+"""
+from typing import Any, Dict, List
+
+# Each rule fires when `expression <op> threshold` holds for a user.
+# Expressions use feature names (see app.services.rule_engine.SCALAR_FEATURES),
+# + - * / and the lookups category("..."), category_count("..."),
+# merchant("..."), merchant_count("...") and hour(n).
+# Messages are str.format templates over the same feature names, plus
+# {value} (the expression result) and {top_merchant}.
+INSIGHT_RULES: List[Dict[str, Any]] = [
+    {
+        "id": "high_monthly_spending",
+        "expression": "debit_total",
+        "op": ">",
+        "threshold": 50000,
+        "type": "alert",
+        "severity": "medium",
+        "title": "High Monthly Spending",
+        "message": "You've spent ₹{debit_total:,.0f} this month. Consider reviewing your expenses."
+    },
+    {
+        "id": "multiple_large_transactions",
+        "expression": "large_transaction_count",
+        "op": ">",
+        "threshold": 5,
+        "type": "alert",
+        "severity": "low",
+        "title": "Multiple Large Transactions",
+        "message": "You have {large_transaction_count:.0f} transactions over ₹{large_transaction_amount:,.0f} this month."
+    },
+    {
+        "id": "high_food_spending",
+        "expression": "category(\"Food & Dining\") / debit_total * 100",
+        "op": ">",
+        "threshold": 40,
+        "type": "recommendation",
+        "severity": "medium",
+        "title": "High Food Spending",
+        "message": "Food & Dining accounts for {value:.0f}% of your spending. Consider meal planning to save money."
+    },
+    {
+        "id": "delivery_dominance",
+        "expression": "delivery_count",
+        "op": ">",
+        "threshold": 20,
+        "type": "alert",
+        "severity": "high",
+        "title": "Delivery Dominance Detected",
+        "message": "You've ordered food {delivery_count:.0f} times this month. Consider cooking more to save money."
+    },
+    {
+        "id": "late_night_spending",
+        "expression": "late_night_count",
+        "op": ">",
+        "threshold": 10,
+        "type": "alert",
+        "severity": "low",
+        "title": "Late Night Spending",
+        "message": "You have {late_night_count:.0f} transactions between 10 PM and 6 AM. Late-night purchases can be impulsive."
+    },
+    {
+        "id": "frequent_merchant",
+        "expression": "top_merchant_count",
+        "op": ">",
+        "threshold": 15,
+        "type": "trend",
+        "severity": "low",
+        "title": "Frequent Merchant",
+        "message": "You've shopped at {top_merchant} {top_merchant_count:.0f} times. Consider a subscription or bulk purchase to save."
+    },
+]
+
+def get_insight_rules() -> List[Dict[str, Any]]:
+    """Get the built-in insight rules"""
+    return INSIGHT_RULES
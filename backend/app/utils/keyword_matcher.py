@@ -0,0 +1,120 @@
+"""
+Multi-pattern keyword matching (Aho-Corasick automaton)
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from collections import deque
+
+class KeywordMatcher:
+    """
+    Find every keyword in a text with one pass over its characters
+    
+    Keywords are compiled once into an Aho-Corasick automaton, so the
+    cost of a search grows with the text rather than with the number of
+    keywords. Matching is case-insensitive (patterns and text are
+    lowercased).
+    
+    Two modes:
+    - substring: keywords that occur anywhere in the text
+    - token: keywords that contain, or are contained in, a
+      whitespace-separated token of the text
+    """
+    
+    def __init__(self, keywords: Iterable[str]):
+        # Distinct patterns in first-seen order; a pattern's id is its index
+        self.patterns: List[str] = list(dict.fromkeys(k.lower() for k in keywords if k))
+        self._ids: Dict[str, int] = {pattern: i for i, pattern in enumerate(self.patterns)}
+        
+        # Trie: per-state transitions, failure link and ids of patterns ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        for pattern_id, pattern in enumerate(self.patterns):
+            self._add(pattern, pattern_id)
+        self._link()
+        
+        # Token mode, "token in keyword": every substring of every keyword
+        self._containing: Dict[str, Set[int]] = {}
+        for pattern_id, pattern in enumerate(self.patterns):
+            for start in range(len(pattern)):
+                for end in range(start + 1, len(pattern) + 1):
+                    self._containing.setdefault(pattern[start:end], set()).add(pattern_id)
+        # Token mode, "keyword in token": only keywords without whitespace fit in a token
+        self._single_token = [not any(c.isspace() for c in pattern) for pattern in self.patterns]
+    
+    def _add(self, pattern: str, pattern_id: int) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state] += (pattern_id,)
+    
+    def _link(self) -> None:
+        """Breadth-first failure links; outputs inherit those of their failure state"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = link if link != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+    
+    def substring_ids(self, text: str) -> Set[int]:
+        """Ids of patterns occurring anywhere in text"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Set[int] = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+    
+    def token_ids(self, text: str, substring_ids: Optional[Set[int]] = None) -> Set[int]:
+        """Ids of patterns p with some token w of text where p in w or w in p"""
+        if substring_ids is None:
+            substring_ids = self.substring_ids(text)
+        # A whitespace-free pattern found in the text lies inside a single token
+        found = {i for i in substring_ids if self._single_token[i]}
+        for token in text.lower().split():
+            found.update(self._containing.get(token, ()))
+        return found
+    
+    def substring_matches(self, text: str) -> List[str]:
+        """Patterns occurring in text, in pattern order"""
+        return [self.patterns[i] for i in sorted(self.substring_ids(text))]
+    
+    def token_matches(self, text: str) -> List[str]:
+        """Patterns matching a token of text, in pattern order"""
+        return [self.patterns[i] for i in sorted(self.token_ids(text))]
+    
+    def first_match(self, text: str) -> str:
+        """Earliest pattern (in pattern order) occurring in text, or "" if none"""
+        found = self.substring_ids(text)
+        return self.patterns[min(found)] if found else ""
+    
+    def contains_any(self, text: str) -> bool:
+        """Whether any pattern occurs in text (stops at the first hit)"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+    
+    def pattern_id(self, pattern: str) -> int:
+        return self._ids[pattern.lower()]
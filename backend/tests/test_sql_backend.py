@@ -0,0 +1,40 @@
+"""
+Transaction behaviour of the embedded SQL storage backends
+"""
+import pytest
+from app.db.sqlite_backend import SQLiteBackend
+from app.db.duckdb_backend import DuckDBBackend, duckdb
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def backend(request, tmp_path):
+    if request.param == "duckdb":
+        if duckdb is None:
+            pytest.skip("duckdb is not installed")
+        backend = DuckDBBackend(str(tmp_path / "test.duckdb"))
+    else:
+        backend = SQLiteBackend(str(tmp_path / "test.db"))
+    yield backend
+    backend.close()
+
+def test_failed_write_rolls_back_earlier_statements(backend):
+    insert = "INSERT INTO users (id, phone, name, created_at) VALUES (?, ?, ?, ?)"
+    backend.create_user("+911111111111")
+    
+    with pytest.raises(Exception):
+        backend._write([
+            (insert, [("new-user", "+912222222222", None, "2026-01-01T00:00:00")]),
+            # Duplicate phone fails after the first statement has run
+            (insert, [("other-user", "+911111111111", None, "2026-01-01T00:00:00")]),
+        ])
+    
+    assert backend.get_user_by_id("new-user") is None
+    assert backend.get_user_by_phone("+912222222222") is None
+
+def test_duplicate_user_raises_the_constraint_error(backend):
+    backend.create_user("+911111111111")
+    
+    with pytest.raises(Exception, match="(?i)unique|constraint"):
+        backend.create_user("+911111111111")
+    
+    # The connection is still usable afterwards
+    assert backend.create_user("+912222222222")["phone"] == "+912222222222"